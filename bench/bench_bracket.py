@@ -0,0 +1,61 @@
+# bracket generation and full resolution for a large field
+#   python bench/bench_bracket.py [--teams 1024] [--repeat 5]
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.bracket import Bracket, DOUBLE, SINGLE
+
+
+def resolve(bracket, rnd):
+    # report a random winner for every ready match until there is a champion
+    reports = 0
+    report_time = 0.0
+    while bracket.champion is None:
+        for match in bracket.ready():
+            started = time.perf_counter()
+            bracket.report(match.id, rnd.randint(0, 1))
+            report_time += time.perf_counter() - started
+            reports += 1
+    return reports, report_time
+
+
+def run(kind, teams, repeat):
+    seeds = [f'team{x}' for x in range(teams)]
+    best = {'build': float('inf'), 'resolve': float('inf'), 'report': float('inf'), 'restore': float('inf')}
+    for n in range(repeat):
+        started = time.perf_counter()
+        bracket = Bracket(kind, seeds)
+        best['build'] = min(best['build'], time.perf_counter() - started)
+        started = time.perf_counter()
+        reports, report_time = resolve(bracket, random.Random(n))
+        best['resolve'] = min(best['resolve'], time.perf_counter() - started)
+        best['report'] = min(best['report'], report_time / reports)
+        data = bracket.to_dict()
+        started = time.perf_counter()
+        restored = Bracket.from_dict(data)
+        best['restore'] = min(best['restore'], time.perf_counter() - started)
+        assert restored.champion == bracket.champion
+    print(f'{kind:>6}: {len(bracket.matches)} matches, {reports} reports, '
+          f'build {best["build"] * 1e3:.2f}ms, resolve {best["resolve"] * 1e3:.2f}ms '
+          f'({best["report"] * 1e6:.2f}us/report), restore {best["restore"] * 1e3:.2f}ms, '
+          f'snapshot {len(json.dumps(data))} bytes')
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--teams', type = int, default = 1024)
+    parser.add_argument('--repeat', type = int, default = 5)
+    args = parser.parse_args()
+    print(f'{args.teams} teams, best of {args.repeat}')
+    for kind in (SINGLE, DOUBLE):
+        run(kind, args.teams, args.repeat)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,154 @@
+# resident memory and time to on_ready for Intents.all() with chunking against the lean mode:
+# the same READY, GUILD_CREATE and member chunk payloads go through discord.py's parse handlers
+#   python bench/bench_members.py [--members 100000]
+import argparse
+import asyncio
+import gc
+import os
+import subprocess
+import sys
+import time
+import types
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import discord
+from discord.state import ConnectionState
+
+from utils.members import MemberCache
+
+guild_id = 1014230302622744677
+pugs_role = 1014279626626977864
+chunk_size = 1000
+# discord.py waits this long after the last GUILD_CREATE before chunking and READY; 2s by default
+guild_ready_timeout = 0.1
+
+
+def rss():
+    # MiB, from /proc since resource.getrusage only reports the peak
+    with open('/proc/self/status', 'r') as f:
+        for line in f:
+            if line.startswith('VmRSS'):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+def role(x, name, position):
+    return {'id': str(x), 'name': name, 'permissions': '0', 'position': position, 'color': 0, 'hoist': False,
+            'managed': False, 'mentionable': False, 'flags': 0}
+
+
+def member(x):
+    return {'user': {'id': str(10 ** 17 + x), 'username': f'user{x}', 'discriminator': '0', 'global_name': f'User {x}',
+                     'avatar': None},
+            'roles': [str(pugs_role)] if x % 3 == 0 else [], 'joined_at': '2023-01-01T00:00:00+00:00',
+            'deaf': False, 'mute': False, 'flags': 0}
+
+
+def guild_create(members):
+    # a large guild's GUILD_CREATE carries no member list; members come in GUILD_MEMBERS_CHUNK
+    return {'id': str(guild_id), 'name': 'RBW', 'member_count': members, 'large': True, 'unavailable': False,
+            'roles': [role(guild_id, '@everyone', 0), role(pugs_role, 'PUGS', 1)], 'channels': [], 'threads': [],
+            'members': [], 'voice_states': [], 'presences': [], 'emojis': [], 'stickers': [], 'features': []}
+
+
+def chunks(members, nonce):
+    count = -(-members // chunk_size)
+    for index in range(count):
+        start = index * chunk_size
+        yield {'guild_id': str(guild_id), 'members': [member(x) for x in range(start, min(members, start + chunk_size))],
+               'chunk_index': index, 'chunk_count': count, 'nonce': nonce}
+
+
+class Gateway:
+    # plays the gateway for one ConnectionState: READY, then GUILD_CREATE, then the member
+    # chunks, each on its own loop iteration as if read off the socket. The chunks go out in
+    # both modes, answering the chunk request when there is one, so both parse the same payloads.
+    def __init__(self, state, members):
+        self.state = state
+        self.members = members
+        self.nonce = None
+        self.requested = asyncio.Event()
+
+    async def request_chunks(self, guild_id, query = '', limit = 0, presences = False, nonce = None, **kwargs):
+        self.nonce = nonce
+        self.requested.set()
+
+    async def run(self, lean):
+        self.state.parse_ready({'user': {'id': str(guild_id + 1), 'username': 'bot', 'discriminator': '0', 'avatar': None,
+                                         'bot': True}, 'guilds': [{'id': str(guild_id), 'unavailable': True}]})
+        await asyncio.sleep(0)
+        self.state.parse_guild_create(guild_create(self.members))
+        if not lean:
+            await self.requested.wait()
+        for data in chunks(self.members, self.nonce):
+            await asyncio.sleep(0)
+            self.state.parse_guild_members_chunk(data)
+
+
+def connection(lean, ready):
+    if lean:
+        intents = discord.Intents.none()
+        intents.guilds = True
+        intents.guild_messages = True
+        intents.guild_reactions = True
+        intents.message_content = True
+        flags = discord.MemberCacheFlags.none()
+    else:
+        intents = discord.Intents.all()
+        intents.presences = False
+        flags = discord.MemberCacheFlags.from_intents(intents)
+    state = ConnectionState(dispatch = lambda event, *args: event == 'ready' and ready.set(), handlers = {}, hooks = {},
+                            http = None, intents = intents, member_cache_flags = flags, chunk_guilds_at_startup = not lean,
+                            guild_ready_timeout = guild_ready_timeout)
+    state.loop = asyncio.get_running_loop()
+    return state
+
+
+async def measure(lean, members):
+    ready = asyncio.Event()
+    state = connection(lean, ready)
+    gateway = Gateway(state, members)
+    state.chunker = gateway.request_chunks
+    gc.collect()
+    before = rss()
+    started = time.perf_counter()
+    feed = asyncio.create_task(gateway.run(lean))
+    await ready.wait()
+    elapsed = time.perf_counter() - started
+    await feed
+    gc.collect()
+    guild = state._get_guild(guild_id)
+    print(f'{"lean" if lean else "all":>4}: {len(guild._members)} members cached, RSS +{rss() - before:.1f} MiB, '
+          f'on_ready after {elapsed * 1e3:.0f}ms (of which {guild_ready_timeout * 1e3:.0f}ms is the guild_ready_timeout)')
+
+
+async def measure_cache(size = 2048, lookups = 100000):
+    guild = types.SimpleNamespace(id = guild_id, get_member = lambda x: None)
+    cache = MemberCache(size = size)
+    for x in range(size):
+        cache.put(types.SimpleNamespace(id = x, guild = guild))
+    started = time.perf_counter()
+    for x in range(lookups):
+        await cache.get(guild, x % size)
+    print(f'MemberCache: {(time.perf_counter() - started) / lookups * 1e6:.2f}us per hit at {size} entries')
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--members', type = int, default = 100000)
+    parser.add_argument('--mode', choices = ('all', 'lean'))
+    args = parser.parse_args()
+    if args.mode is not None:
+        asyncio.run(measure(args.mode == 'lean', args.members))
+        return
+    # each mode in its own process so one doesn't inherit the other's heap
+    print(f'synthetic guild of {args.members} members')
+    for mode in ('all', 'lean'):
+        subprocess.run([sys.executable, os.path.abspath(__file__), '--mode', mode, '--members', str(args.members)],
+                       check = True)
+    asyncio.run(measure_cache())
+
+
+if __name__ == '__main__':
+    main()
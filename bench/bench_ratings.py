@@ -0,0 +1,52 @@
+# full rating recompute over a large game history, vectorised and pure python
+#   python bench/bench_ratings.py [--games 100000] [--teams 1000]
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import utils.ratings as ratings
+
+
+def make_games(games, teams, seed = 5):
+    rnd = random.Random(seed)
+    names = [f'team{x}' for x in range(teams)]
+    return names, [(*rnd.sample(names, 2), float(rnd.random() < 0.5)) for _ in range(games)]
+
+
+def timed(func):
+    started = time.perf_counter()
+    func()
+    return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--games', type = int, default = 100000)
+    parser.add_argument('--teams', type = int, default = 1000)
+    args = parser.parse_args()
+    names, games = make_games(args.games, args.teams)
+    print(f'{args.games} games between {args.teams} teams, numpy {"available" if ratings.np is not None else "missing"}')
+    for cls in (ratings.Elo, ratings.Glicko2):
+        incremental = cls()
+        recorded = timed(lambda: [incremental.record(*x) for x in games])
+        line = f'{cls.__name__:>8}: record one by one {recorded:.2f}s'
+        numpy = ratings.np
+        ratings.np = None
+        try:
+            pure = cls()
+            line += f', pure recompute {timed(lambda: pure.recompute(games)):.2f}s'
+        finally:
+            ratings.np = numpy
+        if numpy is not None:
+            batched = cls()
+            line += f', numpy recompute {timed(lambda: batched.recompute(games)):.2f}s'
+            line += f', max diff {max(abs(incremental.rating(x) - batched.rating(x)) for x in names):.1e}'
+        print(line)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,40 +1,358 @@
 from discord.ext import commands
+import asyncio
 import discord
-import json
+import itertools
+import logging
+import re
+import time
+
+from utils.bracket import Bracket, SINGLE, DOUBLE, seed_by_rating
+from utils.fenwick import SignUpOrder
+from utils.journal import Journal
+from utils.paginator import PageSource, Paginator
+from utils.ratings import ELO, GLICKO2, rating_system
+from utils.snapshot import SnapshotWriter, read_json
+from utils.standings import Standings
+from utils.tournaments import TourneyStatus
 
 teams_file = 'data/teams.json'
 players_file = 'data/players.json'
+bracket_file = 'data/bracket.json'
+settings_file = 'data/settings.json'
+journal_file = 'data/journal.log'
+journal_meta_file = 'data/journal.meta.json'
 max_teams_default = 64
 max_players_default = 2
-allowed_channels = [1148349535538659388]
-announce_channel = 1148349498293244067
-manager_roles = [1061287805399085086]
+flush_interval_default = 5.0
+flush_threshold_default = 25
+bracket_page_matches = 20
+leaderboard_size_default = 10
+# ops that can change what the leaderboard shows
+leaderboard_ops = ('create', 'disband', 'score', 'cleargames')
+score_pattern = re.compile(r'^(\d+)-(\d+)$')
+
+log = logging.getLogger(__name__)
+
+
+def normalize_name(name):
+    return ' '.join(name.split()).casefold()
 
 
 class Tourney(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
-        self.teams = json.load(open(teams_file, 'r'))
-        self.players = json.load(open(players_file, 'r'))
+        # filled in by preload(), which runs off the loop once the cog is added
+        self.teams = {}
+        self.players = {}
+        self.bracket, self.bracket_created, self.bracket_tourney = None, None, None
         self.max_players = max_players_default
         self.max_teams = max_teams_default
-        self.allowed_channels = allowed_channels
-        self.manager_roles = manager_roles
-        self.announce_channel = announce_channel
+        # channel and manager role ids come from config.json through the bot's guild context
+        self.guild_context = bot.guild_context
+        self.allowed_channels = self.guild_context.config.get('tourney_channels', [])
         self.curr_id = 0
+        self.rating_system = GLICKO2
+        self.appliers = {
+            'create': self.apply_create,
+            'invite': self.apply_invite,
+            'uninvite': self.apply_uninvite,
+            'accept': self.apply_accept,
+            'leave': self.apply_leave,
+            'disband': self.apply_disband,
+            'cleargames': self.apply_clear_games,
+            'score': self.apply_score,
+            'bracket': self.apply_bracket,
+            'advance': self.apply_advance,
+            'limits': self.apply_limits
+        }
+        self.invites = {}
+        self.names = {}
+        self.journal = Journal(journal_file, journal_meta_file)
+        self.loaded = None
+        self.leaderboard_pages = PageSource(lambda: len(self.standings),
+                                            lambda start, stop: self.standings.top(stop - start, start),
+                                            self.leaderboard_page, leaderboard_size_default)
+        self.writer = SnapshotWriter({teams_file: lambda: self.teams, players_file: lambda: self.players,
+                                      bracket_file: self.bracket_snapshot, settings_file: self.settings_snapshot},
+                                     flush_interval_default, flush_threshold_default,
+                                     checkpoint = self.journal)
+
+    async def cog_load(self):
+        # not awaited here, so setup_hook and the gateway connect don't wait on the data
+        self.loaded = asyncio.get_running_loop().create_task(self.preload())
+        self.bot.startup.track(self.loaded)
+
+    async def preload(self):
+        with self.bot.startup.phase('data'):
+            _, _, bracket, _ = await asyncio.gather(asyncio.to_thread(self.refresh_teams),
+                                                    asyncio.to_thread(self.refresh_players),
+                                                    asyncio.to_thread(self.refresh_bracket),
+                                                    asyncio.to_thread(self.refresh_settings))
+            self.bracket, self.bracket_created, self.bracket_tourney = bracket
+            # nothing else touches the state until this is done, so replay can run off the loop too
+            await asyncio.to_thread(self.restore)
+
+    def restore(self):
+        self.build_indexes()
+        for record in self.journal.open():
+            self.apply(record)
+        problems = self.check_consistency()
+        if problems:
+            for problem in problems:
+                log.warning('tourney state: %s', problem)
+            self.repair()
+
+    async def cog_before_invoke(self, ctx):
+        # commands that come in before the data is loaded wait for it
+        await self.loaded
+
+    async def cog_unload(self):
+        if self.loaded is not None:
+            await asyncio.wait([self.loaded])
+        await self.writer.close()
+        self.journal.close()
+
+    def commit(self, op, **fields):
+        # journal first, then apply, so the log is never behind the in-memory state
+        record = self.journal.append(op, **fields)
+        self.apply(record)
+        self.writer.mark_dirty()
+        if op in leaderboard_ops:
+            self.leaderboard_pages.invalidate()
+
+    def apply(self, record):
+        self.appliers[record['op']](record)
+
+    # indexes kept next to teams/players by the appliers:
+    #   players: str(player id) -> team name (persisted)
+    #   invites: player id -> set of team names that invited them
+    #   names: normalized team name -> team name
+    #   order: sign-up order of team names (utils.fenwick.SignUpOrder)
+    #   diffs: team name -> game differential over its games
+    #   standings: teams ranked by (wins, diff, sign-up) (utils.standings.Standings)
+    #   ratings: skill ratings from every recorded game (utils.ratings)
+
+    def build_indexes(self):
+        self.invites = {}
+        self.names = {}
+        # teams keep insertion order, which is sign-up order; positions are derived from it.
+        # Older snapshots stored the position on every team, so honour it once when present.
+        if any('sign_up_position' in x for x in self.teams.values()):
+            self.teams = dict(sorted(self.teams.items(), key = lambda x: x[1].get('sign_up_position', 0)))
+        self.order = SignUpOrder(self.teams)
+        self.curr_id = max((x['id'] for x in self.teams.values()), default = 0)
+        self.diffs = {}
+        self.standings = Standings()
+        for team in self.teams.values():
+            team.pop('sign_up_position', None)
+            self.diffs[team['name']] = sum(self.game_diff(team['name'], x) for x in team['games'])
+            self.rank_team(team['name'])
+            self.names[normalize_name(team['name'])] = team['name']
+            for invite in team['invites']:
+                self.invites.setdefault(invite, set()).add(team['name'])
+        self.ratings = rating_system(self.rating_system)
+        self.ratings.recompute(self.game_history())
+
+    def check_consistency(self):
+        problems = []
+        for player, team_name in self.players.items():
+            team = self.teams.get(team_name)
+            if team is None:
+                problems.append(f'player {player} points at missing team {team_name}')
+            elif int(player) not in team['members']:
+                problems.append(f'player {player} points at {team_name} but is not a member')
+        for team in self.teams.values():
+            for member in team['members']:
+                if self.players.get(str(member)) != team['name']:
+                    problems.append(f'member {member} of {team["name"]} is not indexed to it')
+            for invite in team['invites']:
+                if team['name'] not in self.invites.get(invite, ()):
+                    problems.append(f'invite of {invite} to {team["name"]} is not indexed')
+            if self.names.get(normalize_name(team['name'])) != team['name']:
+                problems.append(f'team name {team["name"]} is not indexed')
+        if len(self.names) != len(self.teams):
+            problems.append('team name index has stale entries')
+        if len(self.standings) != len(self.teams):
+            problems.append('standings have stale entries')
+        if list(self.order) != list(self.teams):
+            problems.append('sign-up order does not match the teams')
+        if sum(len(x) for x in self.invites.values()) != sum(len(x['invites']) for x in self.teams.values()):
+            problems.append('invite index has stale entries')
+        return problems
+
+    def repair(self):
+        # teams are the source of truth; rebuild everything derived from them
+        self.players = {}
+        for team in self.teams.values():
+            for member in team['members']:
+                self.players[str(member)] = team['name']
+        self.build_indexes()
+
+    # every applier is idempotent: after a crash mid-compaction the snapshot can be newer
+    # than the journal meta, and replaying records it already contains must be harmless
+
+    def apply_create(self, record):
+        team = dict(record['team'])
+        team.pop('sign_up_position', None)
+        if team['name'] in self.teams:
+            return
+        self.teams[team['name']] = team
+        self.order.append(team['name'])
+        self.diffs[team['name']] = sum(self.game_diff(team['name'], x) for x in team['games'])
+        self.rank_team(team['name'])
+        self.names[normalize_name(team['name'])] = team['name']
+        self.players[str(team['leader'])] = team['name']
+        self.curr_id = max(self.curr_id, team['id'])
+
+    def apply_invite(self, record):
+        team = self.teams.get(record['team'])
+        if team is not None and record['player'] not in team['invites']:
+            team['invites'].append(record['player'])
+            self.invites.setdefault(record['player'], set()).add(team['name'])
+
+    def apply_uninvite(self, record):
+        team = self.teams.get(record['team'])
+        if team is not None and record['player'] in team['invites']:
+            team['invites'].remove(record['player'])
+            self.drop_invite(record['player'], team['name'])
+
+    def drop_invite(self, player, team_name):
+        invites = self.invites.get(player)
+        if invites is not None:
+            invites.discard(team_name)
+            if not invites:
+                self.invites.pop(player)
+
+    def apply_accept(self, record):
+        team = self.teams.get(record['team'])
+        if team is None:
+            return
+        if record['player'] in team['invites']:
+            team['invites'].remove(record['player'])
+            self.drop_invite(record['player'], team['name'])
+        if record['player'] not in team['members']:
+            team['members'].append(record['player'])
+        self.players[str(record['player'])] = team['name']
+
+    def apply_leave(self, record):
+        team = self.teams.get(record['team'])
+        if team is not None and record['player'] in team['members']:
+            team['members'].remove(record['player'])
+        if self.players.get(str(record['player'])) == record['team']:
+            self.players.pop(str(record['player']))
+
+    def apply_disband(self, record):
+        team = self.teams.pop(record['team'], None)
+        if team is None:
+            return
+        self.names.pop(normalize_name(team['name']), None)
+        for member in team['members']:
+            self.players.pop(str(member), None)
+        for invite in team['invites']:
+            self.drop_invite(invite, team['name'])
+        self.standings.remove(team['name'])
+        self.diffs.pop(team['name'], None)
+        self.order.remove(team['name'])
+
+    def apply_clear_games(self, record):
+        # wins and losses come from the games, so they go with them
+        for team in self.teams.values():
+            team['games'] = []
+            team['wins'] = 0
+            team['losses'] = 0
+            self.diffs[team['name']] = 0
+            self.rank_team(team['name'])
+        self.ratings.recompute([])
+
+    def apply_score(self, record):
+        game = dict(record['game'], seq = record['seq'])
+        teams = [self.teams.get(game['team_1']), self.teams.get(game['team_2'])]
+        added = False
+        for team in teams:
+            # games are appended in journal order, so a replayed one is already at the end
+            if team is None or (team['games'] and team['games'][-1].get('seq', 0) >= game['seq']):
+                continue
+            added = True
+            team['games'].append(game)
+            if team['name'] == game['winner']:
+                team['wins'] += 1
+            else:
+                team['losses'] += 1
+            self.diffs[team['name']] += self.game_diff(team['name'], game)
+            self.rank_team(team['name'])
+        if added:
+            self.ratings.record(*self.rated_game(game))
+
+    def game_history(self):
+        # every game once, in the order it was played; each one is stored on both teams
+        # (or only the survivor once a team is disbanded)
+        games = {}
+        for team in self.teams.values():
+            for game in team['games']:
+                games[game.get('seq', 0), game['team_1'], game['team_2']] = game
+        return [self.rated_game(games[x]) for x in sorted(games)]
 
-    def save_teams(self):
-        json.dump(self.teams, open(teams_file, 'w'))
+    def rated_game(self, game):
+        return game['team_1'], game['team_2'], 1.0 if game['winner'] == game['team_1'] else 0.0
 
-    def save_players(self):
-        json.dump(self.players, open(players_file, 'w'))
+    def game_diff(self, team_name, game):
+        diff = game['team_1_wins'] - game['team_2_wins']
+        return diff if game['team_1'] == team_name else -diff
+
+    def rank_team(self, team_name):
+        team = self.teams[team_name]
+        self.standings.update(team_name, team['wins'], self.diffs[team_name], self.order.slots[team_name])
+
+    def apply_bracket(self, record):
+        # keyed by the creating record's seq so a replayed create never wipes newer results
+        if self.bracket_created != record['seq']:
+            self.bracket = Bracket(record['kind'], record['seeds'])
+            self.bracket_created = record['seq']
+            self.bracket_tourney = record.get('tourney')
+
+    def apply_advance(self, record):
+        if self.bracket is None or self.bracket_created != record['bracket']:
+            return
+        match = self.bracket.matches[record['match']]
+        if match.ready() and record['winner'] in match.slots:
+            self.bracket.report(match.id, record['winner'])
+
+    def bracket_snapshot(self):
+        if self.bracket is None:
+            return None
+        return {'created': self.bracket_created, 'tourney': self.bracket_tourney, **self.bracket.to_dict()}
+
+    def refresh_bracket(self):
+        try:
+            data = read_json(bracket_file)
+        except FileNotFoundError:
+            data = None
+        if data is None:
+            return None, None, None
+        return Bracket.from_dict(data), data['created'], data.get('tourney')
+
+    def apply_limits(self, record):
+        # the caps decide who is waitlisted, so they go through the journal like everything else
+        self.max_teams = record.get('max_teams', self.max_teams)
+        self.max_players = record.get('max_players', self.max_players)
+
+    def settings_snapshot(self):
+        return {'max_teams': self.max_teams, 'max_players': self.max_players}
+
+    def refresh_settings(self):
+        try:
+            data = read_json(settings_file)
+        except FileNotFoundError:
+            data = {}
+        self.max_teams = data.get('max_teams', max_teams_default)
+        self.max_players = data.get('max_players', max_players_default)
 
     def refresh_teams(self):
-        self.teams = json.load(open(teams_file, 'r'))
+        self.teams = read_json(teams_file)
         return self.teams
 
     def refresh_players(self):
-        self.players = json.load(open(players_file, 'r'))
+        self.players = read_json(players_file)
         return self.players
 
     def is_on_team(self, discord_id):
@@ -42,24 +360,49 @@ class Tourney(commands.Cog):
         return discord_id in self.players
 
     def get_team_name(self, discord_id):
-        discord_id = str(discord_id)
-        if not self.is_on_team(discord_id):
-            return None
-        for team in self.teams.values():
-            if int(discord_id) in team['members']:
-                return team['name']
-        return None
+        return self.players.get(str(discord_id))
 
     def team_exists(self, team_name):
-        return team_name in self.teams
+        return normalize_name(team_name) in self.names
+
+    def find_team(self, team_name):
+        # lookup by name, ignoring case and extra whitespace
+        name = self.names.get(normalize_name(team_name))
+        return self.teams.get(name) if name is not None else None
+
+    def sign_up_position(self, team_name):
+        return self.order.position(team_name)
+
+    def team_at(self, position):
+        return self.teams[self.order.kth(position)]
+
+    # the waitlist is the tail of the sign-up order: the first max_teams teams are in,
+    # everyone after them waits in sign-up (FIFO) order and moves up as slots free
+
+    def is_waitlisted(self, team_name):
+        return self.sign_up_position(team_name) >= self.max_teams
+
+    def waitlist_position(self, team_name):
+        position = self.sign_up_position(team_name) - self.max_teams
+        return position if position >= 0 else None
+
+    def waitlist_size(self):
+        return max(0, len(self.order) - self.max_teams)
+
+    async def announce_promotions(self, ctx, start, stop):
+        # teams now sitting at sign-up positions [start, stop) have just made it off the waitlist
+        names = [self.order.kth(x) for x in range(start, min(stop, self.max_teams, len(self.order)))]
+        for name in names:
+            await self.announce(ctx, f"`{name}` has been moved off the waitlist and into the tournament")
+        return names
 
     def get_team(self, discord_id):
-        if not self.is_on_team(discord_id):
+        team_name = self.get_team_name(discord_id)
+        if team_name is None:
             return None
-        return self.teams[self.get_team_name(discord_id)]
+        return self.teams.get(team_name)
 
-    def create_new_team(self, name, leader):
-        self.curr_id += 1
+    def create_new_team(self, name, leader, team_id):
         return {
             'name': name,
             'leader': leader,
@@ -68,8 +411,7 @@ class Tourney(commands.Cog):
             'wins': 0,
             'losses': 0,
             'games': [],
-            'sign_up_position': len(self.teams),
-            'id': self.curr_id
+            'id': team_id
             # each element should be in the format {
             # 'team_1': 'name',
             # 'team_2': 'name',
@@ -79,302 +421,490 @@ class Tourney(commands.Cog):
             # }
         }
 
-    def update_teams(self, team_name, team):
-        self.teams[team_name] = team
-        self.save_teams()
-
     @commands.command(name = 'register', aliases = ['create'])
     @commands.cooldown(rate = 1, per = 300)
     async def register(self, ctx, *args):
         if self.is_on_team(ctx.author.id):
-            return await ctx.message.reply(embed = self.get_embed(f'You are already on the team `{self.get_team_name(ctx.author.id)}`'),
-                                           mention_author = False)
+            return await self.bot.outbox.reply(ctx, embed = self.get_embed(f'You are already on the team `{self.get_team_name(ctx.author.id)}`'),
+                                               mention_author = False)
 
         if len(args) == 0:
-            return await ctx.message.reply(embed = self.get_embed(f'Please state a team name:\n'
-                                           f'`{self.bot.prefix}register <team_name>`'),
-                                           mention_author = False)
+            return await self.bot.outbox.reply(ctx, embed = self.get_embed(f'Please state a team name:\n'
+                                               f'`{self.bot.prefix}register <team_name>`'),
+                                               mention_author = False)
 
         team_name = " ".join(args)
         if self.team_exists(team_name):
-            return await ctx.message.reply(embed = self.get_embed(f'A team with the name `{team_name}` already exists'),
-                                           mention_author = False)
+            return await self.bot.outbox.reply(ctx, embed = self.get_embed(f'A team with the name `{team_name}` already exists'),
+                                               mention_author = False)
 
-        if len(self.teams) > self.max_teams:
-            await ctx.message.reply(embed = self.get_embed(f'There are already `{self.max_teams}` in the tournament.\n'
-                                    f'You have been waitlisted (waitlists will be updated when teams drop out)'),
-                                           mention_author = False)
+        # ids come from the shared persistent sequence, so they never repeat across restarts
+        team_id = await self.bot.tournaments.next_team_id(self.curr_id)
+        if self.is_on_team(ctx.author.id) or self.team_exists(team_name):
+            # another registration got in while we were waiting on the id
+            return await self.bot.outbox.reply(ctx, embed = self.get_embed(f'Team `{team_name}` could not be created, please try again'),
+                                               mention_author = False)
 
-        self.teams[team_name] = self.create_new_team(team_name, ctx.author.id)
-        self.players[str(ctx.author.id)] = team_name
-        self.save_teams()
-        self.save_players()
+        self.commit('create', team = self.create_new_team(team_name, ctx.author.id, team_id))
+
+        if self.is_waitlisted(team_name):
+            await self.bot.outbox.reply(ctx, embed = self.get_embed(f'There are already `{self.max_teams}` teams in the tournament.\n'
+                                        f'You have been waitlisted at position `{self.waitlist_position(team_name) + 1}` '
+                                        f'(you will be moved in automatically when teams drop out)'),
+                                               mention_author = False)
 
         await self.announce(ctx, f"Team `{team_name}` created by <@{ctx.author.id}>")
 
-        return await ctx.message.reply(embed = self.get_embed(f'Team `{team_name}` created. Add players with:\n'
-                                       f'{self.bot.prefix}invite <user>'),
-                                       mention_author = False)
+        return await self.bot.outbox.reply(ctx, embed = self.get_embed(f'Team `{team_name}` created. Add players with:\n'
+                                           f'{self.bot.prefix}invite <user>'),
+                                           mention_author = False)
 
     @commands.command(name = 'invite', aliases = ['add'], usage = 'invite <DiscordID>')
     @commands.cooldown(rate = 3, per = 300)
     async def invite(self, ctx, player: discord.User):
         if not self.is_on_team(ctx.author.id):
-            return await ctx.message.reply(embed = self.get_embed(f'You are not on a team'),
-                                           mention_author = False)
+            return await self.bot.outbox.reply(ctx, embed = self.get_embed(f'You are not on a team'),
+                                               mention_author = False)
 
         team = self.get_team(ctx.author.id)
         team_name = team['name']
         if team['leader'] != ctx.author.id:
-            return await ctx.message.reply(embed = self.get_embed(f'You are not a team leader. Only team leaders can invite players'),
-                                           mention_author = False)
+            return await self.bot.outbox.reply(ctx, embed = self.get_embed(f'You are not a team leader. Only team leaders can invite players'),
+                                               mention_author = False)
 
         if player.id in team['invites']:
-            return await ctx.message.reply(embed = self.get_embed(f'User has already been invited to `{team_name}`'),
-                                           mention_author = False)
+            return await self.bot.outbox.reply(ctx, embed = self.get_embed(f'User has already been invited to `{team_name}`'),
+                                               mention_author = False)
 
         if player.id in team['members']:
-            return await ctx.message.reply(embed = self.get_embed(f'User is already on `{team_name}`'),
-                                           mention_author = False)
+            return await self.bot.outbox.reply(ctx, embed = self.get_embed(f'User is already on `{team_name}`'),
+                                               mention_author = False)
 
         if len(team['members']) + len(team['invites']) >= self.max_players:
-            return await ctx.message.reply(embed = self.get_embed(f'Team is full `({self.max_players} / {self.max_players})`\n'
-                                           f'to make space, either uninvite or kick members'),
-                                           mention_author = False)
+            return await self.bot.outbox.reply(ctx, embed = self.get_embed(f'Team is full `({self.max_players} / {self.max_players})`\n'
+                                               f'to make space, either uninvite or kick members'),
+                                               mention_author = False)
 
-        team['invites'].append(player.id)
-        self.update_teams(team['name'], team)
+        self.commit('invite', team = team_name, player = player.id)
 
-        return await ctx.message.reply(embed = self.get_embed(f'<@{player.id}> has been invited to `{team_name}`\n'
-                                       f'To accept this invite, they must run `{self.bot.prefix}accept {team_name}`'),
-                                       mention_author = False)
+        return await self.bot.outbox.reply(ctx, embed = self.get_embed(f'<@{player.id}> has been invited to `{team_name}`\n'
+                                           f'To accept this invite, they must run `{self.bot.prefix}accept {team_name}`'),
+                                           mention_author = False)
 
     @commands.command(name = 'accept', aliases = ['join'])
     @commands.cooldown(rate = 3, per = 300)
     async def accept(self, ctx, *args):
         if self.is_on_team(ctx.author.id):
-            return await ctx.message.reply(embed = self.get_embed(f'You are already on a team\n'
-                                           f'Run {self.bot.prefix}leave {self.get_team_name(ctx.author.id)} to leave your team'),
-                                           mention_author = False)
+            return await self.bot.outbox.reply(ctx, embed = self.get_embed(f'You are already on a team\n'
+                                               f'Run {self.bot.prefix}leave {self.get_team_name(ctx.author.id)} to leave your team'),
+                                               mention_author = False)
         team_name = " ".join(args)
-        team = self.teams[team_name]
-        if ctx.author.id not in team['invites']:
-            return await ctx.message.reply(embed = self.get_embed(f'You have not received an invite from `{team_name}`'),
-                                           mention_author = False)
+        invites = self.invites.get(ctx.author.id, ())
+        if not team_name and len(invites) == 1:
+            team_name = next(iter(invites))
+        team = self.find_team(team_name)
+        if team is None or ctx.author.id not in team['invites']:
+            return await self.bot.outbox.reply(ctx, embed = self.get_embed(f'You have not received an invite from `{team_name}`'),
+                                               mention_author = False)
 
-        team['invites'].remove(ctx.author.id)
-        team['members'].append(ctx.author.id)
-        self.players[str(ctx.author.id)] = team_name
-        self.save_players()
-        self.update_teams(team_name, team)
+        team_name = team['name']
+        self.commit('accept', team = team_name, player = ctx.author.id)
 
         await self.announce(ctx, f"<@{ctx.author.id}> joined `{team_name}`")
 
-        return await ctx.message.reply(embed = self.get_embed(f'You have successfully joined `{team_name}`'),
-                                       mention_author = False)
+        return await self.bot.outbox.reply(ctx, embed = self.get_embed(f'You have successfully joined `{team_name}`'),
+                                           mention_author = False)
 
     @commands.command(name = 'uninvite')
     async def uninvite(self, ctx, player: discord.User):
         if not self.is_on_team(ctx.author.id):
-            return await ctx.message.reply(embed = self.get_embed(f'You are not on a team'),
-                                           mention_author = False)
+            return await self.bot.outbox.reply(ctx, embed = self.get_embed(f'You are not on a team'),
+                                               mention_author = False)
 
         team = self.get_team(ctx.author.id)
         team_name = team['name']
         if team['leader'] != ctx.author.id:
-            return await ctx.message.reply(embed = self.get_embed(f'You are not a team leader. Only team leaders can uninvite players'),
-                                           mention_author = False)
+            return await self.bot.outbox.reply(ctx, embed = self.get_embed(f'You are not a team leader. Only team leaders can uninvite players'),
+                                               mention_author = False)
 
         if player.id not in team['invites']:
-            return await ctx.message.reply(embed = self.get_embed(f'User has not been invited to `{team_name}`'),
-                                           mention_author = False)
+            return await self.bot.outbox.reply(ctx, embed = self.get_embed(f'User has not been invited to `{team_name}`'),
+                                               mention_author = False)
 
-        team['invites'].remove(player.id)
-        self.update_teams(team['name'], team)
+        self.commit('uninvite', team = team_name, player = player.id)
 
-        return await ctx.message.reply(embed = self.get_embed(f'<@{player.id}> has been uninvited from `{team_name}`'),
-                                       mention_author = False)
+        return await self.bot.outbox.reply(ctx, embed = self.get_embed(f'<@{player.id}> has been uninvited from `{team_name}`'),
+                                           mention_author = False)
 
     @commands.command(name = 'reject')
     async def reject(self, ctx, *args):
         team_name = " ".join(args)
-        team = self.teams[team_name]
-        if ctx.author.id not in team['invites']:
-            return await ctx.message.reply(embed = self.get_embed(f'You have not received an invite from `{team_name}`'),
-                                           mention_author = False)
+        team = self.find_team(team_name)
+        if team is None or ctx.author.id not in team['invites']:
+            return await self.bot.outbox.reply(ctx, embed = self.get_embed(f'You have not received an invite from `{team_name}`'),
+                                               mention_author = False)
 
-        team['invites'].remove(ctx.author.id)
-        self.update_teams(team['name'], team)
+        team_name = team['name']
+        self.commit('uninvite', team = team_name, player = ctx.author.id)
 
-        return await ctx.message.reply(embed = self.get_embed(f'You have rejected `{team_name}`\'is invite'),
-                                       mention_author = False)
+        return await self.bot.outbox.reply(ctx, embed = self.get_embed(f'You have rejected `{team_name}`\'is invite'),
+                                           mention_author = False)
 
     @commands.command(name = 'leave', usage = 'leave <team_name>')
     @commands.cooldown(rate = 3, per = 300)
     async def leave(self, ctx, *args):
         if not self.is_on_team(ctx.author.id):
-            return await ctx.message.reply(embed = self.get_embed(f'You are not on a team'),
-                                           mention_author = False)
+            return await self.bot.outbox.reply(ctx, embed = self.get_embed(f'You are not on a team'),
+                                               mention_author = False)
         team_name = " ".join(args)
-        team = self.teams[team_name]
-        if ctx.author.id not in team['members']:
-            return await ctx.message.reply(embed = self.get_embed(f'You are not in `{team_name}`'),
-                                           mention_author = False)
+        team = self.find_team(team_name)
+        if team is None or ctx.author.id not in team['members']:
+            return await self.bot.outbox.reply(ctx, embed = self.get_embed(f'You are not in `{team_name}`'),
+                                               mention_author = False)
+
+        team_name = team['name']
 
         if team['leader'] == ctx.author.id:
-            return await ctx.message.reply(embed = self.get_embed(f'You are the team leader. Team leaders must use `{self.bot.prefix}disband <team_name>` instead'),
-                                           mention_author = False)
+            return await self.bot.outbox.reply(ctx, embed = self.get_embed(f'You are the team leader. Team leaders must use `{self.bot.prefix}disband <team_name>` instead'),
+                                               mention_author = False)
 
-        team['members'].remove(ctx.author.id)
-        self.players.pop(str(ctx.author.id))
-        self.save_players()
-        self.update_teams(team_name, team)
+        self.commit('leave', team = team_name, player = ctx.author.id)
 
         await self.announce(ctx, f"<@{ctx.author.id}> left `{team_name}`")
 
-        return await ctx.message.reply(embed = self.get_embed(f'You have successfully left `{team_name}`'),
-                                       mention_author = False)
+        return await self.bot.outbox.reply(ctx, embed = self.get_embed(f'You have successfully left `{team_name}`'),
+                                           mention_author = False)
 
     @commands.command(name = 'disband', aliases = ['abandon'], usage = 'disband <team_name>')
     async def disband(self, ctx, *args):
         if not self.is_on_team(ctx.author.id):
-            return await ctx.message.reply(embed = self.get_embed(f'You are not on a team'),
-                                           mention_author = False)
+            return await self.bot.outbox.reply(ctx, embed = self.get_embed(f'You are not on a team'),
+                                               mention_author = False)
 
         arg_name = " ".join(args)
 
         team = self.get_team(ctx.author.id)
         team_name = team['name']
 
-        if arg_name != team_name:
-            return await ctx.message.reply(embed = self.get_embed(f'You are not in team `{arg_name}`'),
-                                           mention_author = False)
+        if normalize_name(arg_name) != normalize_name(team_name):
+            return await self.bot.outbox.reply(ctx, embed = self.get_embed(f'You are not in team `{arg_name}`'),
+                                               mention_author = False)
 
         if team['leader'] != ctx.author.id:
-            return await ctx.message.reply(embed = self.get_embed(f'You are not a team leader. Only team leaders can disband the team'),
-                                           mention_author = False)
-
-        for member in team['members']:
-            self.players.pop(str(member))
-
-        for team_2 in self.teams.values():
-            if team_2['sign_up_position'] > team['sign_up_position']:
-                team_2['sign_up_position'] -= 1
-                self.teams[team_2['name']] = team_2
+            return await self.bot.outbox.reply(ctx, embed = self.get_embed(f'You are not a team leader. Only team leaders can disband the team'),
+                                               mention_author = False)
 
-        self.teams.pop(team_name)
-        self.save_teams()
-        self.save_players()
+        freed = not self.is_waitlisted(team_name)
+        self.commit('disband', team = team_name)
 
         await self.announce(ctx, f"`{team_name}` has been disbanded by <@{ctx.author.id}>")
+        if freed:
+            await self.announce_promotions(ctx, self.max_teams - 1, self.max_teams)
 
-        return await ctx.message.reply(embed = self.get_embed(f'Successfully disbanded {team_name}'),
-                                       mention_author = False)
+        return await self.bot.outbox.reply(ctx, embed = self.get_embed(f'Successfully disbanded {team_name}'),
+                                           mention_author = False)
 
     @commands.command(name = 'kick', aliases = ['remove'], usage = 'kick <DiscordID>')
     async def kick(self, ctx, player: discord.User):
         if not self.is_on_team(ctx.author.id):
-            return await ctx.message.reply(embed = self.get_embed(f'You are not on a team'),
-                                           mention_author = False)
+            return await self.bot.outbox.reply(ctx, embed = self.get_embed(f'You are not on a team'),
+                                               mention_author = False)
 
         team = self.get_team(ctx.author.id)
         team_name = team['name']
         if team['leader'] != ctx.author.id:
-            return await ctx.message.reply(embed = self.get_embed(f'You are not a team leader. Only team leaders can kick players'),
-                                           mention_author = False)
+            return await self.bot.outbox.reply(ctx, embed = self.get_embed(f'You are not a team leader. Only team leaders can kick players'),
+                                               mention_author = False)
 
         if player.id not in team['members']:
-            return await ctx.message.reply(embed = self.get_embed(f'User is not in `{team_name}`'),
-                                           mention_author = False)
+            return await self.bot.outbox.reply(ctx, embed = self.get_embed(f'User is not in `{team_name}`'),
+                                               mention_author = False)
 
-        team['members'].remove(player.id)
-        self.update_teams(team['name'], team)
-        self.players.pop(player.id)
-        self.save_players()
+        self.commit('leave', team = team_name, player = player.id)
 
         await self.announce(ctx, f"`{team_name}` has been kicked from the tourney by <@{ctx.author.id}>")
 
-        return await ctx.message.reply(embed = self.get_embed(f'<@{player.id}> has been kicked from `{team_name}`'),
-                                       mention_author = False)
+        return await self.bot.outbox.reply(ctx, embed = self.get_embed(f'<@{player.id}> has been kicked from `{team_name}`'),
+                                           mention_author = False)
 
     @commands.command(name = 'info', aliases = ['i'])
     async def info(self, ctx, player: discord.User):
         if not self.is_on_team(player.id):
-            return await ctx.message.reply(embed = self.get_embed(f'User is not on a team'),
-                                           mention_author = False)
+            return await self.bot.outbox.reply(ctx, embed = self.get_embed(f'User is not on a team'),
+                                               mention_author = False)
 
-        return await ctx.message.reply(embed = self.info_embed(self.get_team(player.id)),
-                                       mention_author = False)
+        return await self.bot.outbox.reply(ctx, embed = self.info_embed(self.get_team(player.id)),
+                                           mention_author = False)
 
     def info_embed(self, team):
         string = ''
         string += f'Name: {team["name"]}, ID: {team["id"]}\n'
         string += f'Wins: {team["wins"]}\n'
-        string += f'Losses: {team["loses"]}\n'
-        string += f'Members: {["<@" + x + ">" for x in team["members"]]}\n'
-        string += f'Invites: {["<@" + x + ">" for x in team["invites"]]}\n'
-        string += f'Sign Up Position: {team["sign_up_position"]}\n'
+        string += f'Losses: {team["losses"]}\n'
+        string += f'Members: {" ".join(f"<@{x}>" for x in team["members"])}\n'
+        string += f'Invites: {" ".join(f"<@{x}>" for x in team["invites"])}\n'
+        string += f'Sign Up Position: {self.sign_up_position(team["name"])}\n'
+        string += f'Rating: {self.rating_text(team["name"])}\n'
+        if self.is_waitlisted(team['name']):
+            string += f'Waitlist Position: {self.waitlist_position(team["name"]) + 1} of {self.waitlist_size()}\n'
         return self.get_embed(string)
 
     @commands.command(name = 'setmaxplayers')
     async def set_max_players(self, ctx, max_players):
-        if not any([discord.utils.get(ctx.guild.roles, id = x) in ctx.author.roles for x in self.manager_roles]):
-            return await ctx.message.reply(embed = self.get_embed(f'You are not a manager. Only managers can set max players'),
-                                           mention_author = False)
+        if not self.is_manager(ctx.author):
+            return await self.bot.outbox.reply(ctx, embed = self.get_embed(f'You are not a manager. Only managers can set max players'),
+                                               mention_author = False)
 
-        max_players = int(max_players)
-        self.max_players = max_players
-        return await ctx.message.reply(embed = self.get_embed(f'Max players set to {self.max_players}'),
-                                       mention_author = False)
+        self.commit('limits', max_players = int(max_players))
+        return await self.bot.outbox.reply(ctx, embed = self.get_embed(f'Max players set to {self.max_players}'),
+                                           mention_author = False)
 
     @commands.command(name = 'setmaxteams')
     async def set_max_teams(self, ctx, max_teams):
-        if not any([discord.utils.get(ctx.guild.roles, id = x) in ctx.author.roles for x in self.manager_roles]):
-            return await ctx.message.reply(embed = self.get_embed(f'You are not a manager. Only managers can set max teams'),
-                                           mention_author = False)
+        if not self.is_manager(ctx.author):
+            return await self.bot.outbox.reply(ctx, embed = self.get_embed(f'You are not a manager. Only managers can set max teams'),
+                                               mention_author = False)
 
         max_teams = int(max_teams)
-        self.max_teams = max_teams
-        return await ctx.message.reply(embed = self.get_embed(f'Max teams set to {self.max_teams}'),
-                                       mention_author = False)
+        old_max_teams = self.max_teams
+        self.commit('limits', max_teams = max_teams)
+        promoted = await self.announce_promotions(ctx, old_max_teams, max_teams)
+        return await self.bot.outbox.reply(ctx, embed = self.get_embed(f'Max teams set to {self.max_teams}\n'
+                                           f'{len(promoted)} teams moved off the waitlist, {self.waitlist_size()} still waiting'),
+                                           mention_author = False)
 
     @commands.command(name = 'cleargames')
     async def clear_games(self, ctx):
-        if not any([discord.utils.get(ctx.guild.roles, id = x) in ctx.author.roles for x in self.manager_roles]):
-            return await ctx.message.reply(embed = self.get_embed(f'You are not a manager. Only managers can clear games'),
-                                           mention_author = False)
+        if not self.is_manager(ctx.author):
+            return await self.bot.outbox.reply(ctx, embed = self.get_embed(f'You are not a manager. Only managers can clear games'),
+                                               mention_author = False)
 
-        for team in self.teams:
-            team['games'] = []
-            self.teams[team['name']] = team
+        self.commit('cleargames')
 
-        return await ctx.message.reply(embed = self.get_embed(f'Successfully cleared all games'),
-                                       mention_author = False)
+        return await self.bot.outbox.reply(ctx, embed = self.get_embed(f'Successfully cleared all games'),
+                                           mention_author = False)
 
     @commands.command(name = 'kickteam')
     async def kick_team(self, ctx, *args):
-        if not any([discord.utils.get(ctx.guild.roles, id = x) in ctx.author.roles for x in self.manager_roles]):
-            return await ctx.message.reply(embed = self.get_embed(f'You are not a manager. Only managers can clear games'),
+        if not self.is_manager(ctx.author):
+            return await self.bot.outbox.reply(ctx, embed = self.get_embed(f'You are not a manager. Only managers can clear games'),
+                                               mention_author = False)
+
+        team_name = " ".join(args)
+        team = self.find_team(team_name)
+        if team is None:
+            return await self.bot.outbox.reply(ctx, embed = self.get_embed(f'Team {team_name} does not exist'),
+                                               mention_author = False)
+
+        team_name = team['name']
+        freed = not self.is_waitlisted(team_name)
+        self.commit('disband', team = team_name)
+        if freed:
+            await self.announce_promotions(ctx, self.max_teams - 1, self.max_teams)
+
+        return await self.bot.outbox.reply(ctx, embed = self.get_embed(f'Successfully removed team {team_name}'),
+                                           mention_author = False)
+
+    def rating_text(self, team_name):
+        if self.rating_system == GLICKO2:
+            return f'{self.ratings.rating(team_name):.0f} ± {self.ratings.deviation(team_name):.0f}'
+        return f'{self.ratings.rating(team_name):.0f}'
+
+    @commands.command(name = 'rerate', usage = 'rerate [elo|glicko2]')
+    async def rerate(self, ctx, system = None):
+        if not self.is_manager(ctx.author):
+            return await self.bot.outbox.reply(ctx, embed = self.get_embed(f'You are not a manager. Only managers can recompute ratings'),
+                                               mention_author = False)
+
+        system = system or self.rating_system
+        if system not in (ELO, GLICKO2):
+            return await self.bot.outbox.reply(ctx, embed = self.get_embed(f'Rating system must be `{ELO}` or `{GLICKO2}`'),
+                                               mention_author = False)
+
+        # ratings are derived from the games, so switching systems is just a recompute
+        start = time.perf_counter()
+        ratings = rating_system(system)
+        ratings.recompute(self.game_history())
+        self.ratings = ratings
+        self.rating_system = system
+        return await self.bot.outbox.reply(ctx, embed = self.get_embed(f'Recomputed `{system}` ratings over {ratings.games} games '
+                                           f'in {(time.perf_counter() - start) * 1000:.0f}ms'),
+                                           mention_author = False)
+
+    @commands.command(name = 'makebracket', usage = 'makebracket [single|double] [signup|rating]')
+    async def make_bracket(self, ctx, kind = SINGLE, seeding = 'signup'):
+        if not self.is_manager(ctx.author):
+            return await self.bot.outbox.reply(ctx, embed = self.get_embed(f'You are not a manager. Only managers can make brackets'),
+                                               mention_author = False)
+
+        if kind not in (SINGLE, DOUBLE):
+            return await self.bot.outbox.reply(ctx, embed = self.get_embed(f'Bracket type must be `{SINGLE}` or `{DOUBLE}`'),
+                                               mention_author = False)
+
+        # everyone off the waitlist, seeded by sign-up order or by rating
+        seeds = list(itertools.islice(self.order, self.max_teams))
+        if seeding == 'rating':
+            seeds = seed_by_rating(seeds, {x: self.ratings.rating(x) for x in seeds})
+        if len(seeds) < 2:
+            return await self.bot.outbox.reply(ctx, embed = self.get_embed(f'At least 2 teams are needed to make a bracket'),
+                                               mention_author = False)
+
+        # the bracket is also a tournament in the shared store, so it shows up in pugstourney
+        # and its winners count towards the per-user history
+        tourney = await self.bot.tournaments.create(ctx.author.id, status = TourneyStatus.ONGOING,
+                                                    members = [f'<@{x}>' for name in seeds for x in self.teams[name]['members']])
+        self.commit('bracket', kind = kind, seeds = seeds, tourney = tourney.id)
+
+        await self.announce(ctx, f"A {kind} elimination bracket has been made for `{len(seeds)}` teams (tournament #{tourney.id})")
+
+        return await self.bot.outbox.reply(ctx, embed = self.bracket_embed(),
+                                           mention_author = False)
+
+    @commands.command(name = 'bracket', aliases = ['matches'])
+    async def view_bracket(self, ctx):
+        if self.bracket is None:
+            return await self.bot.outbox.reply(ctx, embed = self.get_embed(f'There is no bracket yet'),
+                                               mention_author = False)
+
+        return await self.bot.outbox.reply(ctx, embed = self.bracket_embed(),
                                            mention_author = False)
 
+    @commands.command(name = 'reportwin', usage = 'reportwin <match_id> <team_name>')
+    async def report_win(self, ctx, match_id: int, *args):
+        if not self.is_manager(ctx.author):
+            return await self.bot.outbox.reply(ctx, embed = self.get_embed(f'You are not a manager. Only managers can report results'),
+                                               mention_author = False)
+
+        if self.bracket is None:
+            return await self.bot.outbox.reply(ctx, embed = self.get_embed(f'There is no bracket yet'),
+                                               mention_author = False)
+
         team_name = " ".join(args)
-        if team_name not in self.teams.keys():
-            return await ctx.message.reply(embed = self.get_embed(f'Team {team_name} does not exist'),
+        team = self.find_team(team_name)
+        winner = team['name'] if team is not None else team_name
+        if not 0 <= match_id < len(self.bracket.matches) or not self.bracket.matches[match_id].ready():
+            return await self.bot.outbox.reply(ctx, embed = self.get_embed(f'Match `{match_id}` is not waiting for a result'),
+                                               mention_author = False)
+
+        match = self.bracket.matches[match_id]
+        if winner not in match.slots:
+            return await self.bot.outbox.reply(ctx, embed = self.get_embed(f'`{team_name}` is not playing in match `{match_id}`'),
+                                               mention_author = False)
+
+        self.commit('advance', bracket = self.bracket_created, match = match_id, winner = winner)
+
+        await self.announce(ctx, f"`{winner}` won match `{match_id}` against `{match.loser}`")
+        await self.finish_tourney(ctx)
+
+        return await self.bot.outbox.reply(ctx, embed = self.bracket_embed(),
                                            mention_author = False)
 
-        for team_2 in self.teams.values():
-            if team_2['sign_up_position'] > self.teams['team_name']['sign_up_position']:
-                team_2['sign_up_position'] -= 1
-                self.teams[team_2['name']] = team_2
-        self.teams.pop(team_name)
-        self.save_teams()
+    async def finish_tourney(self, ctx):
+        champion = self.bracket.champion
+        if champion is None:
+            return
+        await self.announce(ctx, f"`{champion}` has won the tournament")
+        if self.bot.tournaments.get(self.bracket_tourney) is not None:
+            team = self.teams.get(champion)
+            await self.bot.tournaments.update(self.bracket_tourney, status = TourneyStatus.FINISHED,
+                                              winners = [f'<@{x}>' for x in team['members']] if team is not None else [])
+
+    def bracket_embed(self):
+        bracket = self.bracket
+        if bracket.champion is not None:
+            return self.get_embed(f'Champion: `{bracket.champion}`')
+
+        names = {'W': 'Winners', 'L': 'Losers', 'F': 'Grand Final', 'R': 'Grand Final Reset'}
+        ready = bracket.ready()
+        string = f'{bracket.kind.capitalize()} elimination, {len(bracket.seeds)} teams\n'
+        for match in ready[:bracket_page_matches]:
+            label = names[match.bracket] if match.bracket in ('F', 'R') else f'{names[match.bracket]} R{match.round}'
+            string += f'`#{match.id}` {label}: `{match.slots[0]}` vs `{match.slots[1]}`\n'
+        if len(ready) > bracket_page_matches:
+            string += f'...and {len(ready) - bracket_page_matches} more matches\n'
+        string += f'Report results with `{self.bot.prefix}reportwin <match_id> <team_name>`'
+        return self.get_embed(string)
+
+    @commands.command(name = 'score', aliases = ['reportgame'], usage = 'score <team_1> <wins>-<wins> <team_2>')
+    async def score_game(self, ctx, *args):
+        if not self.is_manager(ctx.author):
+            return await self.bot.outbox.reply(ctx, embed = self.get_embed(f'You are not a manager. Only managers can score games'),
+                                               mention_author = False)
+
+        split = next((i for i, x in enumerate(args) if score_pattern.match(x)), None)
+        if split is None:
+            return await self.bot.outbox.reply(ctx, embed = self.get_embed(f'Please state the teams and the score:\n'
+                                               f'`{self.bot.prefix}score <team_1> <wins>-<wins> <team_2>`'),
+                                               mention_author = False)
+
+        for team_name in (" ".join(args[:split]), " ".join(args[split + 1:])):
+            if self.find_team(team_name) is None:
+                return await self.bot.outbox.reply(ctx, embed = self.get_embed(f'Team `{team_name}` does not exist'),
+                                                   mention_author = False)
+
+        team_1 = self.find_team(" ".join(args[:split]))
+        team_2 = self.find_team(" ".join(args[split + 1:]))
+        team_1_wins, team_2_wins = (int(x) for x in score_pattern.match(args[split]).groups())
+        if team_1 is team_2 or team_1_wins == team_2_wins:
+            return await self.bot.outbox.reply(ctx, embed = self.get_embed(f'A game needs two different teams and a winner'),
+                                               mention_author = False)
+
+        winner = team_1['name'] if team_1_wins > team_2_wins else team_2['name']
+        self.commit('score', game = {
+            'team_1': team_1['name'],
+            'team_2': team_2['name'],
+            'winner': winner,
+            'team_1_wins': team_1_wins,
+            'team_2_wins': team_2_wins
+        })
+
+        await self.announce(ctx, f"`{team_1['name']}` {team_1_wins}-{team_2_wins} `{team_2['name']}`, `{winner}` wins")
+
+        # a game between two teams that are due to meet in the bracket settles that match too
+        match = self.bracket.find_match(team_1['name'], team_2['name']) if self.bracket is not None else None
+        if match is not None:
+            self.commit('advance', bracket = self.bracket_created, match = match.id, winner = winner)
+            await self.finish_tourney(ctx)
+
+        return await self.bot.outbox.reply(ctx, embed = self.get_embed(f'Game recorded, `{winner}` wins {max(team_1_wins, team_2_wins)}-{min(team_1_wins, team_2_wins)}\n'
+                                           f'`{team_1["name"]}` is now #{self.standings.rank(team_1["name"]) + 1}, '
+                                           f'`{team_2["name"]}` is now #{self.standings.rank(team_2["name"]) + 1}'),
+                                           mention_author = False)
+
+    @commands.command(name = 'leaderboard', aliases = ['lb'])
+    async def leaderboard(self, ctx, page: int = 1):
+        if not len(self.standings):
+            return await self.bot.outbox.reply(ctx, embed = self.get_embed(f'There are no teams yet'),
+                                               mention_author = False)
 
-        return await ctx.message.reply(embed = self.get_embed(f'Successfully removed team {team_name}'),
-                                       mention_author = False)
+        return await Paginator(self.leaderboard_pages, ctx.author.id).start(ctx, page - 1)
+
+    def leaderboard_page(self, names, start):
+        string = ''
+        for i, name in enumerate(names, start + 1):
+            team = self.teams[name]
+            string += f'{i}. `{name}` {team["wins"]}W {team["losses"]}L ({self.diffs[name]:+})\n'
+        return self.get_embed(string)
+
+    @commands.command(name = 'savestats')
+    async def save_stats(self, ctx):
+        if not self.is_manager(ctx.author):
+            return await self.bot.outbox.reply(ctx, embed = self.get_embed(f'You are not a manager. Only managers can view save stats'),
+                                               mention_author = False)
+
+        stats = self.writer.stats()
+        string = f'Snapshots: {stats["writes"]} writes, {stats["coalesced"]} coalesced, {stats["pending"]} pending\n'
+        string += f'Journal: {self.journal.seq} records\n'
+        return await self.bot.outbox.reply(ctx, embed = self.get_embed(string),
+                                           mention_author = False)
+
+    def is_manager(self, member):
+        return self.guild_context.is_manager(member, 'tourney')
 
     async def announce(self, ctx, message):
-        channel = discord.utils.get(ctx.guild.channels, id = self.announce_channel)
-        return await channel.send(message)
+        channel = self.guild_context.channel('tourney_announcements')
+        # queued and batched by the outbox; the command does not wait for it to go out
+        return self.bot.outbox.announce(channel, message)
 
     def get_embed(self, description):
         return discord.Embed(
@@ -382,9 +912,5 @@ class Tourney(commands.Cog):
         ).set_footer(text = 'Tourney bot by Shroomie')
 
 
-    # score game
-    # view teams lb
-
-
 async def setup(bot):
     await bot.add_cog(Tourney(bot))
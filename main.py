@@ -1,93 +1,212 @@
+import time
+
+started = time.perf_counter()
+
 import asyncio
 import os
 
 import discord
-from cogs.tourney import *
+from utils.storage import Storage
+from utils.guild import GuildContext, load_config
+from utils.metrics import metrics
+from utils.members import CachedMember, MemberCache, member_cache_size, member_cache_ttl
+from utils.outbox import PRIORITY_ANNOUNCEMENT, PRIORITY_CONFIRMATION, PRIORITY_REPLY, Outbox
+from utils.paginator import PageSource, Paginator
+from utils.scheduler import DeadlineScheduler
+from utils.startup import StartupTimings
+from utils.strikes import VOUCH_EMOJI, StrikeStatus
+from utils.tally import TallyUpdater
+from utils.tournaments import TournamentStore
+from utils.votes import BALLOT_NO, BALLOT_YES, Vote, VoteBook, VoteStatus
 
 import discord.ext
-import random
 from datetime import datetime
-import json
 
 import datetime
 from discord.ui import View, Button
 from discord.ext import commands
 
-intents = discord.Intents.all()
-intents.presences = False
-
-bot = commands.Bot(command_prefix="-", intents=intents)
+# server, role and channel ids live in config.json
+guild_context = GuildContext(load_config())
+member_config = guild_context.config.get("members", {})
+
+
+class PugsBot(commands.Bot):
+    async def close(self):
+        await metrics.close()
+        await super().close()
+
+
+if member_config.get("lean", False):
+    # only what the commands and reaction handlers use; members are fetched when needed
+    intents = discord.Intents.none()
+    intents.guilds = True
+    intents.guild_messages = True
+    intents.guild_reactions = True
+    intents.message_content = True
+    bot = PugsBot(command_prefix="-", intents=intents, chunk_guilds_at_startup=False,
+                  member_cache_flags=discord.MemberCacheFlags.none(), http_trace=metrics.http_trace())
+else:
+    intents = discord.Intents.all()
+    intents.presences = False
+    bot = PugsBot(command_prefix="-", intents=intents, http_trace=metrics.http_trace())
+
+bot.startup = StartupTimings(started)
+bot.startup.start("import", started)
+bot.guild_context = guild_context
+bot.members = MemberCache(member_config.get("cache_size", member_cache_size),
+                          member_config.get("cache_ttl", member_cache_ttl))
+bot.outbox = Outbox()
+bot.storage_ready = asyncio.Event()
+storage = Storage()
+bot.tournaments = TournamentStore(storage)
+vote_book = VoteBook(storage)
 # -- Constants
 
-SERVER_ID = 1014230302622744677
-VOTE_CHANNEL_PUGS = 1032999595220946944
-PUGS_ROLE = 1014279626626977864
-PUGS_MANAGER_ROLE = 1014292585700929637
-PUGS_CONFIRM = 1147799167419297832
-STRIKE_REQUEST_CHANNEL = 1016363028649889922
-CONFIRM_STRIKE_CHANNEL = 1147884477847179316
-PUGS_ANNOUNCEMENTS = 1014281385906811031
-PUGS_TRIAL_ROLE = 1047032587631210496
-PREMIUM_MANAGER_ROLE = 1
-PREMIUM_ROLE = 1
-PREMIUM_INVITE = 1
-PUGS_SPEC = 1
-PREMIUM_ANNOUNCEMENTS = 1
+VOTE_LIFETIME = 7 * 24 * 60 * 60
+EXTENSIONS = ["cogs.tourney"]
+VOTE_BUTTON_LABELS = (("callback", "pugsvote"),)
 # -- Functions
 
+
+def pugs_manager():
+    return commands.check(lambda ctx: guild_context.is_manager(ctx.author))
+
+
+def premium_manager():
+    return commands.check(lambda ctx: guild_context.is_manager(ctx.author, "premium"))
+
+
     # Commands
 commands_dir = './cogs'
 commands_dir_p = "cogs"
 
+async def load_storage():
+    try:
+        with bot.startup.phase("storage"):
+            await storage.open()
+            await storage.migrate_json()
+            await bot.tournaments.load()
+            OpenVotes = await vote_book.load()
+            vote_expiry.load((vote.user_id, (vote.created or 0) + VOTE_LIFETIME) for vote in OpenVotes)
+    except Exception:
+        # nothing works without the database; stopping beats every command waiting forever
+        await bot.close()
+        raise
+    bot.storage_ready.set()
+
+
+@bot.event
+async def setup_hook():
+    # discord.py only logs in and connects once this returns, so the storage load runs as a
+    # task alongside that; commands, buttons and reactions wait on bot.storage_ready
+    bot.startup.track(asyncio.create_task(load_storage()))
+    # each cog reads its data in the background from cog_load, so this returns quickly
+    with bot.startup.phase("cogs"):
+        for name in EXTENSIONS:
+            await bot.load_extension(name)
+    bot.add_dynamic_items(VoteButton)
+    metrics.watch_loop()
+    metrics_config = guild_context.config.get("metrics", {})
+    if metrics_config.get("port"):
+        await metrics.serve(metrics_config.get("host", "127.0.0.1"), metrics_config["port"])
+    bot.startup.start("gateway")
+
+
+@bot.event
+async def on_ready():
+    # runs again after every reconnect, which also picks up anything missed while away
+    guild_context.resolve(bot)
+    # overdue votes are closed as soon as this starts, which needs the gateway up and the votes loaded
+    await bot.storage_ready.wait()
+    await upgrade_legacy_vote_messages()
+    vote_expiry.start()
+    bot.startup.end("gateway")
+    await bot.startup.finish()
+
+
+@bot.event
+async def on_guild_available(guild):
+    if guild.id == guild_context.guild_id:
+        guild_context.resolve(bot)
+
+
+@bot.event
+async def on_guild_role_create(role):
+    guild_context.role_changed(role)
+
+
+@bot.event
+async def on_guild_role_update(before, after):
+    guild_context.role_changed(after)
+
+
+@bot.event
+async def on_guild_role_delete(role):
+    guild_context.role_changed(role, deleted=True)
+
+
+@bot.event
+async def on_guild_channel_create(channel):
+    guild_context.channel_changed(channel)
+
+
+@bot.event
+async def on_guild_channel_update(before, after):
+    guild_context.channel_changed(after)
+
+
+@bot.event
+async def on_guild_channel_delete(channel):
+    guild_context.channel_changed(channel, deleted=True)
+
 # -- Commands
 
-@commands.has_role(PUGS_MANAGER_ROLE)
+@pugs_manager()
 @bot.command(name="pugstrial", description="Give or remove Pugs trial from someone")
-async def pugstrial(ctx, setting: str, user: discord.Member):
-    server = bot.get_guild(SERVER_ID)
-    pugsannc = server.get_channel(PUGS_ANNOUNCEMENTS)
+async def pugstrial(ctx, setting: str, user: CachedMember):
+    pugsannc = guild_context.channel("pugs_announcements")
     if setting.lower() == "add":
-        PugsTrialRole = server.get_role(PUGS_TRIAL_ROLE)
-        PugsRole = server.get_role(PUGS_ROLE)
+        PugsTrialRole = guild_context.role("pugs_trial")
+        PugsRole = guild_context.role("pugs")
         if not PugsTrialRole in user.roles:
             await user.add_roles(PugsTrialRole)
             Embed_Channel = discord.Embed(title="Ranked Bedwars PUGs",
                                           description=f"You have successfully given <@{user.id}> PUGs Trial!",
                                           color=0xe91e63)
 
-            await ctx.send(content=user.mention, embed=Embed_Channel)
+            await bot.outbox.send(ctx.channel, content=user.mention, embed=Embed_Channel)
 
             Embed_PUGS = discord.Embed(title="Ranked Bedwars PUGs",
                                        description=f"Congratulations {user.mention} for receiving `PUGs Trial`!",
                                        color=0x992d22)
-            await pugsannc.send(content=user.mention, embed=Embed_PUGS)
+            bot.outbox.announce(pugsannc, content=user.mention, embed=Embed_PUGS)
         if not PugsRole in user.roles:
             await user.add_roles(PugsRole)
     elif setting.lower() == "remove":
-        PugsRole = server.get_role(PUGS_ROLE)
-        PugsTrialRole = server.get_role(PUGS_TRIAL_ROLE)
+        PugsRole = guild_context.role("pugs")
+        PugsTrialRole = guild_context.role("pugs_trial")
         if PugsTrialRole in user.roles:
             await user.remove_roles(PugsTrialRole)
             Embed_Channel = discord.Embed(title="Ranked Bedwars PUGs",
                                           description=f"Succesfully removed PUGs Trial from <@{user.id}>",
                                           color=0xe91e63)
 
-            await ctx.send(content=user.mention, embed=Embed_Channel)
+            await bot.outbox.send(ctx.channel, content=user.mention, embed=Embed_Channel)
     else:
 
         Embed_Channel = discord.Embed(title="Ranked Bedwars",
                                       description=f"Accepted Arguements: add | remove (usage: .pugstrial <add/remove> <user>)"
                                       )
 
-        await ctx.send(content=user.mention, embed=Embed_Channel)
+        await bot.outbox.send(ctx.channel, content=user.mention, embed=Embed_Channel)
 
-@commands.has_any_role("[Manager] Premium")
+@premium_manager()
 @bot.command(name="premiuminv", description="Give or remove Premium Invite from someone")
-async def premiuminv(ctx, setting: str, user: discord.Member):
-    server = bot.get_guild(SERVER_ID)
-    pugsannc = server.get_channel(PREMIUM_ANNOUNCEMENTS)
+async def premiuminv(ctx, setting: str, user: CachedMember):
+    pugsannc = guild_context.channel("premium_announcements")
     if setting.lower() == "add":
-        PremiumInviteRole = server.get_role(PREMIUM_INVITE)
+        PremiumInviteRole = guild_context.role("premium_invite")
          
         if not PremiumInviteRole in user.roles:
             await user.add_roles(PremiumInviteRole)
@@ -95,37 +214,35 @@ async def premiuminv(ctx, setting: str, user: discord.Member):
                                           description=f"You have successfully given <@{user.id}> Prmeium Invite!",
                                           color=0xe91e63)
 
-            await ctx.send(content=user.mention, embed=Embed_Channel)
+            await bot.outbox.send(ctx.channel, content=user.mention, embed=Embed_Channel)
 
             Embed_PUGS = discord.Embed(title="Ranked Bedwars Premium",
                                        description=f"Congratulations {user.mention} for receiving `Premium Invite`!",
                                        color=0x992d22)
-            await pugsannc.send(content=user.mention, embed=Embed_PUGS)
+            bot.outbox.announce(pugsannc, content=user.mention, embed=Embed_PUGS)
          
     elif setting.lower() == "remove":
          
-        PremiumInviteRole = server.get_role(PREMIUM_INVITE)
+        PremiumInviteRole = guild_context.role("premium_invite")
         if PremiumInviteRole in user.roles:
             await user.remove_roles(PremiumInviteRole)
             Embed_Channel = discord.Embed(title="Ranked Bedwars Premium",
                                           description=f"Succesfully removed Premium Invite from <@{user.id}>",
                                           color=0xe91e63)
 
-            await ctx.send(content=user.mention, embed=Embed_Channel)
+            await bot.outbox.send(ctx.channel, content=user.mention, embed=Embed_Channel)
     else:
 
         Embed_Channel = discord.Embed(title="Ranked Bedwars",
                                       description=f"Accepted Arguements: add | remove (usage: .premiuminv <add/remove> <user>)"
                                       )
 
-        await ctx.send(content=user.mention, embed=Embed_Channel)
-@commands.has_any_role("[Manager] Pugs")
+        await bot.outbox.send(ctx.channel, content=user.mention, embed=Embed_Channel)
+@pugs_manager()
 @bot.command(name="pugspec", description="Give or remove Pugs spec from someone")
-async def pugspec(ctx, setting: str, user: discord.Member):
-    server = bot.get_guild(SERVER_ID)
-     
+async def pugspec(ctx, setting: str, user: CachedMember):
     if setting.lower() == "add":
-        PugsSpec = server.get_role(PUGS_SPEC)
+        PugsSpec = guild_context.role("pugs_spec")
          
         if not PugsSpec in user.roles:
             await user.add_roles(PugsSpec)
@@ -133,258 +250,244 @@ async def pugspec(ctx, setting: str, user: discord.Member):
                                           description=f"You have successfully given <@{user.id}> Pugs Spectator.",
                                           color=0xe91e63)
 
-            await ctx.send(content=user.mention, embed=Embed_Channel)
+            await bot.outbox.send(ctx.channel, content=user.mention, embed=Embed_Channel)
 
             
          
     elif setting.lower() == "remove":
          
-        PugsSpec = server.get_role(PUGS_SPEC)
+        PugsSpec = guild_context.role("pugs_spec")
         if PugsSpec in user.roles:
             await user.remove_roles(PugsSpec)
             Embed_Channel = discord.Embed(title="Ranked Bedwars PUGs",
                                           description=f"Succesfully removed Pugs Spectator from <@{user.id}>",
                                           color=0xe91e63)
 
-            await ctx.send(content=user.mention, embed=Embed_Channel)
+            await bot.outbox.send(ctx.channel, content=user.mention, embed=Embed_Channel)
     else:
 
         Embed_Channel = discord.Embed(title="Ranked Bedwars",
                                       description=f"Accepted Arguements: add | remove (usage: .pugspec <add/remove> <user>)"
                                       )
 
-        await ctx.send(content=user.mention, embed=Embed_Channel)
+        await bot.outbox.send(ctx.channel, content=user.mention, embed=Embed_Channel)
 
-@bot.command(name="pugsvote", description="Request a pugs vote", aliases=["pv", "vote"])
-async def pugsvote(ctx, query: str, user: discord.Member = None):
-    server = bot.get_guild(SERVER_ID)
-    pugsrole = server.get_role(PUGS_ROLE)
-    pugsmanager = server.get_role(PUGS_MANAGER_ROLE)
-    pugsvoting = server.get_channel(VOTE_CHANNEL_PUGS)
-    pugsconfirmation = server.get_channel(PUGS_CONFIRM)
-    with open("DataVote.json", "r", encoding="utf-8") as rt:
-        rt.seek(0)
-        DataVote = json.load(rt)
 
-    if query.lower() == "request":
+class VoteButton(discord.ui.DynamicItem[Button], template=r"pugsvote:(?P<choice>[01]):(?P<candidate>[0-9]+)"):
+    # the custom_id carries everything a click needs, so one registered class handles
+    # every vote message, keeps no per-vote state and survives restarts
+    def __init__(self, candidate_id, choice):
+        super().__init__(
+            Button(label="", style=discord.ButtonStyle.secondary, emoji="✅" if choice == BALLOT_YES else "❌",
+                   custom_id=f"pugsvote:{choice}:{candidate_id}")
+        )
+        self.candidate_id = candidate_id
+        self.choice = choice
 
-        if str(ctx.message.author.id) in DataVote:
-            if ":" not in DataVote[str(ctx.message.author.id)]:
-                QrVote = DataVote[str(ctx.message.author.id)]
-                if QrVote == "0" or QrVote == "1":
-                    DataVote[str(ctx.message.author.id)] = "3"
-                    em1 = discord.Embed(
-                        title=ctx.message.author.display_name,
-                        description=f"PENDING",
-                        color=discord.Color.from_rgb(255, 255, 255),
-                    )
-                    em1.set_author(name="RBW Pugs")
-                    messagePugs = await pugsconfirmation.send(
-                        content=ctx.message.author.id, embed=em1
-                    )
-                    await messagePugs.add_reaction("✅")
-                    await messagePugs.add_reaction("❌")
-                    em2 = discord.Embed(
-                        title="RBW Pugs",
-                        description=f"Succesfully requested a vote.",
-                        color=discord.Color.from_rgb(255, 255, 255),
-                    )
-                    await ctx.reply(embed=em2, ephemeral=True)
-                elif QrVote == "3":
-                    em2 = discord.Embed(
-                        title="RBW Pugs",
-                        description=f"You have already requested a vote that is yet to be reviewed.",
-                        color=discord.Color.from_rgb(255, 255, 255),
-                    )
-                    await ctx.reply(embed=em2, ephemeral=True)
-                with open("DataVote.json", "w") as wwr:
-                    json.dump(DataVote, wwr)
+    @classmethod
+    async def from_custom_id(cls, interaction, item, match):
+        return cls(int(match["candidate"]), int(match["choice"]))
+
+    async def callback(self, di: discord.Interaction):
+        with metrics.timer("interaction_seconds", VOTE_BUTTON_LABELS):
+            await bot.storage_ready.wait()
+            await cast_ballot(di, self.candidate_id, self.choice)
+
+
+def build_vote_view(userVote):
+    view = View(timeout=None)
+    view.add_item(VoteButton(userVote.id, BALLOT_YES))
+    view.add_item(VoteButton(userVote.id, BALLOT_NO))
+    return view
+
+
+async def vote_embed(candidate_id, yes=0, no=0):
+    member = await bot.members.get(guild_context.guild, candidate_id)
+    EmbedVote = discord.Embed(title="RBW PUGs", description=member.display_name if member else f"<@{candidate_id}>",
+                              color=discord.Color.from_rgb(43, 73, 222))
+    EmbedVote.add_field(name="Votes", value=f"**{yes}** ✅ | **{no}** ❌")
+    return EmbedVote
+
+
+async def refresh_vote_message(channel_id, message_id, candidate_id):
+    if not vote_book.is_open(candidate_id, message_id):
+        return
+    msg = bot.get_channel(channel_id).get_partial_message(message_id)
+    await msg.edit(embed=await vote_embed(candidate_id, *vote_book.tally(candidate_id)))
+
+
+tally_updates = TallyUpdater(refresh_vote_message)
+
+
+async def cast_ballot(di, candidate_id, choice):
+    Cast = await vote_book.cast(candidate_id, di.message.id, di.user.id, choice)
+    if Cast is None:
+        await di.response.send_message("This vote is closed.", ephemeral=True)
+        return
+    previous, current = Cast
+    tally_updates.schedule(di.channel_id, di.message.id, candidate_id)
+    if current is None:
+        await di.response.send_message("Your vote has been removed.", ephemeral=True)
+    elif previous is None:
+        await di.response.send_message("You have successfully voted.", ephemeral=True)
+    else:
+        await di.response.send_message("Your vote has been changed.", ephemeral=True)
+
+
+async def open_vote(userVote):
+    PugsVoteChannel = guild_context.channel("pugs_vote")
+    ddm = await PugsVoteChannel.send(
+        embed=await vote_embed(userVote.id), view=build_vote_view(userVote)
+    )
+    NewVote = await vote_book.open(userVote.id, ddm.id)
+    vote_expiry.schedule(userVote.id, NewVote.created + VOTE_LIFETIME)
+
+
+async def upgrade_legacy_vote_messages():
+    # votes imported from DataVote.json still show the old buttons or reactions, which nothing
+    # handles any more; give them the persistent ones, or close the vote if its message is gone
+    pugsvoting = bot.get_partial_messageable(guild_context.channel_ids["pugs_vote"])
+    for Rrt in await storage.legacy_vote_messages():
+        if Rrt.status == VoteStatus.OPEN:
+            msg = pugsvoting.get_partial_message(Rrt.message_id)
+            try:
+                await msg.edit(embed=await vote_embed(Rrt.user_id, *vote_book.tally(Rrt.user_id)),
+                               view=build_vote_view(discord.Object(Rrt.user_id)))
+            except discord.NotFound:
+                await vote_book.close(Rrt.user_id)
+                vote_expiry.cancel(Rrt.user_id)
+            except discord.HTTPException:
+                # left for the next on_ready
+                continue
             else:
-                DataVote[str(ctx.message.id)] = "0"
-                with open("DataVote.json", "w") as wwr:
-                    json.dump(DataVote, wwr)
+                try:
+                    await msg.clear_reactions()
+                except discord.HTTPException:
+                    pass
+        await storage.forget_legacy_vote_message(Rrt.user_id)
+
+
+async def expire_vote(candidate_id):
+    # the vote ran its course: freeze the final tally on the message and let go of its state
+    await vote_book.close(candidate_id, VoteStatus.CLOSED, freeze_vote_message("This vote has closed"))
+
+
+def freeze_vote_message(footer, content=None):
+    async def final(Rrt):
+        EmbedVote = await vote_embed(Rrt.user_id, Rrt.yes, Rrt.no)
+        EmbedVote.set_footer(text=footer)
+        # by id, so this works before the channel cache is resolved
+        msg = bot.get_partial_messageable(guild_context.channel_ids["pugs_vote"]).get_partial_message(Rrt.message_id)
+        try:
+            await msg.edit(content=content, embed=EmbedVote, view=None)
+        except discord.HTTPException:
+            # deleted message or missing permissions; closing the vote shouldn't hinge on it
+            pass
+    return final
 
+
+vote_expiry = DeadlineScheduler(expire_vote)
+
+
+@bot.command(name="pugsvote", description="Request a pugs vote", aliases=["pv", "vote"])
+async def pugsvote(ctx, query: str, user: CachedMember = None):
+    pugsconfirmation = guild_context.channel("pugs_confirm")
+
+    if query.lower() == "request":
+        async with vote_book.hold(ctx.message.author.id):
+            QrVote = await storage.get_vote(ctx.message.author.id)
+            QrStatus = QrVote.status if QrVote is not None else VoteStatus.NONE
+            if QrStatus in (VoteStatus.NONE, VoteStatus.CLOSED):
+                em1 = discord.Embed(
+                    title=ctx.message.author.display_name,
+                    description=f"PENDING",
+                    color=discord.Color.from_rgb(255, 255, 255),
+                )
+                em1.set_author(name="RBW Pugs")
+                messagePugs = await bot.outbox.send(
+                    pugsconfirmation, PRIORITY_CONFIRMATION, content=ctx.message.author.id, embed=em1
+                )
+                await storage.put_vote(Vote(ctx.message.author.id, VoteStatus.PENDING, message_id=messagePugs.id))
+                bot.outbox.react(messagePugs, "✅", "❌")
+                em2 = discord.Embed(
+                    title="RBW Pugs",
+                    description=f"Succesfully requested a vote.",
+                    color=discord.Color.from_rgb(255, 255, 255),
+                )
+                await bot.outbox.reply(ctx, embed=em2, ephemeral=True)
+            elif QrStatus == VoteStatus.PENDING:
+                em2 = discord.Embed(
+                    title="RBW Pugs",
+                    description=f"You have already requested a vote that is yet to be reviewed.",
+                    color=discord.Color.from_rgb(255, 255, 255),
+                )
+                await bot.outbox.reply(ctx, embed=em2, ephemeral=True)
+            else:
                 em2 = discord.Embed(
                     title="RBW Pugs",
                     description=f"You already have a vote!",
                     color=discord.Color.from_rgb(255, 255, 255),
                 )
-                await ctx.reply(embed=em2, ephemeral=True)
-        else:
-
-            DataVote[str(ctx.message.author.id)] = "0"
-            with open("DataVote.json", "w") as wwr:
-                json.dump(DataVote, wwr)
-
-            em2 = discord.Embed(
-                title="RBW Pugs",
-                description=f"You have been added to the database. Please run the command again.",
-                color=discord.Color.from_rgb(255, 255, 255),
-            )
-            await ctx.reply(embed=em2, ephemeral=True)
+                await bot.outbox.reply(ctx, embed=em2, ephemeral=True)
     elif query.lower() == "give":
-        if not pugsmanager in user.roles:
+        if not guild_context.is_manager(ctx.message.author):
             em2 = discord.Embed(
                 title="RBW Pugs",
                 description=f"You have to have `PUGS MANAGER` in order to give other people votes.",
                 color=discord.Color.from_rgb(255, 255, 255),
             )
-            await ctx.reply(embed=em2, ephemeral=True)
+            await bot.outbox.reply(ctx, embed=em2, ephemeral=True)
             return
-        PugsVoteChannel = server.get_channel(VOTE_CHANNEL_PUGS)
         userVote = user
-        EmbedVote = discord.Embed(title="RBW PUGs", description=userVote.display_name,
-                                  color=discord.Color.from_rgb(43, 73, 222))
-        buttonYes = Button(label="", style=discord.ButtonStyle.secondary, emoji="✅")
-        buttonNo = Button(label="", style=discord.ButtonStyle.secondary, emoji="❌")
-        if str(userVote.id) in DataVote:
+        async with vote_book.hold(userVote.id):
+            QrVote = await storage.get_vote(userVote.id)
+            if QrVote is not None and QrVote.status == VoteStatus.OPEN:
+                em2 = discord.Embed(
+                    title="RBW Pugs",
+                    description=f"This user already has an active vote. please do -pugsvote withdraw <user> to remove it.",
+                    color=discord.Color.from_rgb(255, 255, 255),
+                )
+                await bot.outbox.reply(ctx, embed=em2, ephemeral=True)
+                return
             em2 = discord.Embed(
                 title="RBW Pugs",
-                description=f"This user already has an active vote. please do -pugsvote withdraw <user> to remove it.",
+                description=f"Successfully gave {userVote.mention} a vote. ",
                 color=discord.Color.from_rgb(255, 255, 255),
             )
-            await ctx.reply(embed=em2, ephemeral=True)
-            return
-        em2 = discord.Embed(
-            title="RBW Pugs",
-            description=f"Successfully gave {userVote.mention} a vote. ",
-            color=discord.Color.from_rgb(255, 255, 255),
-        )
-        await ctx.reply(embed=em2, ephemeral=True)
-
-        async def buttonYesCallback(di: discord.Interaction):
-
-            with open("Datauser.json", "r") as drr:
-                DataUser = json.load(drr)
-            if str(di.user.id) in DataUser:
-                if str(f"{userVote.id}:1") in DataUser[str(di.user.id)]:
-                    DataUser[str(di.user.id)].remove(str(f"{userVote.id}:1"))
-
-                    await di.response.send_message("Your vote has been removed.", ephemeral=True)
-                    DataVote[str(userVote.id)] = str(
-                        f"{(int(DataVote[str(userVote.id)].split(':')[0]) - 1)}:{':'.join(DataVote[str(userVote.id)].split(':')[1::])}"
-                    )
-                    print(DataVote[str(userVote.id)])
-                else:
-                    DataUser[str(di.user.id)].append(str(f"{userVote.id}:1"))
-                    await di.response.send_message("You have successfully voted.", ephemeral=True)
-                    DataVote[str(userVote.id)] = str(
-                        f"{(int(DataVote[str(userVote.id)].split(':')[0]) + 1)}:{':'.join(DataVote[str(userVote.id)].split(':')[1::])}"
-                    )
-                    print(DataVote[str(userVote.id)])
-            else:
-                DataUser[str(di.user.id)] = [str(f"{userVote.id}:1")]
-
-                await di.response.send_message("You have successfully voted.", ephemeral=True)
-                DataVote[str(userVote.id)] = str(
-                    f"{(int(DataVote[str(userVote.id)].split(':')[0]) + 1)}:{':'.join(DataVote[str(userVote.id)].split(':')[1::])}"
-                )
-            with open("DataUser.json", "w") as tfr:
-                json.dump(DataUser, tfr)
-            with open("DataVote.json", "w") as wwr:
-                json.dump(DataVote, wwr)
-
-        async def buttonNoCallback(di: discord.Interaction):
-
-            with open("Datauser.json", "r") as drr:
-                DataUser = json.load(drr)
-            if str(di.user.id) in DataUser:
-                if str(f"{userVote.id}:0") in DataUser[str(di.user.id)]:
-                    DataUser[str(di.user.id)].remove(str(f"{userVote.id}:0"))
-
-                    await di.response.send_message("Your vote has been removed.", ephemeral=True)
-                    DataVote[str(userVote.id)] = str(
-                        f"{DataVote[str(userVote.id)].split(':')[0]}:{(int(DataVote[str(userVote.id)].split(':')[1]) - 1)}:{':'.join(DataVote[str(userVote.id)].split(':')[2::])}"
-                    )
-                else:
-
-                    DataUser[str(di.user.id)].append(str(f"{userVote.id}:0"))
-                    await di.response.send_message("You have successfully voted.", ephemeral=True)
-                    DataVote[str(userVote.id)] = str(
-                        f"{DataVote[str(userVote.id)].split(':')[0]}:{(int(DataVote[str(userVote.id)].split(':')[1]) + 1)}:{':'.join(DataVote[str(userVote.id)].split(':')[2::])}"
-                    )
-            else:
-                DataUser[str(di.user.id)] = [str(f"{userVote.id}:0")]
-
-                await di.response.send_message("You have successfully voted.", ephemeral=True)
-                DataVote[str(userVote.id)] = str(
-                    f"{DataVote[str(userVote.id)].split(':')[0]}:{(int(DataVote[str(userVote.id)].split(':')[1]) + 1)}:{':'.join(DataVote[str(userVote.id)].split(':')[2::])}"
-                )
-            with open("DataUser.json", "w") as tfr:
-                json.dump(DataUser, tfr)
-            with open("DataVote.json", "w") as wwr:
-                json.dump(DataVote, wwr)
-
-        view = View()
-        view.add_item(buttonYes)
-        view.add_item(buttonNo)
-        buttonYes.callback = buttonYesCallback
-        buttonNo.callback = buttonNoCallback
-        ddm = await PugsVoteChannel.send(
-            embed=EmbedVote, view=view
-        )
-
-        DataVote[
-            str(userVote.id)
-        ] = f"0:0:{datetime.date.today().strftime('%Y:%m:%d')}:{ddm.id}"
-
-        with open("DataVote.json", "w") as wwr:
-            json.dump(DataVote, wwr)
+            await bot.outbox.reply(ctx, embed=em2, ephemeral=True)
+            await open_vote(userVote)
 
     elif query.lower() == "withdraw":
-        if str(ctx.message.author.id) in DataVote:
-            if ":" in DataVote[str(ctx.message.author.id)]:
-                Rrt = DataVote[str(ctx.message.author.id)]
-                dateNow = datetime.date.today()
-                dateThen = datetime.date(
-                    int(Rrt.split(":")[2]),
-                    int(Rrt.split(":")[3]),
-                    int(Rrt.split(":")[4]),
-                )
-                dateDelta = (dateNow - dateThen).days  # Credited
-                if int(dateDelta) > 7:
-                    msga = await pugsvoting.fetch_message(Rrt.split(":")[5])
-                    await msga.edit(content=f"{msga.content} **WITHDRAWN**")
-                    await msga.clear_reactions()
-                    em2 = discord.Embed(
-                        title="RBW Pugs",
-                        description=f"Your vote has been withdrawn succesfully.",
-                        color=discord.Color.from_rgb(255, 255, 255),
-                    )
-                    await ctx.reply(embed=em2, ephemeral=True)
-                    DataVote[str(ctx.message.author.id)] = "0"
-                    with open("DataVote.json", "w") as wwr:
-                        json.dump(DataVote, wwr)
-                else:
-                    em2 = discord.Embed(
-                        title="RBW Pugs",
-                        description=f"You have to wait 7 days since your vote creation date to request another vote.",
-                        color=discord.Color.from_rgb(161, 19, 6),
-                    )
-                    await ctx.reply(embed=em2, ephemeral=True)
-            else:
-                em2 = discord.Embed(
-                    title="RBW Pugs",
-                    description=f"You do not have an ongoing vote.",
-                    color=discord.Color.from_rgb(255, 255, 255),
-                )
-                await ctx.reply(embed=em2, ephemeral=True)
+        Rrt = await storage.get_vote(ctx.message.author.id)
+        if Rrt is not None and Rrt.status == VoteStatus.OPEN and time.time() < (Rrt.created or 0) + VOTE_LIFETIME:
+            em2 = discord.Embed(
+                title="RBW Pugs",
+                description=f"You have to wait 7 days since your vote creation date to request another vote.",
+                color=discord.Color.from_rgb(161, 19, 6),
+            )
+            await bot.outbox.reply(ctx, embed=em2, ephemeral=True)
+        elif Rrt is not None and await vote_book.close(ctx.message.author.id, VoteStatus.NONE,
+                                                       freeze_vote_message("This vote was withdrawn", "**WITHDRAWN**")):
+            # only reachable between the deadline and expiry getting to it
+            vote_expiry.cancel(ctx.message.author.id)
+            em2 = discord.Embed(
+                title="RBW Pugs",
+                description=f"Your vote has been withdrawn succesfully.",
+                color=discord.Color.from_rgb(255, 255, 255),
+            )
+            await bot.outbox.reply(ctx, embed=em2, ephemeral=True)
         else:
-            DataVote[str(ctx.message.author.id)] = "0"
-            with open("DataVote.json", "w") as wwr:
-                json.dump(DataVote, wwr)
-
             em2 = discord.Embed(
                 title="RBW Pugs",
-                description=f"You have been added to the database. Please run the command again.",
+                description=f"You do not have an ongoing vote.",
                 color=discord.Color.from_rgb(255, 255, 255),
             )
-            await ctx.reply(embed=em2, ephemeral=True)
+            await bot.outbox.reply(ctx, embed=em2, ephemeral=True)
 
     elif query.lower() == "view":
         UserDo = ctx.message.author
         if user is not None:
-            if pugsmanager in ctx.message.author.roles:
+            if guild_context.is_manager(ctx.message.author):
                 UserDo = user
             else:
                 em2 = discord.Embed(
@@ -392,195 +495,187 @@ async def pugsvote(ctx, query: str, user: discord.Member = None):
                     description=f"You have to have `PUGS MANAGER` in order to view other people's votes.",
                     color=discord.Color.from_rgb(255, 255, 255),
                 )
-                await ctx.reply(embed=em2, ephemeral=True)
+                await bot.outbox.reply(ctx, embed=em2, ephemeral=True)
                 return
 
-        if str(UserDo.id) in DataVote:
-            if ":" in DataVote[str(UserDo.id)]:
-                Rrt = DataVote[str(UserDo.id)]
-                YesVote = Rrt.split(":")[0]
-                NoVote = Rrt.split(":")[1]
-                em2 = discord.Embed(
-                    title="RBW Pugs",
-                    description=f"Your PUGs vote is:\n> **{YesVote}** ✅ | **{NoVote}** ❌",
-                    color=discord.Color.from_rgb(255, 255, 255),
-                )
-                await ctx.reply(embed=em2, ephemeral=True)
-            else:
-                em2 = discord.Embed(
-                    title="RBW Pugs",
-                    description=f"You do not have a PUGs vote.",
-                    color=discord.Color.from_rgb(255, 255, 255),
-                )
-                await ctx.reply(embed=em2, ephemeral=True)
+        Rrt = await storage.get_vote(UserDo.id)
+        if Rrt is not None and Rrt.status == VoteStatus.OPEN:
+            em2 = discord.Embed(
+                title="RBW Pugs",
+                description=f"Your PUGs vote is:\n> **{Rrt.yes}** ✅ | **{Rrt.no}** ❌",
+                color=discord.Color.from_rgb(255, 255, 255),
+            )
+            await bot.outbox.reply(ctx, embed=em2, ephemeral=True)
         else:
-            DataVote[str(ctx.message.author.id)] = "0"
-            with open("DataVote.json", "w") as wwr:
-                json.dump(DataVote, wwr)
-
             em2 = discord.Embed(
                 title="RBW Pugs",
-                description=f"You have been added to the database. Please run the command again.",
+                description=f"You do not have a PUGs vote.",
                 color=discord.Color.from_rgb(255, 255, 255),
             )
-            await ctx.reply(embed=em2, ephemeral=True)
+            await bot.outbox.reply(ctx, embed=em2, ephemeral=True)
+
+
+async def pending_vote(payload):
+    Rrt = await storage.get_vote_by_message(payload.message_id)
+    if Rrt is None:
+        # requests made before confirmation message ids were stored carry the user id as content
+        msg = await bot.get_channel(payload.channel_id).fetch_message(payload.message_id)
+        if not msg.author.bot or not msg.content.isdigit():
+            return None
+        Rrt = await storage.get_vote(int(msg.content))
+    if Rrt is None or Rrt.status != VoteStatus.PENDING:
+        return None
+    return Rrt
+
+
+async def accept_vote_request(payload):
+    Rrt = await pending_vote(payload)
+    if Rrt is None:
+        return
+    async with vote_book.hold(Rrt.user_id):
+        # another manager may have handled it while we were looking it up
+        Rrt = await storage.get_vote(Rrt.user_id)
+        if Rrt.status != VoteStatus.PENDING:
+            return
+        server = bot.get_guild(payload.guild_id)
+        userVote = await bot.members.get(server, Rrt.user_id)
+        em1 = discord.Embed(
+            title=userVote.display_name,
+            description=f"ACCEPTED by {payload.member.display_name}",
+            color=discord.Color.from_rgb(74, 173, 42),
+        )
+        em1.set_author(name="RBW Pugs")
+        msg = bot.get_channel(payload.channel_id).get_partial_message(payload.message_id)
+        await msg.edit(content="1", embed=em1)
+        await open_vote(userVote)
+        await msg.clear_reactions()
+
+
+async def deny_vote_request(payload):
+    Rrt = await pending_vote(payload)
+    if Rrt is None:
+        return
+    async with vote_book.hold(Rrt.user_id):
+        # another manager may have handled it while we were looking it up
+        Rrt = await storage.get_vote(Rrt.user_id)
+        if Rrt.status != VoteStatus.PENDING:
+            return
+        server = bot.get_guild(payload.guild_id)
+        userVote = await bot.members.get(server, Rrt.user_id)
+        em1 = discord.Embed(
+            title=userVote.display_name,
+            description=f"DENIED by {payload.member.display_name}",
+            color=discord.Color.from_rgb(117, 8, 8),
+        )
+        em1.set_author(name="RBW Pugs")
+        msg = bot.get_channel(payload.channel_id).get_partial_message(payload.message_id)
+        await msg.edit(content="0", embed=em1)
+        await storage.set_vote_status(Rrt.user_id, VoteStatus.NONE)
+        await msg.clear_reactions()
+
+
+async def strike_request_message(payload, status):
+    # moves the ledger entry out of pending; None if it isn't a pending strike request
+    StrikeReq = await storage.get_strike_by_confirm_message(payload.message_id)
+    if StrikeReq is not None:
+        if not await storage.set_strike_status(StrikeReq.id, status):
+            return None
+        return bot.get_channel(payload.channel_id).get_partial_message(payload.message_id)
+    # requests from before the ledger: only our own messages are strike requests
+    msg = await bot.get_channel(payload.channel_id).fetch_message(payload.message_id)
+    if not msg.author.bot:
+        return None
+    return msg
+
+
+async def accept_strike_request(payload):
+    msg = await strike_request_message(payload, StrikeStatus.ACCEPTED)
+    if msg is None:
+        return
+    await bot.outbox.reply(msg, PRIORITY_CONFIRMATION, embed=discord.Embed(title="RBW Strikes",
+                                                                            description=f"{payload.member.mention} has accepted this request! Please give out a punishment for the offending user in <#>"))
+    await msg.edit(embed=discord.Embed(title="RBW Strikes",
+                                       description=f"Report Details\n> Accepted by {payload.member.mention}",
+                                       color=discord.Color.from_rgb(0, 234, 20)))
+    await msg.clear_reactions()
+
+
+async def deny_strike_request(payload):
+    msg = await strike_request_message(payload, StrikeStatus.DENIED)
+    if msg is None:
+        return
+    await bot.outbox.reply(msg, PRIORITY_CONFIRMATION,
+        embed=discord.Embed(title="RBW Strikes", description=f"{payload.member.mention} has denied this request!"))
+    await msg.edit(
+        embed=discord.Embed(title="RBW Strikes", description=f"Report Details\n> Denied by {payload.member.mention}",
+                            color=discord.Color.from_rgb(234, 0, 20)))
+    await msg.clear_reactions()
+
+
+async def vouch_strike_request(payload):
+    await storage.vouch(payload.message_id, payload.user_id, 1)
+
+
+async def unvouch_strike_request(payload):
+    await storage.vouch(payload.message_id, payload.user_id, -1)
+
+
+# channel id -> emoji -> handler; anything not in here is dropped before any I/O
+reaction_routes = {
+    guild_context.channel_ids["pugs_confirm"]: {"✅": accept_vote_request, "❌": deny_vote_request},
+    guild_context.channel_ids["strike_confirm"]: {"✅": accept_strike_request, "❌": deny_strike_request},
+    guild_context.channel_ids["strike_request"]: {VOUCH_EMOJI: vouch_strike_request},
+}
+reaction_remove_routes = {
+    guild_context.channel_ids["strike_request"]: {VOUCH_EMOJI: unvouch_strike_request},
+}
+
+
+@bot.event
+async def on_raw_reaction_add(payload):
+    routes = reaction_routes.get(payload.channel_id)
+    if routes is None:
+        return
+    handler = routes.get(str(payload.emoji))
+    if handler is None or payload.member is None or payload.member.bot:
+        return
+    with metrics.timer("interaction_seconds", (("callback", handler.__name__),)):
+        await bot.storage_ready.wait()
+        await handler(payload)
 
 
 @bot.event
-async def on_reaction_add(reaction, user):
-    server = bot.get_guild(SERVER_ID)
-    PugsVoteChannel = server.get_channel(VOTE_CHANNEL_PUGS)
-    if not user.bot:
-        with open("DataVote.json", "r") as rt:
-            DataVote = json.load(rt)
-        if reaction.message.channel.id == PUGS_CONFIRM and reaction.message.author.bot:
-            userVote = bot.get_user(int(reaction.message.content))
-            print(reaction.message.content)
-            if str(userVote.id) in DataVote:
-                if (
-                        not reaction.message.content == "0"
-                        or reaction.message.content == "1"
-                ):
-
-                    if reaction.emoji == "✅":
-                        em1 = discord.Embed(
-                            title=userVote.display_name,
-                            description=f"ACCEPTED by {user.display_name}",
-                            color=discord.Color.from_rgb(74, 173, 42),
-                        )
-                        em1.set_author(name="RBW Pugs")
-                        await reaction.message.edit(content="1", embed=em1)
-                        EmbedVote = discord.Embed(title="RBW PUGs", description=userVote.display_name,
-                                                  color=discord.Color.from_rgb(43, 73, 222))
-                        buttonYes = Button(label="", style=discord.ButtonStyle.secondary, emoji="✅")
-                        buttonNo = Button(label="", style=discord.ButtonStyle.secondary, emoji="❌")
-
-                        async def buttonYesCallback(di: discord.Interaction):
-
-                            with open("Datauser.json", "r") as drr:
-                                DataUser = json.load(drr)
-                            if str(di.user.id) in DataUser:
-                                if str(f"{userVote.id}:1") in DataUser[str(di.user.id)]:
-                                    DataUser[str(di.user.id)].remove(str(f"{userVote.id}:1"))
-
-                                    await di.response.send_message("Your vote has been removed.", ephemeral=True)
-                                    DataVote[str(userVote.id)] = str(
-                                        f"{(int(DataVote[str(userVote.id)].split(':')[0]) - 1)}:{':'.join(DataVote[str(userVote.id)].split(':')[1::])}"
-                                    )
-                                    print(DataVote[str(userVote.id)])
-                                else:
-                                    DataUser[str(di.user.id)].append(str(f"{userVote.id}:1"))
-                                    await di.response.send_message("You have successfully voted.", ephemeral=True)
-                                    DataVote[str(userVote.id)] = str(
-                                        f"{(int(DataVote[str(userVote.id)].split(':')[0]) + 1)}:{':'.join(DataVote[str(userVote.id)].split(':')[1::])}"
-                                    )
-                                    print(DataVote[str(userVote.id)])
-                            else:
-                                DataUser[str(di.user.id)] = [str(f"{userVote.id}:1")]
-
-                                await di.response.send_message("You have successfully voted.", ephemeral=True)
-                                DataVote[str(userVote.id)] = str(
-                                    f"{(int(DataVote[str(userVote.id)].split(':')[0]) + 1)}:{':'.join(DataVote[str(userVote.id)].split(':')[1::])}"
-                                )
-                            with open("DataUser.json", "w") as tfr:
-                                json.dump(DataUser, tfr)
-                            with open("DataVote.json", "w") as wwr:
-                                json.dump(DataVote, wwr)
-
-                        async def buttonNoCallback(di: discord.Interaction):
-
-                            with open("Datauser.json", "r") as drr:
-                                DataUser = json.load(drr)
-                            if str(di.user.id) in DataUser:
-                                if str(f"{userVote.id}:0") in DataUser[str(di.user.id)]:
-                                    DataUser[str(di.user.id)].remove(str(f"{userVote.id}:0"))
-
-                                    await di.response.send_message("Your vote has been removed.", ephemeral=True)
-                                    DataVote[str(userVote.id)] = str(
-                                        f"{DataVote[str(userVote.id)].split(':')[0]}:{(int(DataVote[str(userVote.id)].split(':')[1]) - 1)}:{':'.join(DataVote[str(userVote.id)].split(':')[2::])}"
-                                    )
-                                else:
-
-                                    DataUser[str(di.user.id)].append(str(f"{userVote.id}:0"))
-                                    await di.response.send_message("You have successfully voted.", ephemeral=True)
-                                    DataVote[str(userVote.id)] = str(
-                                        f"{DataVote[str(userVote.id)].split(':')[0]}:{(int(DataVote[str(userVote.id)].split(':')[1]) + 1)}:{':'.join(DataVote[str(userVote.id)].split(':')[2::])}"
-                                    )
-                            else:
-                                DataUser[str(di.user.id)] = [str(f"{userVote.id}:0")]
-
-                                await di.response.send_message("You have successfully voted.", ephemeral=True)
-                                DataVote[str(userVote.id)] = str(
-                                    f"{DataVote[str(userVote.id)].split(':')[0]}:{(int(DataVote[str(userVote.id)].split(':')[1]) + 1)}:{':'.join(DataVote[str(userVote.id)].split(':')[2::])}"
-                                )
-                            with open("DataUser.json", "w") as tfr:
-                                json.dump(DataUser, tfr)
-                            with open("DataVote.json", "w") as wwr:
-                                json.dump(DataVote, wwr)
-
-                        view = View()
-                        view.add_item(buttonYes)
-                        view.add_item(buttonNo)
-                        buttonYes.callback = buttonYesCallback
-                        buttonNo.callback = buttonNoCallback
-                        ddm = await PugsVoteChannel.send(
-                            embed=EmbedVote, view=view
-                        )
-
-                        DataVote[
-                            str(userVote.id)
-                        ] = f"0:0:{datetime.date.today().strftime('%Y:%m:%d')}:{ddm.id}"
-                    elif reaction.emoji == "❌":
-
-                        em1 = discord.Embed(
-                            title=userVote.display_name,
-                            description=f"DENIED by {user.display_name}",
-                            color=discord.Color.from_rgb(117, 8, 8),
-                        )
-                        em1.set_author(name="RBW Pugs")
-                        await reaction.message.edit(content="0", embed=em1)
-                        DataVote[str(userVote.id)] = "0"
-
-                    with open("DataVote.json", "w") as wwr:
-                        json.dump(DataVote, wwr)
-                    await reaction.message.clear_reactions()
-        # if (
-        #         reaction.message.channel.id == VOTE_CHANNEL_PUGS
-        #         and reaction.message.author.bot
-        # ):
-        #     print("hasf")
-        #     for v in DataVote:
-        #         if int(DataVote[v].split(":")[5]) == reaction.message.id:
-        #             if reaction.emoji == "✅":
-        #                 DataVote[v] = str(
-        #                     f"{(int(DataVote[v].split(':')[0]) + 1)}:{':'.join(DataVote[v].split(':')[1::])}"
-        #                 )
-        #             elif reaction.emoji == "❌":
-        #                 DataVote[v] = str(
-        #                     f"{DataVote[v].split(':')[0]}:{(int(DataVote[v].split(':')[1]) + 1)}:{':'.join(DataVote[v].split(':')[2::])}"
-        #                 )
-        #             with open("DataVote.json", "w") as wwr:
-        #                 json.dump(DataVote, wwr)
-        #
-        if (
-                reaction.message.channel.id == CONFIRM_STRIKE_CHANNEL
-                and reaction.message.author.bot
-        ):
-            if reaction.emoji == "✅":
-                await reaction.message.reply(embed=discord.Embed(title="RBW Strikes",
-                                                                 description=f"{user.mention} has accepted this request! Please give out a punishment for the offending user in <#>"))
-                await reaction.message.edit(embed=discord.Embed(title="RBW Strikes",
-                                                                description=f"Report Details\n> Accepted by {user.mention}",
-                                                                color=discord.Color.from_rgb(0, 234, 20)))
-                await reaction.message.remove_reactions()
-
-            elif reaction.emoji == "❌":
-                await reaction.message.reply(
-                    embed=discord.Embed(title="RBW Strikes", description=f"{user.mention} has denied this request!"))
-                await reaction.message.edit(
-                    embed=discord.Embed(title="RBW Strikes", description=f"Report Details\n> Denied by {user.mention}",
-                                        color=discord.Color.from_rgb(234, 0, 20)))
-                await reaction.message.remove_reactions()
+async def on_raw_reaction_remove(payload):
+    routes = reaction_remove_routes.get(payload.channel_id)
+    if routes is None:
+        return
+    handler = routes.get(str(payload.emoji))
+    # removals don't carry the member; our own reactions are the only bot ones on these messages
+    if handler is None or payload.user_id == bot.user.id:
+        return
+    with metrics.timer("interaction_seconds", (("callback", handler.__name__),)):
+        await bot.storage_ready.wait()
+        await handler(payload)
+
+
+def tourney_list_page(tourneys, start):
+    return discord.Embed(
+        title="RBW Tournaments",
+        description="List of tournaments (id:host):\n\n" + "\n".join(f"[{v.id}:<@{v.host}>]" for v in tourneys),
+        color=discord.Color.from_rgb(255, 255, 255),
+    )
+
+
+tourney_pages = PageSource(bot.tournaments.count, bot.tournaments.slice, tourney_list_page, 15)
+
+
+def tourney_changed(op, tourney):
+    # the list only shows ids and hosts, so updates leave it valid
+    if op != "update":
+        tourney_pages.invalidate()
+
+
+bot.tournaments.on_change(tourney_changed)
 
 
 @bot.command(
@@ -588,237 +683,215 @@ async def on_reaction_add(reaction, user):
     description="Pugs tournament",
     aliases=["tourney", "tournament"]
 )
-@commands.has_role(PUGS_MANAGER_ROLE)
+@pugs_manager()
 async def pugstourney(ctx, setting: str, id=None, memberSet: str = None):
-    with open("DataTourney.json", "r") as jh:
-        DataTourney = json.load(jh)
+    CurrTourney = None
+    if id is not None and id.isdigit():
+        CurrTourney = bot.tournaments.get(int(id))
     if setting.lower() == "create":
-        while True:
-
-            NumberTourneyId = random.randint(1000, 100000)
-            if not str(NumberTourneyId) in DataTourney:
-                break
-        DataTourney[str(NumberTourneyId)] = {"host": str(ctx.message.author.id), "status": "-1", "members": [],
-                                             "winners": []}
+        NumberTourneyId = (await bot.tournaments.create(ctx.message.author.id)).id
         em2 = discord.Embed(
             title="RBW Tournaments",
             description=f"You have successfully created a PUGs tournament.\n**Tournament ID: {NumberTourneyId}**\nPlease do .pugstourney view <id> to view your tournament,\nPlease do .pugstourney winner <winners seperated in commans(,)> to set the winners for the tournament,\nPlease do .pugstourney delete <id> to delete the tournament,\nPlease do .pugstourney status <-1(pending, just created) - 0(Currently in play) - 1(Finished)> to set the status of the tournament,\n Please do .pugstourney members <Players seperated by ' '(space) and teams seperated by a new line> to set the members of the tournament.",
             color=discord.Color.from_rgb(255, 255, 255),
         )
-        await ctx.reply(embed=em2, ephemeral=True)
+        await bot.outbox.reply(ctx, embed=em2, ephemeral=True)
     elif setting.lower() == "delete":
-        if id is not None and id in DataTourney:
+        if CurrTourney is not None:
 
-            DataTourney.pop(str(id))
+            await bot.tournaments.delete(CurrTourney.id)
             em2 = discord.Embed(
                 title="RBW Tournaments",
                 description=f"Successfully deleted Tournament #{id}",
                 color=discord.Color.from_rgb(255, 255, 255),
             )
-            await ctx.reply(embed=em2, ephemeral=True)
+            await bot.outbox.reply(ctx, embed=em2, ephemeral=True)
         else:
             em2 = discord.Embed(
                 title="RBW Tournaments",
                 description=f"Tournament does not exist.",
                 color=discord.Color.from_rgb(255, 255, 255),
             )
-            await ctx.reply(embed=em2, ephemeral=True)
+            await bot.outbox.reply(ctx, embed=em2, ephemeral=True)
     elif setting.lower() == "list":
-        Tourneyslist = []
-        for v in DataTourney:
-            Tourneyslist.append(f" [{v}:<@{DataTourney[v]['host']}>] ")
-        em2 = discord.Embed(
-            title="RBW Tournaments",
-            description=f"List of tournaments (id:host):\n\n{'  '.join(Tourneyslist)}",
-            color=discord.Color.from_rgb(255, 255, 255),
-        )
-        await ctx.reply(embed=em2, ephemeral=True)
+        await Paginator(tourney_pages, ctx.author.id).start(ctx)
     elif setting.lower() == "view":
-        print(id)
-        if id is not None and str(id) in DataTourney:
+        if CurrTourney is not None:
             em2 = discord.Embed(
                 title="RBW Tournaments",
-                description=f"Tournament #{id}\n> **Host**: <@{DataTourney[id]['host']}>\n> **Status**: {DataTourney[id]['status']}\n> **Members**: {' '.join(DataTourney[id]['members'])}\n> **Winners**: {' '.join(DataTourney[id]['winners'])}",
+                description=f"Tournament #{id}\n> **Host**: <@{CurrTourney.host}>\n> **Status**: {int(CurrTourney.status)}\n> **Members**: {' '.join(CurrTourney.members)}\n> **Winners**: {' '.join(CurrTourney.winners)}",
                 color=discord.Color.from_rgb(255, 255, 255),
             )
-            await ctx.reply(embed=em2, ephemeral=True)
-
-        elif '<@' in id:
-            id = id.strip('<@>')
-            WonTourneys = []
-            for vs in DataTourney:
-                if id in DataTourney[vs]['winners']:
-                    WonTourneys.append(vs)
+            await bot.outbox.reply(ctx, embed=em2, ephemeral=True)
+
+        elif id is not None and '<@' in id:
+            UserId = int(id.strip('<@!>'))
+            Played, Wins = await bot.tournaments.user_stats(UserId)
+            WonTourneys = [str(x) for x, won in await bot.tournaments.user_history(UserId) if won]
             em2 = discord.Embed(
                 title="RBW Tournaments",
-                description=f"User's won tournaments: ({len(WonTourneys)})\n{' -- '.join(WonTourneys)}",
+                description=f"User's won tournaments: ({Wins} of {Played} played)\n{' -- '.join(WonTourneys)}",
                 color=discord.Color.from_rgb(255, 255, 255),
             )
-            await ctx.reply(embed=em2, ephemeral=True)
+            await bot.outbox.reply(ctx, embed=em2, ephemeral=True)
         else:
             em2 = discord.Embed(
                 title="RBW Tournaments",
                 description=f"Tournament does not exist.",
                 color=discord.Color.from_rgb(255, 255, 255),
             )
-            await ctx.reply(embed=em2, ephemeral=True)
+            await bot.outbox.reply(ctx, embed=em2, ephemeral=True)
+    elif setting.lower() == "top":
+        TopWinners = []
+        for i, (UserId, Wins, Played) in enumerate(await bot.tournaments.top_winners(10)):
+            TopWinners.append(f"{i+1}. <@{UserId}> - {Wins} wins ({Played} played)")
+        em2 = discord.Embed(
+            title="RBW Tournaments",
+            description=f"Top tournament winners:\n\n{chr(10).join(TopWinners) or 'No winners yet.'}",
+            color=discord.Color.from_rgb(255, 255, 255),
+        )
+        await bot.outbox.reply(ctx, embed=em2, ephemeral=True)
     elif setting.lower() == "winner":
-        if id is not None and id in DataTourney:
+        if CurrTourney is not None:
             if memberSet is not None and ',' in memberSet:
 
                 winnerSets = memberSet.split(",")
-                DataTourney[id]['winners'] = winnerSets
+                await bot.tournaments.update(CurrTourney.id, winners=winnerSets)
                 em2 = discord.Embed(
                     title="RBW Tournaments",
                     description=f"Successfully set winners.",
                     color=discord.Color.from_rgb(255, 255, 255),
                 )
-                await ctx.reply(embed=em2, ephemeral=True)
+                await bot.outbox.reply(ctx, embed=em2, ephemeral=True)
             else:
                 em2 = discord.Embed(
                     title="RBW Tournaments",
                     description=f"Error while seperating members: Please include a users arguement with Commas (,) seperating each user id.",
                     color=discord.Color.from_rgb(255, 255, 255),
                 )
-                await ctx.reply(embed=em2, ephemeral=True)
+                await bot.outbox.reply(ctx, embed=em2, ephemeral=True)
         else:
             em2 = discord.Embed(
                 title="RBW Tournaments",
                 description=f"Tournament does not exist.",
                 color=discord.Color.from_rgb(255, 255, 255),
             )
-            await ctx.reply(embed=em2, ephemeral=True)
+            await bot.outbox.reply(ctx, embed=em2, ephemeral=True)
     elif setting.lower() == "members":
-        if id is not None and id in DataTourney:
+        if CurrTourney is not None:
             if memberSet is not None and ' ' in memberSet:
                 if '\n' in memberSet:
                     memberSet = ' '.join(memberSet.split('\n'))
                 memberSets = memberSet.split(" ")
 
-                DataTourney[id]['members'] = memberSets
+                await bot.tournaments.update(CurrTourney.id, members=memberSets)
                 em2 = discord.Embed(
                     title="RBW Tournaments",
                     description=f"Successfully set members.",
                     color=discord.Color.from_rgb(255, 255, 255),
                 )
-                await ctx.reply(embed=em2, ephemeral=True)
+                await bot.outbox.reply(ctx, embed=em2, ephemeral=True)
             else:
                 em2 = discord.Embed(
                     title="RBW Tournaments",
                     description=f"Error while seperating members: Please include a users arguement with Spaces ( ) seperating each username.",
                     color=discord.Color.from_rgb(255, 255, 255),
                 )
-                await ctx.reply(embed=em2, ephemeral=True)
+                await bot.outbox.reply(ctx, embed=em2, ephemeral=True)
         else:
             em2 = discord.Embed(
                 title="RBW Tournaments",
                 description=f"Tournament does not exist.",
                 color=discord.Color.from_rgb(255, 255, 255),
             )
-            await ctx.reply(embed=em2, ephemeral=True)
+            await bot.outbox.reply(ctx, embed=em2, ephemeral=True)
     elif setting.lower() == "status":
-        if id is not None and id in DataTourney:
+        if CurrTourney is not None:
             if memberSet is not None:
                 if memberSet == "-1" or memberSet == "0" or memberSet == "1":
-                    DataTourney[id]["status"] = memberSet
+                    await bot.tournaments.update(CurrTourney.id, status=int(memberSet))
                     em2 = discord.Embed(
                         title="RBW Tournaments",
                         description=f"Set Status {memberSet} for Tournament #{id}.",
                         color=discord.Color.from_rgb(255, 255, 255),
                     )
-                    await ctx.reply(embed=em2, ephemeral=True)
+                    await bot.outbox.reply(ctx, embed=em2, ephemeral=True)
                 else:
                     em2 = discord.Embed(
                         title="RBW Tournaments",
                         description=f"Accepted Status Arguements: -1(Pending), 0(Ongoing), 1(Finished)",
                         color=discord.Color.from_rgb(255, 255, 255),
                     )
-                    await ctx.reply(embed=em2, ephemeral=True)
+                    await bot.outbox.reply(ctx, embed=em2, ephemeral=True)
             else:
                 em2 = discord.Embed(
                     title="RBW Tournaments",
                     description=f"Please Provide a status.",
                     color=discord.Color.from_rgb(255, 255, 255),
                 )
-                await ctx.reply(embed=em2, ephemeral=True)
+                await bot.outbox.reply(ctx, embed=em2, ephemeral=True)
         else:
             em2 = discord.Embed(
                 title="RBW Tournaments",
                 description=f"Tournament does not exist.",
                 color=discord.Color.from_rgb(255, 255, 255),
             )
-            await ctx.reply(embed=em2, ephemeral=True)
+            await bot.outbox.reply(ctx, embed=em2, ephemeral=True)
     else:
         em2 = discord.Embed(
             title="RBW Tournaments",
-            description=f"Unrecognized Arguement! Accepted arguements: .pugstourney <view/create/delete/status/members/winner>",
+            description=f"Unrecognized Arguement! Accepted arguements: .pugstourney <view/list/top/create/delete/status/members/winner>",
             color=discord.Color.from_rgb(255, 255, 255),
         )
-        await ctx.reply(embed=em2, ephemeral=True)
-    with open("DataTourney.json", "w") as hjgh:
-        json.dump(DataTourney, hjgh)
+        await bot.outbox.reply(ctx, embed=em2, ephemeral=True)
 
 @bot.command(
     name="checkvouch",
     description="Check Vouches For a strike request",
     aliases=["cv"]
 )
-async def checkvouch(ctx, user: discord.Member):
-    server = bot.get_guild(SERVER_ID)
-    StrikeConfirm = server.get_channel(CONFIRM_STRIKE_CHANNEL)
-    if user is not None:
-        try:
-            currMsg = None
-            content = StrikeConfirm.history(limit=50).flatten()
-            for i in content:
-                if user.id in i.content:
-                    currMsg = i
-                    break
-            ssData = currMsg.content.split(":")
-            if len(ssData) ==3:
-                channelStrike = server.get_channel(1016363028649889922)
-                msgVouch = await channelStrike.fetch_message(ssData[2])
-                reactionsVouch = await msgVouch.get_reactions()
-                CountVouch = None
-                try:
-                    
-                    for x in reactionsVouch:
-                        if str(x.emoji) ==str("🤚"):
-                            countVouch = x.count
-                except:
-                    await ctx.reply("Emoji not found")
-                await ctx.reply(f"Vouch count: {str(countVouch)}"
+async def checkvouch(ctx, user: CachedMember):
+    # vouches are counted as reactions come in, so this is one indexed lookup
+    StrikeReq = await storage.latest_strike(user.id)
+    if StrikeReq is None:
+        await bot.outbox.reply(ctx, content="No strike requests found for that user.")
+    else:
+        await bot.outbox.reply(ctx, content=f"Vouch count: {StrikeReq.vouches}")
+
+
 @bot.command(
     name="strikerequest",
     description="Create a strike request",
     aliases=["sr", "srequest"],
 )
 
-async def strikerequest(ctx, user: discord.Member, proof, reason=None):
-    server = bot.get_guild(SERVER_ID)
-    StrikeConfirm = server.get_channel(CONFIRM_STRIKE_CHANNEL)
+async def strikerequest(ctx, user: CachedMember, proof, reason=None):
+    StrikeConfirm = guild_context.channel("strike_confirm")
     if "https://" in proof:
         if reason is not None:
-            VouchMsg = await ctx.message.add_reaction("🤚")
+            # the request message itself collects the vouches
+            VouchMsg = ctx.message
+            bot.outbox.react(VouchMsg, VOUCH_EMOJI)
+            NewStrike = await storage.create_strike(ctx.message.author.id, user.id, reason, proof, VouchMsg.id)
             em2 = discord.Embed(
                 title="RBW Strikes",
                 description=f"Thank you for your report! it has been forwarded to our staff.",
                 color=discord.Color.from_rgb(255, 255, 255),
             )
-            assd = await ctx.reply(embed=em2, ephemeral=True)
+            assd = await bot.outbox.reply(ctx, embed=em2, ephemeral=True)
             
             em3 = discord.Embed(
                 title="RBW Strikes",
                 description=f"Report Details\n> **Author**: {ctx.message.author.mention}\n> **User**: {user.mention}\n> **Reason**: {reason}\n> **Proof**: {proof}",
                 color=discord.Color.from_rgb(255, 255, 255),
             )
-            msgj = await StrikeConfirm.send(
-                content=f"{ctx.message.author.id}:{user.id}:{VouchMsg.id}", embed=em3
+            msgj = await bot.outbox.send(
+                StrikeConfirm, PRIORITY_CONFIRMATION, content=f"{ctx.message.author.id}:{user.id}:{VouchMsg.id}", embed=em3
             )
-            await msgj.add_reaction("✅")
-            await msgj.add_reaction("❌")
+            await storage.set_strike_confirm_message(NewStrike.id, msgj.id)
+            bot.outbox.react(msgj, "✅", "❌")
             
-            asyncio.sleep(2)
+            await asyncio.sleep(2)
             await assd.delete()
 
         else:
@@ -827,30 +900,34 @@ async def strikerequest(ctx, user: discord.Member, proof, reason=None):
                 description=f"Please include a reason.",
                 color=discord.Color.from_rgb(255, 255, 255),
             )
-            assd = await ctx.reply(embed=em2, ephemeral=True)
-            asyncio.sleep(2)
+            assd = await bot.outbox.reply(ctx, embed=em2, ephemeral=True)
+            await asyncio.sleep(2)
             await assd.delete()
     else:
         if reason is None:
             if ctx.message.attachments:
+                VouchMsg = ctx.message
+                bot.outbox.react(VouchMsg, VOUCH_EMOJI)
+                NewStrike = await storage.create_strike(ctx.message.author.id, user.id, proof,
+                                                        ctx.message.attachments[0].url, VouchMsg.id)
                 em2 = discord.Embed(
                     title="RBW Strikes",
                     description=f"Thank you for your report! it has been forwarded to our staff.",
                     color=discord.Color.from_rgb(255, 255, 255),
                 )
-                assd = await ctx.reply(embed=em2, ephemeral=True)
+                assd = await bot.outbox.reply(ctx, embed=em2, ephemeral=True)
                 em3 = discord.Embed(
                     title="RBW Strikes",
                     description=f"Report Details\n> **Author**: {ctx.message.author.mention}\n> **User**: {user.mention}\n> **Reason**: {proof}\n> **Proof**: Shown below",
                     color=discord.Color.from_rgb(255, 255, 255),
                 )
                 em3.set_image(url=ctx.message.attachments[0].url)
-                msgj = await StrikeConfirm.send(
-                    content=f"{ctx.message.author.id}:{user.id}", embed=em3
+                msgj = await bot.outbox.send(
+                    StrikeConfirm, PRIORITY_CONFIRMATION, content=f"{ctx.message.author.id}:{user.id}:{VouchMsg.id}", embed=em3
                 )
-                await msgj.add_reaction("✅")
-                await msgj.add_reaction("❌")
-                asyncio.sleep(2)
+                await storage.set_strike_confirm_message(NewStrike.id, msgj.id)
+                bot.outbox.react(msgj, "✅", "❌")
+                await asyncio.sleep(2)
                 await assd.delete()
             else:
                 em2 = discord.Embed(
@@ -858,8 +935,8 @@ async def strikerequest(ctx, user: discord.Member, proof, reason=None):
                     description=f"Please attach proof.",
                     color=discord.Color.from_rgb(255, 255, 255),
                 )
-                assd = await ctx.reply(embed=em2, ephemeral=True)
-                asyncio.sleep(2)
+                assd = await bot.outbox.reply(ctx, embed=em2, ephemeral=True)
+                await asyncio.sleep(2)
                 await assd.delete()
         else:
             em2 = discord.Embed(
@@ -867,24 +944,94 @@ async def strikerequest(ctx, user: discord.Member, proof, reason=None):
                 description=f"Please include a valid url.",
                 color=discord.Color.from_rgb(255, 255, 255),
             )
-            assd = await ctx.reply(embed=em2, ephemeral=True)
-            asyncio.sleep(2)
+            assd = await bot.outbox.reply(ctx, embed=em2, ephemeral=True)
+            await asyncio.sleep(2)
             await assd.delete()
 
-        
+
+@bot.before_invoke
+async def start_command_timer(ctx):
+    ctx.started = time.perf_counter()
+    # cog commands included; the storage load may still be running right after connecting
+    await bot.storage_ready.wait()
+
+
+@bot.after_invoke
+async def record_command(ctx):
+    # runs for cog commands too; checks that fail stop a command before either hook
+    labels = (("command", ctx.command.qualified_name),)
+    metrics.observe("command_seconds", time.perf_counter() - ctx.started, labels)
+    if ctx.command_failed:
+        metrics.inc("command_errors_total", labels)
+
+
+metrics.gauge("outbox_depth", lambda: [((("priority", str(x)),), n) for x, n in bot.outbox.stats()["depth"].items()])
+metrics.gauge("member_cache_entries", lambda: len(bot.members))
+metrics.gauge("open_votes", lambda: len(vote_book.open_votes))
+
+
+def latency_lines(name, label, limit=10):
+    # busiest first, with bucket-bound p50/p95 in ms
+    series = sorted(metrics.matching(metrics.histograms, name), key=lambda x: -x[1].count)[:limit]
+    return [f"> **{dict(labels).get(label, 'all')}**: {h.count} runs, p50 {h.quantile(0.5) * 1000:g}ms, "
+            f"p95 {h.quantile(0.95) * 1000:g}ms" for labels, h in series]
+
+
+@bot.command(name="stats", description="Show bot metrics")
+@pugs_manager()
+async def stats(ctx):
+    errors = sum(value for _, value in metrics.matching(metrics.counters, "command_errors_total"))
+    routes = sorted(metrics.matching(metrics.counters, "discord_rest_requests_total"), key=lambda x: -x[1])
+    written = {dict(labels)["target"]: value for labels, value in metrics.matching(metrics.counters, "storage_bytes_written_total")}
+    lag = metrics.histogram("event_loop_lag_seconds")
+    lines = ["**Commands**"] + (latency_lines("command_seconds", "command") or ["> none yet"])
+    lines.append(f"> **Errors**: {errors}")
+    lines += ["**Callbacks**"] + (latency_lines("interaction_seconds", "callback", 5) or ["> none yet"])
+    lines += ["**Storage**"] + latency_lines("storage_seconds", "kind")
+    lines.append(f"> **Written**: journal {written.get('journal', 0)} B, snapshots {written.get('snapshot', 0)} B, "
+                 f"**read**: {metrics.counter('storage_bytes_read_total', (('target', 'snapshot'),))} B")
+    lines.append("**Discord REST**")
+    lines.append(f"> **Requests**: {sum(x for _, x in routes)}, "
+                 f"**429s**: {sum(x for _, x in metrics.matching(metrics.counters, 'discord_rest_429_total'))}")
+    lines += [f"> {dict(labels)['route']}: {value}" for labels, value in routes[:5]]
+    lines.append(f"**Event loop lag**: p50 {lag.quantile(0.5) * 1000:g}ms, p99 {lag.quantile(0.99) * 1000:g}ms")
+    em2 = discord.Embed(
+        title="RBW Stats",
+        description="\n".join(lines),
+        color=discord.Color.from_rgb(255, 255, 255),
+    )
+    await bot.outbox.reply(ctx, embed=em2, ephemeral=True)
+
+
+@bot.command(name="outboxstats", description="Show the outbound message queue")
+@pugs_manager()
+async def outboxstats(ctx):
+    stats = bot.outbox.stats()
+    names = {PRIORITY_REPLY: "Replies", PRIORITY_CONFIRMATION: "Confirmations", PRIORITY_ANNOUNCEMENT: "Announcements"}
+    lines = []
+    for priority, name in names.items():
+        lines.append(f"> **{name}**: {stats['depth'][priority]} queued, {stats['sent'][priority]} sent, "
+                     f"avg wait {stats['avg_wait'][priority]:.2f}s, max wait {stats['max_wait'][priority]:.2f}s")
+    em2 = discord.Embed(
+        title="RBW Outbox",
+        description="\n".join(lines) + f"\n> **Batched announcements**: {stats['batched']}",
+        color=discord.Color.from_rgb(255, 255, 255),
+    )
+    await bot.outbox.reply(ctx, embed=em2, ephemeral=True)
+
+
 @bot.event
 async def on_message(msg):
-    if msg.channel.id != 1147884477847179316:
-        pass
-    elif msg.author.id != bot.user.id:
-        if msg.channel.id == 1147884477847179316 and 'str' in msg.content:
-            
+    if msg.channel.id == guild_context.channel_ids["strike_confirm"] and msg.author.id != bot.user.id:
+        if 'str' in msg.content:
             await msg.delete()
             he = await msg.channel.send("Format: -sr [user] [reason] [proof]")
-            asyncio.sleep(3)
+            await asyncio.sleep(3)
             await he.delete()
-    
-asyncio.run(bot.load_extension('cogs.tourney'))
+            return
+    await bot.process_commands(msg)
+
 bot.prefix = '-'
+bot.startup.end("import")
 with open('.key', 'r') as key:
     bot.run(key.read())
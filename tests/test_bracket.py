@@ -0,0 +1,68 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.bracket import Bracket, DOUBLE
+
+teams = [f'team{x}' for x in range(8)]
+
+
+def play_to_final(bracket):
+    # the top seed wins everything it plays; in the losers bracket the better seed goes through
+    final = bracket.matches[bracket.final]
+    while not final.ready():
+        for match in bracket.ready():
+            bracket.report(match.id, min(match.slots, key = teams.index))
+    return final
+
+
+def test_final_won_by_the_unbeaten_team():
+    bracket = Bracket(DOUBLE, teams)
+    final = play_to_final(bracket)
+    assert final.slots == ['team0', 'team1']
+    bracket.report(final.id, 'team0')
+    assert bracket.champion == 'team0'
+    assert not bracket.matches[bracket.reset].ready()
+    assert bracket.ready() == []
+
+
+def test_final_won_from_the_losers_side_forces_a_reset():
+    bracket = Bracket(DOUBLE, teams)
+    final = play_to_final(bracket)
+    bracket.report(final.id, 'team1')
+    # one loss each: nobody is champion until the reset is played
+    assert bracket.champion is None
+    reset = bracket.matches[bracket.reset]
+    assert bracket.ready() == [reset]
+    assert reset.slots == ['team0', 'team1']
+    assert bracket.find_match('team0', 'team1') is reset
+    bracket.report(reset.id, 'team1')
+    assert bracket.champion == 'team1'
+
+
+def test_reset_survives_a_restore():
+    bracket = Bracket(DOUBLE, teams)
+    final = play_to_final(bracket)
+    bracket.report(final.id, 'team1')
+    restored = Bracket.from_dict(bracket.to_dict())
+    assert restored.ready()[0].id == restored.reset
+    restored.report(restored.reset, 'team0')
+    assert restored.champion == 'team0'
+    assert Bracket.from_dict(restored.to_dict()).champion == 'team0'
+
+
+def test_two_teams():
+    bracket = Bracket(DOUBLE, teams[:2])
+    bracket.report(0, 'team1')
+    bracket.report(bracket.final, 'team0')
+    assert bracket.champion is None
+    bracket.report(bracket.reset, 'team0')
+    assert bracket.champion == 'team0'
+
+
+if __name__ == '__main__':
+    for name, func in list(globals().items()):
+        if name.startswith('test_'):
+            func()
+            print(name, 'ok')
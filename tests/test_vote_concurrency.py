@@ -0,0 +1,95 @@
+import asyncio
+import os
+import random
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.storage import Storage
+from utils.votes import BALLOT_NO, BALLOT_YES, VoteBook, VoteStatus
+
+candidate_id = 1
+message_id = 100
+voters = 2000
+
+
+async def click(book, voter_id, choice):
+    # main.py's cast_ballot, minus the interaction response
+    cast = await book.cast(candidate_id, message_id, voter_id, choice)
+    return 'closed' if cast is None else cast[1]
+
+
+def run(test):
+    async def main():
+        with tempfile.TemporaryDirectory() as directory:
+            storage = Storage(os.path.join(directory, 'pugs.db'))
+            await storage.open()
+            try:
+                book = VoteBook(storage)
+                async with book.hold(candidate_id):
+                    await book.open(candidate_id, message_id)
+                await test(book, storage)
+            finally:
+                await storage.close()
+
+    asyncio.run(main())
+
+
+async def stored(storage):
+    rows = await storage.load_ballots()
+    vote = await storage.get_vote(candidate_id)
+    return {row['voter_id']: row['choice'] for row in rows}, vote
+
+
+def test_one_click_each():
+    async def test(book, storage):
+        choices = {x: random.choice((BALLOT_NO, BALLOT_YES)) for x in range(voters)}
+        await asyncio.gather(*(click(book, x, choice) for x, choice in choices.items()))
+        yes = sum(choices.values())
+        rows, vote = await stored(storage)
+        assert book.ballots.tally(candidate_id) == (yes, voters - yes)
+        assert (vote.yes, vote.no) == (yes, voters - yes)
+        assert rows == choices
+
+    run(test)
+
+
+def test_toggles_and_switches():
+    async def test(book, storage):
+        # every voter clicks a few times; whatever order the lock admits them in, the
+        # stored ballots, the counters and the in-memory index have to agree exactly
+        clicks = [(x, random.choice((BALLOT_NO, BALLOT_YES))) for x in range(voters) for _ in range(3)]
+        random.shuffle(clicks)
+        await asyncio.gather(*(click(book, x, choice) for x, choice in clicks))
+        rows, vote = await stored(storage)
+        yes = sum(1 for x in rows.values() if x == BALLOT_YES)
+        assert book.ballots.ballots.get(candidate_id, {}) == rows
+        assert book.ballots.tally(candidate_id) == (yes, len(rows) - yes)
+        assert (vote.yes, vote.no) == (yes, len(rows) - yes)
+
+    run(test)
+
+
+def test_clicks_racing_the_close():
+    async def test(book, storage):
+        first = [click(book, x, BALLOT_YES) for x in range(voters // 2)]
+        late = [click(book, x, BALLOT_NO) for x in range(voters // 2, voters)]
+        results = await asyncio.gather(*first, book.close(candidate_id), *late)
+        counted = [x for x in results if x in (BALLOT_NO, BALLOT_YES)]
+        rows, vote = await stored(storage)
+        assert vote.status == VoteStatus.CLOSED
+        assert rows == {}
+        assert book.ballots.tally(candidate_id) == (0, 0)
+        # the frozen counters are exactly the clicks that got in before the close
+        assert (vote.yes, vote.no) == (counted.count(BALLOT_YES), counted.count(BALLOT_NO))
+        assert counted.count(BALLOT_NO) == 0
+
+    run(test)
+
+
+if __name__ == '__main__':
+    for name, func in list(globals().items()):
+        if name.startswith('test_'):
+            func()
+            print(name, 'ok')
@@ -0,0 +1,199 @@
+BYE = ''
+
+SINGLE = 'single'
+DOUBLE = 'double'
+
+
+def seed_order(size):
+    # standard bracket placement for a power-of-two size: 1 v size, then the halves mirror
+    # each other so the top seeds can only meet as late as possible
+    order = [1]
+    while len(order) < size:
+        total = len(order) * 2 + 1
+        order = [x for seed in order for x in (seed, total - seed)]
+    return order
+
+
+def seed_by_rating(teams, ratings, default = 0.0):
+    # highest rating first; ties keep the incoming (sign-up) order
+    return sorted(teams, key = lambda x: -ratings.get(x, default))
+
+
+class Match:
+    __slots__ = ('id', 'bracket', 'round', 'slots', 'fed', 'winner', 'loser', 'win_to', 'lose_to')
+
+    def __init__(self, id, bracket, round):
+        self.id = id
+        self.bracket = bracket
+        self.round = round
+        self.slots = [None, None]
+        self.fed = 0
+        self.winner = None
+        self.loser = None
+        self.win_to = None
+        self.lose_to = None
+
+    def ready(self):
+        return self.fed == 2 and self.winner is None
+
+    def __repr__(self):
+        return f'Match({self.id}, {self.bracket}{self.round}, {self.slots}, winner={self.winner!r})'
+
+
+class Bracket:
+    # the whole match graph is laid out up front; teams are fed into slots as results come
+    # in and byes resolve themselves, so reporting a result is O(1) work
+    def __init__(self, kind, seeds):
+        self.kind = kind
+        self.seeds = list(seeds)
+        self.matches = []
+        self.results = []
+        self.champion = None
+        self.playing = {}
+        self.final = None
+        self.reset = None
+        size = 1
+        while size < max(2, len(self.seeds)):
+            size *= 2
+        self.size = size
+        winners = self.build_winners()
+        if kind == DOUBLE:
+            self.build_losers(winners)
+        elif kind != SINGLE:
+            raise ValueError(f'unknown bracket kind {kind!r}')
+        entrants = self.seeds + [BYE] * (size - len(self.seeds))
+        placement = seed_order(size)
+        for i, seed in enumerate(placement):
+            self.feed(winners[0][i // 2].id, i % 2, entrants[seed - 1])
+
+    def new_match(self, bracket, round):
+        match = Match(len(self.matches), bracket, round)
+        self.matches.append(match)
+        self.results.append(-1)
+        return match
+
+    def build_winners(self):
+        rounds = []
+        count = self.size // 2
+        round = 1
+        while count >= 1:
+            rounds.append([self.new_match('W', round) for _ in range(count)])
+            count //= 2
+            round += 1
+        for r in range(len(rounds) - 1):
+            for i, match in enumerate(rounds[r]):
+                match.win_to = (rounds[r + 1][i // 2].id, i % 2)
+        return rounds
+
+    def build_losers(self, winners):
+        # losers round 1 pairs up the winners round 1 losers; after that rounds alternate
+        # between taking in the next batch of dropped winners-bracket losers and halving
+        if len(winners) == 1:
+            final = self.new_match('F', 1)
+            winners[0][0].win_to = (final.id, 0)
+            winners[0][0].lose_to = (final.id, 1)
+            self.build_reset(final)
+            return
+        previous = [self.new_match('L', 1) for _ in range(len(winners[0]) // 2)]
+        for i, match in enumerate(winners[0]):
+            match.lose_to = (previous[i // 2].id, i % 2)
+        round = 2
+        for w in range(1, len(winners)):
+            dropped = winners[w]
+            merge = [self.new_match('L', round) for _ in range(len(dropped))]
+            # alternate the drop-in order so early opponents are not met again straight away
+            order = dropped if w % 2 else dropped[::-1]
+            for i, match in enumerate(previous):
+                match.win_to = (merge[i].id, 0)
+            for i, match in enumerate(order):
+                match.lose_to = (merge[i].id, 1)
+            round += 1
+            previous = merge
+            if len(merge) > 1:
+                halve = [self.new_match('L', round) for _ in range(len(merge) // 2)]
+                for i, match in enumerate(merge):
+                    match.win_to = (halve[i // 2].id, i % 2)
+                round += 1
+                previous = halve
+        # created last so match ids stay in the order matches can be decided
+        final = self.new_match('F', 1)
+        winners[-1][0].win_to = (final.id, 0)
+        previous[0].win_to = (final.id, 1)
+        self.build_reset(final)
+
+    def build_reset(self, final):
+        # the winners-side team (slot 0) has not lost yet, so beating it in the grand final
+        # only forces a second one; settle() feeds the reset only when that happens
+        self.final = final.id
+        self.reset = self.new_match('R', 1).id
+
+    def feed(self, match_id, slot, team):
+        match = self.matches[match_id]
+        match.slots[slot] = team
+        match.fed += 1
+        if match.fed < 2:
+            return
+        if BYE in match.slots:
+            # a bye (or two) settles the match without anyone playing it
+            other = match.slots[1] if match.slots[0] == BYE else match.slots[0]
+            self.settle(match, other, BYE)
+        else:
+            for x in match.slots:
+                self.playing[x] = match.id
+
+    def settle(self, match, winner, loser):
+        match.winner = winner
+        match.loser = loser
+        for x in match.slots:
+            if self.playing.get(x) == match.id:
+                del self.playing[x]
+        self.results[match.id] = 2 if BYE in match.slots else match.slots.index(winner)
+        if match.win_to is not None:
+            self.feed(*match.win_to, winner)
+        elif match.id == self.final and winner == match.slots[1] and loser != BYE:
+            self.feed(self.reset, 0, loser)
+            self.feed(self.reset, 1, winner)
+        elif winner != BYE:
+            self.champion = winner
+        if match.lose_to is not None:
+            self.feed(*match.lose_to, loser)
+
+    def report(self, match_id, winner):
+        # winner is the team name or its slot index (0/1)
+        match = self.matches[match_id]
+        if not match.ready():
+            raise ValueError(f'match {match_id} is not waiting for a result')
+        if winner in (0, 1):
+            winner = match.slots[winner]
+        if winner not in match.slots:
+            raise ValueError(f'{winner!r} is not playing in match {match_id}')
+        self.settle(match, winner, match.slots[1 - match.slots.index(winner)])
+        return match
+
+    def ready(self):
+        return [x for x in self.matches if x.ready()]
+
+    def find_match(self, team_a, team_b = None):
+        # the match team_a is waiting to play, optionally only if team_b is the opponent
+        match_id = self.playing.get(team_a)
+        if match_id is None:
+            return None
+        match = self.matches[match_id]
+        if team_b is not None and team_b not in match.slots:
+            return None
+        return match
+
+    def to_dict(self):
+        # the graph is a pure function of kind and seeds, so only the results need storing;
+        # -1 unplayed, 0/1 winning slot, 2 settled by byes
+        return {'kind': self.kind, 'seeds': self.seeds,
+                'results': ''.join('-' if x == -1 else str(x) for x in self.results)}
+
+    @classmethod
+    def from_dict(cls, data):
+        bracket = cls(data['kind'], data['seeds'])
+        # match ids are laid out so a match is always decided after everything feeding it
+        for match_id, result in enumerate(data['results']):
+            if result in '01' and bracket.matches[match_id].ready():
+                bracket.report(match_id, int(result))
+        return bracket
@@ -0,0 +1,68 @@
+class SignUpOrder:
+    # order-statistic set over insertion slots, backed by a Fenwick tree. Slot i holds 1
+    # while the i-th key ever added is still present, so a key's position is a prefix sum
+    # and the k-th key is a descent over the tree; both O(log n), removals touch one slot.
+    def __init__(self, keys = ()):
+        self.tree = [0]
+        self.keys = [None]
+        self.slots = {}
+        self.count = 0
+        for key in keys:
+            self.append(key)
+
+    def prefix(self, i):
+        total = 0
+        while i > 0:
+            total += self.tree[i]
+            i -= i & -i
+        return total
+
+    def add(self, i, delta):
+        while i < len(self.tree):
+            self.tree[i] += delta
+            i += i & -i
+
+    def append(self, key):
+        if key in self.slots:
+            raise KeyError(f'{key!r} is already in the order')
+        i = len(self.tree)
+        # tree[i] covers slots (i - lowbit(i), i]; everything before i is already built
+        self.tree.append(1 + self.prefix(i - 1) - self.prefix(i - (i & -i)))
+        self.keys.append(key)
+        self.slots[key] = i
+        self.count += 1
+        return i
+
+    def remove(self, key):
+        i = self.slots.pop(key)
+        self.keys[i] = None
+        self.add(i, -1)
+        self.count -= 1
+
+    def position(self, key):
+        # 0-based position among the keys still present
+        return self.prefix(self.slots[key]) - 1
+
+    def kth(self, k):
+        # key at 0-based position k
+        if not 0 <= k < self.count:
+            raise IndexError(k)
+        k += 1
+        i = 0
+        step = 1 << (len(self.tree) - 1).bit_length()
+        while step:
+            j = i + step
+            if j < len(self.tree) and self.tree[j] < k:
+                i = j
+                k -= self.tree[j]
+            step >>= 1
+        return self.keys[i + 1]
+
+    def __contains__(self, key):
+        return key in self.slots
+
+    def __len__(self):
+        return self.count
+
+    def __iter__(self):
+        return (key for key in self.keys[1:] if key is not None)
@@ -0,0 +1,69 @@
+import json
+
+config_file = 'config.json'
+
+
+def load_config(path = config_file):
+    with open(path, 'r') as f:
+        config = json.load(f)
+    for key in ('guild_id', 'roles', 'channels', 'managers'):
+        if key not in config:
+            raise KeyError(f'{path} is missing "{key}"')
+    return config
+
+
+def invert(ids):
+    names = {}
+    for name, x in ids.items():
+        names.setdefault(x, []).append(name)
+    return names
+
+
+class GuildContext:
+    # the configured guild and its roles/channels, resolved once when the guild becomes
+    # available and kept current from role/channel events, so commands never look them up.
+    # Manager checks are set lookups on role ids and need no resolved objects at all.
+    def __init__(self, config):
+        self.config = config
+        self.guild_id = config['guild_id']
+        self.role_ids = dict(config['roles'])
+        self.channel_ids = dict(config['channels'])
+        self.managers = {scope: frozenset(ids) for scope, ids in config['managers'].items()}
+        # id -> config names, for the update events
+        self.role_names = invert(self.role_ids)
+        self.channel_names = invert(self.channel_ids)
+        self.guild = None
+        self.roles = {}
+        self.channels = {}
+        self.resolves = 0
+
+    def resolve(self, client):
+        guild = client.get_guild(self.guild_id)
+        if guild is None:
+            return False
+        self.guild = guild
+        self.roles = {name: guild.get_role(x) for name, x in self.role_ids.items()}
+        # channels by id through the client, so one configured elsewhere still resolves
+        self.channels = {name: client.get_channel(x) for name, x in self.channel_ids.items()}
+        self.resolves += 1
+        return True
+
+    def role(self, name):
+        return self.roles.get(name)
+
+    def channel(self, name):
+        return self.channels.get(name)
+
+    def is_manager(self, member, scope = 'pugs'):
+        ids = self.managers.get(scope, frozenset())
+        return any(x.id in ids for x in getattr(member, 'roles', ()))
+
+    # -- events; snowflakes are global, so an id match is enough
+
+    def role_changed(self, role, deleted = False):
+        for name in self.role_names.get(role.id, ()):
+            self.roles[name] = None if deleted else role
+
+    def channel_changed(self, channel, deleted = False):
+        for name in self.channel_names.get(channel.id, ()):
+            self.channels[name] = None if deleted else channel
@@ -0,0 +1,74 @@
+import json
+import os
+import time
+
+from utils.metrics import metrics
+from utils.snapshot import write_atomic
+
+
+journal_labels = (('target', 'journal'),)
+
+
+class Journal:
+    # append-only jsonl log of state mutations. The meta file remembers how far the
+    # snapshots have folded the log in, so startup only replays the tail after it.
+    def __init__(self, path, meta_path):
+        self.path = path
+        self.meta_path = meta_path
+        self.seq = 0
+        self.size = 0
+        self.file = None
+
+    def load_meta(self):
+        if not os.path.exists(self.meta_path):
+            return {'seq': 0, 'offset': 0}
+        with open(self.meta_path, 'r') as f:
+            return json.load(f)
+
+    def open(self):
+        # returns the records that have not made it into a snapshot yet, in order
+        meta = self.load_meta()
+        self.seq = meta['seq']
+        records = []
+        offset = meta['offset']
+        if os.path.exists(self.path):
+            with open(self.path, 'rb') as f:
+                f.seek(offset)
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        # torn write from a crash, everything after it is garbage
+                        break
+                    offset += len(line)
+                    if record['seq'] > self.seq:
+                        records.append(record)
+                        self.seq = record['seq']
+            with open(self.path, 'r+b') as f:
+                f.truncate(offset)
+        self.file = open(self.path, 'ab')
+        self.size = self.file.tell()
+        return records
+
+    def append(self, op, **fields):
+        self.seq += 1
+        record = {'seq': self.seq, 'ts': int(time.time()), 'op': op, **fields}
+        line = (json.dumps(record, separators = (',', ':')) + '\n').encode('utf-8')
+        self.file.write(line)
+        self.file.flush()
+        self.size += len(line)
+        metrics.inc('storage_bytes_written_total', journal_labels, len(line))
+        return record
+
+    def position(self):
+        return {'seq': self.seq, 'offset': self.size}
+
+    def compacted(self, position):
+        # called once the snapshots covering everything up to position are durable
+        os.fsync(self.file.fileno())
+        write_atomic(self.meta_path, json.dumps(position))
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
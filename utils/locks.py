@@ -0,0 +1,30 @@
+import asyncio
+import contextlib
+
+
+class KeyedLock:
+    # one asyncio.Lock per key, created on demand and dropped once nobody holds or waits
+    # on it, so updates to the same key run one at a time while different keys run freely
+    def __init__(self):
+        self.locks = {}
+
+    @contextlib.asynccontextmanager
+    async def hold(self, key):
+        entry = self.locks.get(key)
+        if entry is None:
+            entry = self.locks[key] = [asyncio.Lock(), 0]
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                yield
+        finally:
+            entry[1] -= 1
+            if not entry[1]:
+                del self.locks[key]
+
+    def locked(self, key):
+        entry = self.locks.get(key)
+        return entry is not None and entry[0].locked()
+
+    def __len__(self):
+        return len(self.locks)
@@ -0,0 +1,91 @@
+import asyncio
+import time
+from collections import OrderedDict
+
+import discord
+from discord.ext import commands
+
+member_cache_size = 2048
+member_cache_ttl = 600.0
+
+
+class MemberCache:
+    # members fetched on demand for when the gateway isn't asked to cache them: a bounded
+    # LRU whose entries go stale after ttl seconds, since without the members intent we never
+    # hear about role changes. Concurrent misses for the same member share one fetch.
+    def __init__(self, size = member_cache_size, ttl = member_cache_ttl):
+        self.size = size
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.fetching = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def put(self, member):
+        key = (member.guild.id, member.id)
+        self.entries[key] = (time.monotonic() + self.ttl, member)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.size:
+            self.entries.popitem(last = False)
+            self.evictions += 1
+
+    def peek(self, guild_id, user_id):
+        key = (guild_id, user_id)
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        if entry[0] <= time.monotonic():
+            del self.entries[key]
+            return None
+        self.entries.move_to_end(key)
+        return entry[1]
+
+    def discard(self, guild_id, user_id):
+        self.entries.pop((guild_id, user_id), None)
+
+    async def get(self, guild, user_id):
+        if guild is None:
+            return None
+        # the gateway's own cache, when it keeps one, is always current
+        member = guild.get_member(user_id) or self.peek(guild.id, user_id)
+        if member is not None:
+            self.hits += 1
+            return member
+        self.misses += 1
+        key = (guild.id, user_id)
+        future = self.fetching.get(key)
+        if future is None:
+            future = asyncio.ensure_future(self.fetch(guild, user_id))
+            self.fetching[key] = future
+            future.add_done_callback(lambda _: self.fetching.pop(key, None))
+        # one caller giving up must not cancel the fetch for everyone else
+        return await asyncio.shield(future)
+
+    async def fetch(self, guild, user_id):
+        try:
+            member = await guild.fetch_member(user_id)
+        except discord.NotFound:
+            return None
+        self.put(member)
+        return member
+
+    def __len__(self):
+        return len(self.entries)
+
+
+class CachedMember(commands.MemberConverter):
+    # discord.Member arguments, with ids and mentions of uncached members going through
+    # bot.members instead of a gateway member query
+    async def query_member_by_id(self, bot, guild, user_id):
+        try:
+            return await bot.members.get(guild, user_id)
+        except discord.HTTPException:
+            return None
+
+    async def convert(self, ctx, argument):
+        member = await super().convert(ctx, argument)
+        # members that came with the message are fresh, keep them for the next lookup
+        if ctx.bot.members.peek(member.guild.id, member.id) is None and member.guild.get_member(member.id) is None:
+            ctx.bot.members.put(member)
+        return member
@@ -0,0 +1,248 @@
+import asyncio
+import bisect
+import logging
+import re
+import time
+
+import aiohttp
+
+log = logging.getLogger(__name__)
+
+latency_buckets = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+lag_interval = 0.5
+proc_io_file = '/proc/self/io'
+snowflake_pattern = re.compile(r'/\d{15,20}')
+
+
+class Histogram:
+    # cumulative only when rendered; observing is a bisect and three adds
+    __slots__ = ('buckets', 'counts', 'sum', 'count')
+
+    def __init__(self, buckets = latency_buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q):
+        # upper bound of the bucket the q-th observation falls in
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return float('inf')
+
+
+class Timer:
+    __slots__ = ('histogram', 'started')
+
+    def __init__(self, histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.started)
+
+
+class Metrics:
+    # counters, gauges and latency histograms keyed by (name, labels), where labels is a
+    # tuple of (key, value) pairs. Recording is a dict lookup and an add; the Prometheus
+    # text is only built when something asks for it.
+    def __init__(self):
+        self.counters = {}
+        self.histograms = {}
+        self.gauges = {}
+        self.help = {}
+        self.lag_task = None
+        self.server = None
+
+    def describe(self, name, text):
+        self.help[name] = text
+
+    def inc(self, name, labels = (), value = 1):
+        key = (name, labels)
+        self.counters[key] = self.counters.get(key, 0) + value
+
+    def histogram(self, name, labels = ()):
+        key = (name, labels)
+        histogram = self.histograms.get(key)
+        if histogram is None:
+            histogram = self.histograms[key] = Histogram()
+        return histogram
+
+    def observe(self, name, value, labels = ()):
+        self.histogram(name, labels).observe(value)
+
+    def timer(self, name, labels = ()):
+        return Timer(self.histogram(name, labels))
+
+    def gauge(self, name, read):
+        # read() -> a number, or [(labels, number)]; called at render time only
+        self.gauges[name] = read
+
+    def counter(self, name, labels = ()):
+        return self.counters.get((name, labels), 0)
+
+    def matching(self, table, name):
+        return [(labels, value) for (key, labels), value in table.items() if key == name]
+
+    # -- exposition
+
+    def render(self):
+        lines = []
+        by_name = {}
+        # copies, since the storage and snapshot threads can add series while this runs
+        for (name, labels), value in list(self.counters.items()):
+            by_name.setdefault(name, []).append((labels, value))
+        for name, series in sorted(by_name.items()):
+            self.header(lines, name, 'counter')
+            for labels, value in series:
+                lines.append(f'{name}{format_labels(labels)} {value}')
+        for name, read in sorted(self.gauges.items()):
+            try:
+                value = read()
+            except Exception:
+                log.exception('gauge %s failed', name)
+                continue
+            if value is None:
+                continue
+            self.header(lines, name, 'gauge')
+            for labels, number in value if isinstance(value, list) else [((), value)]:
+                lines.append(f'{name}{format_labels(labels)} {number}')
+        by_name = {}
+        for (name, labels), histogram in list(self.histograms.items()):
+            by_name.setdefault(name, []).append((labels, histogram))
+        for name, series in sorted(by_name.items()):
+            self.header(lines, name, 'histogram')
+            for labels, histogram in series:
+                seen = 0
+                for bound, count in zip(histogram.buckets, histogram.counts):
+                    seen += count
+                    lines.append(f'{name}_bucket{format_labels(labels + (("le", repr(bound)),))} {seen}')
+                lines.append(f'{name}_bucket{format_labels(labels + (("le", "+Inf"),))} {histogram.count}')
+                lines.append(f'{name}_sum{format_labels(labels)} {histogram.sum}')
+                lines.append(f'{name}_count{format_labels(labels)} {histogram.count}')
+        return '\n'.join(lines) + '\n'
+
+    def header(self, lines, name, kind):
+        if name in self.help:
+            lines.append(f'# HELP {name} {self.help[name]}')
+        lines.append(f'# TYPE {name} {kind}')
+
+    async def serve(self, host, port):
+        # a taken port or a bad host costs the endpoint, never the bot
+        try:
+            self.server = await asyncio.start_server(self.handle, host, port)
+        except OSError as e:
+            log.warning('metrics endpoint could not listen on %s:%s: %s', host, port, e)
+            return None
+        return self.server
+
+    async def close(self):
+        if self.lag_task is not None:
+            self.lag_task.cancel()
+            self.lag_task = None
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+            self.server = None
+
+    async def handle(self, reader, writer):
+        try:
+            request = await asyncio.wait_for(reader.readline(), timeout = 5)
+            while (await asyncio.wait_for(reader.readline(), timeout = 5)) not in (b'\r\n', b'\n', b''):
+                pass
+            parts = request.decode('latin-1').split()
+            if len(parts) >= 2 and parts[0] == 'GET' and parts[1].split('?')[0] == '/metrics':
+                status, body = '200 OK', self.render().encode('utf-8')
+            else:
+                status, body = '404 Not Found', b'not found\n'
+            writer.write(f'HTTP/1.1 {status}\r\nContent-Type: text/plain; version=0.0.4; charset=utf-8\r\n'
+                         f'Content-Length: {len(body)}\r\nConnection: close\r\n\r\n'.encode('latin-1') + body)
+            await writer.drain()
+        except (asyncio.TimeoutError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    # -- event loop lag
+
+    def watch_loop(self, interval = lag_interval):
+        if self.lag_task is None or self.lag_task.done():
+            self.lag_task = asyncio.get_running_loop().create_task(self.measure_lag(interval))
+
+    async def measure_lag(self, interval):
+        # how late a sleep wakes up is how long something else held the loop
+        loop = asyncio.get_running_loop()
+        histogram = self.histogram('event_loop_lag_seconds')
+        while True:
+            start = loop.time()
+            await asyncio.sleep(interval)
+            histogram.observe(max(0.0, loop.time() - start - interval))
+
+    # -- Discord REST
+
+    def http_trace(self):
+        # for discord.Client(http_trace = ...): every REST request, including retries, by route
+        trace = aiohttp.TraceConfig()
+        trace.on_request_start.append(self.request_start)
+        trace.on_request_end.append(self.request_end)
+        return trace
+
+    async def request_start(self, session, context, params):
+        context.started = time.perf_counter()
+
+    async def request_end(self, session, context, params):
+        route = (('route', f'{params.method} {snowflake_pattern.sub("/{id}", params.url.path)}'),)
+        self.inc('discord_rest_requests_total', route)
+        self.observe('discord_rest_seconds', time.perf_counter() - context.started, route)
+        if params.response.status == 429:
+            self.inc('discord_rest_429_total', route)
+
+
+def format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{key}="{escape(value)}"' for key, value in labels) + '}'
+
+
+def escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def process_io():
+    # bytes this process actually read from/wrote to disk, where the kernel reports it
+    try:
+        with open(proc_io_file, 'r') as f:
+            fields = dict(line.split(': ') for line in f.read().splitlines())
+    except OSError:
+        return None
+    return [((('direction', 'read'),), int(fields['read_bytes'])), ((('direction', 'write'),), int(fields['write_bytes']))]
+
+
+metrics = Metrics()
+metrics.describe('command_seconds', 'Command latency, by command')
+metrics.describe('command_errors_total', 'Commands that raised, by command')
+metrics.describe('interaction_seconds', 'Button and reaction callback latency, by callback')
+metrics.describe('storage_ops_total', 'SQLite calls, by kind')
+metrics.describe('storage_seconds', 'SQLite call latency including the wait for the storage thread, by kind')
+metrics.describe('storage_bytes_written_total', 'Bytes written to the journal and json snapshots')
+metrics.describe('storage_bytes_read_total', 'Bytes read from json snapshots')
+metrics.describe('process_disk_bytes', 'Bytes this process read from or wrote to disk')
+metrics.describe('discord_rest_requests_total', 'Discord REST requests, by route')
+metrics.describe('discord_rest_seconds', 'Discord REST request latency, by route')
+metrics.describe('discord_rest_429_total', 'Discord REST responses that were rate limited, by route')
+metrics.describe('event_loop_lag_seconds', 'How late the event loop woke a sleeping task')
+metrics.gauge('process_disk_bytes', process_io)
@@ -0,0 +1,255 @@
+import asyncio
+import collections
+import heapq
+import itertools
+import logging
+
+log = logging.getLogger(__name__)
+
+PRIORITY_REPLY = 0
+PRIORITY_CONFIRMATION = 1
+PRIORITY_ANNOUNCEMENT = 2
+priorities = (PRIORITY_REPLY, PRIORITY_CONFIRMATION, PRIORITY_ANNOUNCEMENT)
+
+# (capacity, seconds to refill it) per route, mirroring Discord's buckets
+send_bucket = (5, 5.0)
+reaction_bucket = (1, 0.25)
+
+max_batch_content = 2000
+max_batch_embeds = 10
+
+
+class TokenBucket:
+    def __init__(self, capacity, per, loop):
+        self.capacity = capacity
+        self.rate = capacity / per
+        self.tokens = capacity
+        self.loop = loop
+        self.updated = loop.time()
+
+    def refill(self):
+        now = self.loop.time()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self):
+        # seconds until a token is available, 0 if one is available now
+        self.refill()
+        return 0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self):
+        self.tokens -= 1
+
+
+class Job:
+    __slots__ = ('seq', 'priority', 'route', 'target', 'kwargs', 'emoji', 'reply', 'future', 'enqueued')
+
+    def __init__(self, seq, priority, route, target, kwargs, emoji, reply, future, enqueued):
+        self.seq = seq
+        self.priority = priority
+        self.route = route
+        self.target = target
+        self.kwargs = kwargs
+        self.emoji = emoji
+        self.reply = reply
+        self.future = future
+        self.enqueued = enqueued
+
+
+class Route:
+    # one channel's sends (or reactions): a queue per priority, its token bucket, and whether
+    # a dispatch is in flight or it is waiting on the bucket
+    __slots__ = ('key', 'queues', 'bucket', 'busy', 'waiting')
+
+    def __init__(self, key, bucket):
+        self.key = key
+        self.queues = {x: collections.deque() for x in priorities}
+        self.bucket = bucket
+        self.busy = False
+        self.waiting = False
+
+    def head(self):
+        for priority in priorities:
+            if self.queues[priority]:
+                return self.queues[priority][0]
+        return None
+
+
+class Outbox:
+    # queued outbound sends: higher priorities go first, every route is paced by its own
+    # token bucket, and announcements still waiting for the same channel go out as one message.
+    # A route has one dispatch in flight at a time, so a channel gets its messages in order.
+    # Routes free to send sit in a heap on their next job's (priority, seq) and routes out of
+    # tokens in a heap on when they get one, so picking the next job is O(log routes).
+    def __init__(self):
+        self.routes = {}
+        self.ready = []
+        self.waiting = []
+        self.seq = itertools.count()
+        self.depth = {x: 0 for x in priorities}
+        self.task = None
+        self.wakeup = None
+        self.waits = {x: [0, 0.0, 0.0] for x in priorities}
+        self.batched = 0
+        self.inflight = set()
+
+    def start(self):
+        if self.task is None or self.task.done():
+            self.wakeup = asyncio.Event()
+            self.task = asyncio.get_running_loop().create_task(self.run())
+
+    def submit(self, priority, route, target, kwargs = None, emoji = None, reply = False):
+        self.start()
+        loop = asyncio.get_running_loop()
+        job = Job(next(self.seq), priority, route, target, kwargs or {}, emoji, reply, loop.create_future(), loop.time())
+        state = self.route(route)
+        state.queues[priority].append(job)
+        self.depth[priority] += 1
+        if state.head() is job:
+            self.schedule(state)
+        return job.future
+
+    def send(self, channel, priority = PRIORITY_REPLY, **kwargs):
+        # returns a future resolving to the sent message; fine to ignore for fire-and-forget
+        return self.submit(priority, ('send', channel.id), channel, kwargs)
+
+    def reply(self, target, priority = PRIORITY_REPLY, **kwargs):
+        # target is a commands.Context or a message; either way the reply lands in, and
+        # is paced by, target.channel's send bucket
+        return self.submit(priority, ('send', target.channel.id), target, kwargs, reply = True)
+
+    def announce(self, channel, content = None, embed = None):
+        kwargs = {}
+        if content is not None:
+            kwargs['content'] = str(content)
+        if embed is not None:
+            kwargs['embed'] = embed
+        return self.submit(PRIORITY_ANNOUNCEMENT, ('send', channel.id), channel, kwargs)
+
+    def react(self, message, *emoji, priority = PRIORITY_CONFIRMATION):
+        return [self.submit(priority, ('react', message.channel.id), message, emoji = x) for x in emoji]
+
+    def route(self, key):
+        state = self.routes.get(key)
+        if state is None:
+            capacity, per = send_bucket if key[0] == 'send' else reaction_bucket
+            state = self.routes[key] = Route(key, TokenBucket(capacity, per, asyncio.get_running_loop()))
+        return state
+
+    def schedule(self, state):
+        # entries go stale when a better job arrives or the route gets busy; next_job skips those
+        if state.busy or state.waiting:
+            return
+        head = state.head()
+        if head is None:
+            return
+        heapq.heappush(self.ready, (head.priority, head.seq, state.key))
+        self.wakeup.set()
+
+    def next_job(self):
+        # highest priority job on a free route with a token; otherwise how long until a token
+        now = asyncio.get_running_loop().time()
+        while self.waiting and self.waiting[0][0] <= now:
+            state = self.routes[heapq.heappop(self.waiting)[2]]
+            state.waiting = False
+            self.schedule(state)
+        while self.ready:
+            priority, seq, key = heapq.heappop(self.ready)
+            state = self.routes[key]
+            head = state.head()
+            if state.busy or state.waiting or head is None or head.seq != seq:
+                continue
+            delay = state.bucket.delay()
+            if delay:
+                state.waiting = True
+                heapq.heappush(self.waiting, (now + delay, seq, key))
+                continue
+            state.queues[priority].popleft()
+            self.depth[priority] -= 1
+            return head, 0
+        return None, self.waiting[0][0] - now if self.waiting else None
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            job, delay = self.next_job()
+            if job is None:
+                self.wakeup.clear()
+                try:
+                    await asyncio.wait_for(self.wakeup.wait(), timeout = delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            state = self.routes[job.route]
+            state.bucket.take()
+            state.busy = True
+            jobs = [job]
+            if job.priority == PRIORITY_ANNOUNCEMENT:
+                jobs += self.take_batch(state, job)
+            now = loop.time()
+            for x in jobs:
+                stats = self.waits[x.priority]
+                wait = now - x.enqueued
+                stats[0] += 1
+                stats[1] += wait
+                stats[2] = max(stats[2], wait)
+            task = loop.create_task(self.dispatch(state, jobs))
+            self.inflight.add(task)
+            task.add_done_callback(self.inflight.discard)
+
+    def take_batch(self, state, first):
+        # pull the announcements queued behind first on its channel into its message while they fit
+        content = len(first.kwargs.get('content', ''))
+        embeds = 1 if 'embed' in first.kwargs else 0
+        batch = []
+        queue = state.queues[PRIORITY_ANNOUNCEMENT]
+        while queue:
+            job = queue[0]
+            job_content = len(job.kwargs.get('content', ''))
+            job_embeds = 1 if 'embed' in job.kwargs else 0
+            if content + job_content + 1 > max_batch_content or embeds + job_embeds > max_batch_embeds:
+                break
+            content += job_content + 1
+            embeds += job_embeds
+            queue.popleft()
+            batch.append(job)
+        self.depth[PRIORITY_ANNOUNCEMENT] -= len(batch)
+        self.batched += len(batch)
+        return batch
+
+    async def dispatch(self, state, jobs):
+        first = jobs[0]
+        try:
+            if first.emoji is not None:
+                result = await first.target.add_reaction(first.emoji)
+            elif first.reply:
+                result = await first.target.reply(**first.kwargs)
+            elif len(jobs) == 1:
+                result = await first.target.send(**first.kwargs)
+            else:
+                content = '\n'.join(x.kwargs['content'] for x in jobs if 'content' in x.kwargs)
+                embeds = [x.kwargs['embed'] for x in jobs if 'embed' in x.kwargs]
+                result = await first.target.send(content = content or None, embeds = embeds)
+        except Exception as e:
+            log.exception('outbox send to %s failed', first.route)
+            for x in jobs:
+                if not x.future.done():
+                    x.future.set_exception(e)
+                    # nobody awaits fire-and-forget futures; mark the exception retrieved
+                    x.future.exception()
+        else:
+            for x in jobs:
+                if not x.future.done():
+                    x.future.set_result(result)
+        finally:
+            state.busy = False
+            self.schedule(state)
+
+    def stats(self):
+        return {
+            'depth': dict(self.depth),
+            'sent': {x: self.waits[x][0] for x in priorities},
+            'avg_wait': {x: self.waits[x][1] / self.waits[x][0] if self.waits[x][0] else 0.0 for x in priorities},
+            'max_wait': {x: self.waits[x][2] for x in priorities},
+            'batched': self.batched
+        }
@@ -0,0 +1,104 @@
+import inspect
+
+import discord
+
+from utils.metrics import metrics
+
+paginator_labels = (('callback', 'paginator'),)
+
+
+async def resolve(value):
+    return await value if inspect.isawaitable(value) else value
+
+
+class PageSource:
+    # pages are rendered on first view and cached until invalidate() is called by whoever
+    # owns the data. count() and fetch(start, stop) may be plain or async callables, so a
+    # page only ever reads its own slice of the index.
+    def __init__(self, count, fetch, render, per_page = 10):
+        self.count = count
+        self.fetch = fetch
+        self.render = render
+        self.per_page = per_page
+        self.version = 0
+        self.total = None
+        self.pages = {}
+        self.hits = 0
+        self.misses = 0
+
+    def invalidate(self):
+        self.version += 1
+        self.total = None
+        self.pages = {}
+
+    async def page_count(self):
+        if self.total is None:
+            self.total = await resolve(self.count())
+        return max(1, -(-self.total // self.per_page))
+
+    async def page(self, number):
+        pages = await self.page_count()
+        number = max(0, min(number, pages - 1))
+        embed = self.pages.get(number)
+        if embed is not None:
+            self.hits += 1
+            return number, embed
+        self.misses += 1
+        version = self.version
+        start = number * self.per_page
+        entries = await resolve(self.fetch(start, start + self.per_page))
+        embed = self.render(entries, start)
+        footer = f'Page {number + 1}/{pages}'
+        embed.set_footer(text = f'{embed.footer.text} • {footer}' if embed.footer.text else footer)
+        # data changed while we were fetching; serve it but don't cache a stale page
+        if version == self.version:
+            self.pages[number] = embed
+        return number, embed
+
+
+class Paginator(discord.ui.View):
+    # prev/next buttons over a PageSource, usable only by whoever ran the command
+    def __init__(self, source, author_id, timeout = 180):
+        super().__init__(timeout = timeout)
+        self.source = source
+        self.author_id = author_id
+        self.number = 0
+        self.message = None
+
+    async def start(self, ctx, number = 0):
+        self.number, embed = await self.source.page(number)
+        await self.update_buttons()
+        self.message = await ctx.bot.outbox.reply(ctx, embed = embed, view = self, mention_author = False)
+        return self.message
+
+    async def update_buttons(self):
+        pages = await self.source.page_count()
+        self.previous.disabled = self.number <= 0
+        self.next.disabled = self.number >= pages - 1
+
+    async def show(self, interaction, number):
+        with metrics.timer('interaction_seconds', paginator_labels):
+            self.number, embed = await self.source.page(number)
+            await self.update_buttons()
+            await interaction.response.edit_message(embed = embed, view = self)
+
+    async def interaction_check(self, interaction):
+        if interaction.user.id != self.author_id:
+            await interaction.response.send_message('Only the person who ran the command can turn pages', ephemeral = True)
+            return False
+        return True
+
+    async def on_timeout(self):
+        if self.message is not None:
+            try:
+                await self.message.edit(view = None)
+            except discord.HTTPException:
+                pass
+
+    @discord.ui.button(label = '◀', style = discord.ButtonStyle.secondary)
+    async def previous(self, interaction, button):
+        await self.show(interaction, self.number - 1)
+
+    @discord.ui.button(label = '▶', style = discord.ButtonStyle.secondary)
+    async def next(self, interaction, button):
+        await self.show(interaction, self.number + 1)
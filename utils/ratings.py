@@ -0,0 +1,227 @@
+import math
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+ELO = 'elo'
+GLICKO2 = 'glicko2'
+
+initial_rating = 1500.0
+elo_k = 32.0
+glicko_rd = 350.0
+glicko_volatility = 0.06
+glicko_tau = 0.5
+glicko_scale = 173.7178
+glicko_epsilon = 0.000001
+
+
+class Elo:
+    def __init__(self, k = elo_k, initial = initial_rating):
+        self.k = k
+        self.initial = initial
+        self.values = {}
+        self.games = 0
+
+    def rating(self, name):
+        return self.values.get(name, self.initial)
+
+    def ratings(self):
+        return dict(self.values)
+
+    def record(self, team_a, team_b, score_a):
+        # score_a is 1 for a win by team_a, 0 for a loss, 0.5 for a draw
+        a = self.rating(team_a)
+        b = self.rating(team_b)
+        change = self.k * (score_a - 1 / (1 + 10 ** ((b - a) / 400)))
+        self.values[team_a] = a + change
+        self.values[team_b] = b - change
+        self.games += 1
+
+    def recompute(self, games):
+        self.values = {}
+        self.games = 0
+        if np is None:
+            for game in games:
+                self.record(*game)
+            return
+        names, a, b, s = index_games(games)
+        values = np.full(len(names), self.initial)
+        for games in waves(a, b):
+            wa, wb = a[games], b[games]
+            change = self.k * (s[games] - 1 / (1 + 10 ** ((values[wb] - values[wa]) / 400)))
+            values[wa] += change
+            values[wb] -= change
+        self.values = dict(zip(names, values.tolist()))
+        self.games = len(s)
+
+
+class Glicko2:
+    # Glicko-2 with every game treated as its own rating period for the two teams in it,
+    # so ratings move as soon as a result comes in. Teams that sit out are not decayed.
+    def __init__(self, tau = glicko_tau, initial = initial_rating, rd = glicko_rd, volatility = glicko_volatility):
+        self.tau = tau
+        self.initial = initial
+        self.rd = rd
+        self.volatility = volatility
+        self.values = {}
+        self.games = 0
+
+    def state(self, name):
+        # (mu, phi, sigma) on the Glicko-2 scale
+        state = self.values.get(name)
+        if state is None:
+            return 0.0, self.rd / glicko_scale, self.volatility
+        return state
+
+    def rating(self, name):
+        return self.state(name)[0] * glicko_scale + self.initial
+
+    def deviation(self, name):
+        return self.state(name)[1] * glicko_scale
+
+    def ratings(self):
+        return {x: self.rating(x) for x in self.values}
+
+    def record(self, team_a, team_b, score_a):
+        a = self.state(team_a)
+        b = self.state(team_b)
+        self.values[team_a] = self.update(a, b, score_a)
+        self.values[team_b] = self.update(b, a, 1 - score_a)
+        self.games += 1
+
+    def update(self, player, opponent, score):
+        mu, phi, sigma = player
+        g = 1 / math.sqrt(1 + 3 * opponent[1] ** 2 / math.pi ** 2)
+        expected = 1 / (1 + math.exp(-g * (mu - opponent[0])))
+        v = 1 / (g ** 2 * expected * (1 - expected))
+        delta = v * g * (score - expected)
+        sigma = self.volatility_update(phi, sigma, v, delta)
+        phi = 1 / math.sqrt(1 / (phi ** 2 + sigma ** 2) + 1 / v)
+        return mu + phi ** 2 * g * (score - expected), phi, sigma
+
+    def volatility_update(self, phi, sigma, v, delta):
+        # the Illinois root-find from step 5 of the Glicko-2 paper
+        a = math.log(sigma ** 2)
+        tau = self.tau
+
+        def f(x):
+            ex = math.exp(x)
+            return ex * (delta ** 2 - phi ** 2 - v - ex) / (2 * (phi ** 2 + v + ex) ** 2) - (x - a) / tau ** 2
+
+        low = a
+        if delta ** 2 > phi ** 2 + v:
+            high = math.log(delta ** 2 - phi ** 2 - v)
+        else:
+            k = 1
+            while f(a - k * tau) < 0:
+                k += 1
+            high = a - k * tau
+        f_low, f_high = f(low), f(high)
+        while abs(high - low) > glicko_epsilon:
+            mid = low + (low - high) * f_low / (f_high - f_low)
+            f_mid = f(mid)
+            if f_mid * f_high <= 0:
+                low, f_low = high, f_high
+            else:
+                f_low /= 2
+            high, f_high = mid, f_mid
+        return math.exp(low / 2)
+
+    def recompute(self, games):
+        self.values = {}
+        self.games = 0
+        if np is None:
+            for game in games:
+                self.record(*game)
+            return
+        names, a, b, s = index_games(games)
+        mu = np.zeros(len(names))
+        phi = np.full(len(names), self.rd / glicko_scale)
+        sigma = np.full(len(names), self.volatility)
+        for games in waves(a, b):
+            # both sides of every game in the wave at once: players, their opponents, scores
+            players = np.concatenate((a[games], b[games]))
+            opponents = np.concatenate((b[games], a[games]))
+            scores = np.concatenate((s[games], 1 - s[games]))
+            g = 1 / np.sqrt(1 + 3 * phi[opponents] ** 2 / math.pi ** 2)
+            expected = 1 / (1 + np.exp(-g * (mu[players] - mu[opponents])))
+            v = 1 / (g ** 2 * expected * (1 - expected))
+            delta = v * g * (scores - expected)
+            new_sigma = self.volatility_update_array(phi[players], sigma[players], v, delta)
+            new_phi = 1 / np.sqrt(1 / (phi[players] ** 2 + new_sigma ** 2) + 1 / v)
+            mu[players] += new_phi ** 2 * g * (scores - expected)
+            phi[players] = new_phi
+            sigma[players] = new_sigma
+        self.values = dict(zip(names, zip(mu.tolist(), phi.tolist(), sigma.tolist())))
+        self.games = len(s)
+
+    def volatility_update_array(self, phi, sigma, v, delta):
+        # volatility_update over arrays; converged entries are frozen by the mask
+        a = np.log(sigma ** 2)
+        tau = self.tau
+        phi2 = phi ** 2
+
+        def f(x):
+            ex = np.exp(x)
+            return ex * (delta ** 2 - phi2 - v - ex) / (2 * (phi2 + v + ex) ** 2) - (x - a) / tau ** 2
+
+        low = a.copy()
+        big = delta ** 2 > phi2 + v
+        high = np.where(big, np.log(np.where(big, delta ** 2 - phi2 - v, 1.0)), a - tau)
+        k = np.ones(len(a))
+        searching = ~big & (f(high) < 0)
+        while searching.any():
+            k[searching] += 1
+            high = np.where(searching, a - k * tau, high)
+            searching &= f(high) < 0
+        f_low, f_high = f(low), f(high)
+        active = np.abs(high - low) > glicko_epsilon
+        while active.any():
+            mid = low + (low - high) * f_low / np.where(active, f_high - f_low, 1.0)
+            f_mid = f(mid)
+            swap = active & (f_mid * f_high <= 0)
+            halve = active & ~swap
+            low = np.where(swap, high, low)
+            f_low = np.where(swap, f_high, np.where(halve, f_low / 2, f_low))
+            high = np.where(active, mid, high)
+            f_high = np.where(active, f_mid, f_high)
+            active &= np.abs(high - low) > glicko_epsilon
+        return np.exp(low / 2)
+
+
+def index_games(games):
+    # team names -> dense ints, and the games as parallel arrays
+    index = {}
+    a, b, s = [], [], []
+    for team_a, team_b, score_a in games:
+        a.append(index.setdefault(team_a, len(index)))
+        b.append(index.setdefault(team_b, len(index)))
+        s.append(score_a)
+    return list(index), np.array(a, dtype = np.int64), np.array(b, dtype = np.int64), np.array(s, dtype = float)
+
+
+def waves(a, b):
+    # group the games into waves: a game goes one wave after the latest earlier game of
+    # either of its teams. No team plays twice in a wave and every team's games stay in
+    # order, so rating a wave at once as array operations gives exactly the same result
+    # as rating the games one after another.
+    last = {}
+    wave = []
+    for x, y in zip(a.tolist(), b.tolist()):
+        n = max(last.get(x, -1), last.get(y, -1)) + 1
+        last[x] = last[y] = n
+        wave.append(n)
+    if not wave:
+        return
+    wave = np.array(wave)
+    order = np.argsort(wave, kind = 'stable')
+    start = 0
+    for stop in np.cumsum(np.bincount(wave)).tolist():
+        yield order[start:stop]
+        start = stop
+
+
+def rating_system(name, **params):
+    return {ELO: Elo, GLICKO2: Glicko2}[name](**params)
@@ -0,0 +1,76 @@
+import asyncio
+import heapq
+import logging
+import time
+
+log = logging.getLogger(__name__)
+
+
+class DeadlineScheduler:
+    # one wall-clock deadline per key in a heap, with a single task sleeping until the
+    # earliest one. Rescheduling or cancelling just records the new deadline; stale heap
+    # entries are skipped when they surface, so nothing is ever scanned.
+    def __init__(self, fire):
+        self.fire = fire
+        self.deadlines = {}
+        self.heap = []
+        self.task = None
+        self.wakeup = None
+        self.fired = 0
+
+    def start(self):
+        if self.task is None or self.task.done():
+            self.wakeup = asyncio.Event()
+            self.task = asyncio.get_running_loop().create_task(self.run())
+
+    def load(self, items):
+        # (key, when) pairs, e.g. everything still open at startup; heapify is O(n).
+        # Nothing fires until start(), so the owner decides when it is safe to.
+        self.deadlines = dict(items)
+        self.heap = [(when, key) for key, when in self.deadlines.items()]
+        heapq.heapify(self.heap)
+        if self.wakeup is not None:
+            self.wakeup.set()
+
+    def schedule(self, key, when):
+        self.deadlines[key] = when
+        heapq.heappush(self.heap, (when, key))
+        self.start()
+        if self.heap[0] == (when, key):
+            self.wakeup.set()
+
+    def cancel(self, key):
+        return self.deadlines.pop(key, None) is not None
+
+    def pop_due(self, now):
+        # the next key whose deadline has passed, or None plus seconds until the next one
+        while self.heap:
+            when, key = self.heap[0]
+            if self.deadlines.get(key) != when:
+                heapq.heappop(self.heap)
+                continue
+            if when > now:
+                return None, when - now
+            heapq.heappop(self.heap)
+            del self.deadlines[key]
+            return key, 0
+        return None, None
+
+    async def run(self):
+        while True:
+            key, delay = self.pop_due(time.time())
+            if key is not None:
+                self.fired += 1
+                try:
+                    await self.fire(key)
+                except Exception:
+                    log.exception('deadline for %s failed', key)
+                continue
+            self.wakeup.clear()
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), timeout = delay)
+            except asyncio.TimeoutError:
+                pass
+
+    def __len__(self):
+        return len(self.deadlines)
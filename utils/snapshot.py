@@ -0,0 +1,108 @@
+import asyncio
+import json
+import os
+import tempfile
+
+from utils.metrics import metrics
+
+snapshot_labels = (('target', 'snapshot'),)
+
+
+def read_json(path):
+    with open(path, 'r', encoding = 'utf-8') as f:
+        data = f.read()
+    metrics.inc('storage_bytes_read_total', snapshot_labels, len(data))
+    return json.loads(data)
+
+
+def write_atomic(path, data):
+    # write next to the target, fsync, then rename over it so readers never see a torn file
+    directory = os.path.dirname(path) or '.'
+    fd, tmp_path = tempfile.mkstemp(dir = directory, prefix = '.' + os.path.basename(path), suffix = '.tmp')
+    try:
+        with os.fdopen(fd, 'w', encoding = 'utf-8') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    if hasattr(os, 'O_DIRECTORY'):
+        dir_fd = os.open(directory, os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+
+
+class SnapshotWriter:
+    # write-behind json snapshots: mutations only mark the data dirty, a background
+    # task writes one coalesced snapshot per interval (or sooner past the threshold).
+    # sources maps each file path to a callable returning the data to dump; an optional
+    # checkpoint (see utils.journal.Journal) is told once every file is durable.
+    def __init__(self, sources, interval = 5.0, threshold = 25, checkpoint = None):
+        self.sources = sources
+        self.checkpoint = checkpoint
+        self.interval = interval
+        self.threshold = threshold
+        self.dirty = 0
+        self.writes = 0
+        self.coalesced = 0
+        self.task = None
+        self.wakeup = asyncio.Event()
+        self.lock = asyncio.Lock()
+
+    def mark_dirty(self):
+        self.dirty += 1
+        if self.task is None or self.task.done():
+            self.task = asyncio.get_running_loop().create_task(self.run())
+        if self.dirty >= self.threshold:
+            self.wakeup.set()
+
+    async def run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), timeout = self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self.wakeup.clear()
+            await self.flush()
+
+    async def flush(self):
+        async with self.lock:
+            if not self.dirty:
+                return
+            dirty = self.dirty
+            self.dirty = 0
+            # serialize on the loop so the snapshot is consistent, write it off the loop
+            data = {path: json.dumps(source()) for path, source in self.sources.items()}
+            position = self.checkpoint.position() if self.checkpoint is not None else None
+            try:
+                await asyncio.to_thread(self.write, data, position)
+            except BaseException:
+                self.dirty += dirty
+                raise
+            self.writes += 1
+            self.coalesced += dirty - 1
+
+    def write(self, data, position):
+        for path, payload in data.items():
+            write_atomic(path, payload)
+            metrics.inc('storage_bytes_written_total', snapshot_labels, len(payload))
+        if self.checkpoint is not None:
+            self.checkpoint.compacted(position)
+
+    async def close(self):
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except (asyncio.CancelledError, Exception):
+                pass
+            self.task = None
+        await self.flush()
+
+    def stats(self):
+        return {'writes': self.writes, 'coalesced': self.coalesced, 'pending': self.dirty}
@@ -0,0 +1,38 @@
+import bisect
+
+
+class Standings:
+    # teams kept sorted by (most wins, best game differential, earliest sign-up). An update
+    # re-places one team with two bisects instead of re-sorting everyone, and top(k) is a slice.
+    # `tiebreak` is any value that orders teams by sign-up and never changes while they exist.
+    def __init__(self):
+        self.keys = {}
+        self.ranked = []
+
+    def key(self, wins, diff, tiebreak):
+        return (-wins, -diff, tiebreak)
+
+    def update(self, name, wins, diff, tiebreak):
+        old = self.keys.get(name)
+        if old is not None:
+            del self.ranked[bisect.bisect_left(self.ranked, (old, name))]
+        key = self.keys[name] = self.key(wins, diff, tiebreak)
+        bisect.insort(self.ranked, (key, name))
+
+    def remove(self, name):
+        old = self.keys.pop(name, None)
+        if old is not None:
+            del self.ranked[bisect.bisect_left(self.ranked, (old, name))]
+
+    def rank(self, name):
+        # 0-based place in the standings
+        return bisect.bisect_left(self.ranked, (self.keys[name], name))
+
+    def top(self, k, start = 0):
+        return [name for key, name in self.ranked[start:start + k]]
+
+    def __contains__(self, name):
+        return name in self.keys
+
+    def __len__(self):
+        return len(self.ranked)
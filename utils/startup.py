@@ -0,0 +1,48 @@
+import asyncio
+import contextlib
+import logging
+import time
+
+log = logging.getLogger(__name__)
+
+
+class StartupTimings:
+    # when each startup phase ran, in seconds since main.py started. Phases may overlap:
+    # the tourney data preload runs while the gateway connects. Tasks handed to track()
+    # are waited for before the timings are reported.
+    def __init__(self, began = None):
+        self.began = began if began is not None else time.perf_counter()
+        self.starts = {}
+        self.phases = {}
+        self.pending = []
+        self.reported = False
+
+    def start(self, name, when = None):
+        self.starts[name] = when if when is not None else time.perf_counter()
+
+    def end(self, name):
+        start = self.starts.pop(name, None)
+        if start is not None:
+            self.phases[name] = (start - self.began, time.perf_counter() - self.began)
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        self.start(name)
+        try:
+            yield
+        finally:
+            self.end(name)
+
+    def track(self, task):
+        self.pending.append(task)
+
+    def summary(self):
+        return ', '.join(f'{name} {end - start:.3f}s (done at {end:.3f}s)' for name, (start, end) in self.phases.items())
+
+    async def finish(self):
+        if self.reported:
+            return
+        self.reported = True
+        if self.pending:
+            await asyncio.wait(self.pending)
+        log.info('startup: %s', self.summary())
@@ -0,0 +1,449 @@
+import asyncio
+import json
+import os
+import re
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from utils.metrics import metrics
+
+from utils.strikes import Strike, StrikeStatus
+from utils.tournaments import Tournament
+from utils.votes import Vote, VoteStatus
+
+db_file = 'data/pugs.db'
+legacy_vote_file = 'DataVote.json'
+legacy_user_files = ['Datauser.json', 'DataUser.json']
+legacy_tourney_file = 'DataTourney.json'
+# Storage.run labels a call by what it runs
+read_calls = ('_fetch_one', '_fetch_all')
+read_labels = (('kind', 'read'),)
+write_labels = (('kind', 'write'),)
+
+schema = '''
+CREATE TABLE IF NOT EXISTS votes (
+    user_id INTEGER PRIMARY KEY,
+    status INTEGER NOT NULL DEFAULT 0,
+    yes INTEGER NOT NULL DEFAULT 0,
+    no INTEGER NOT NULL DEFAULT 0,
+    created INTEGER,
+    message_id INTEGER
+);
+CREATE INDEX IF NOT EXISTS votes_message ON votes (message_id);
+
+-- votes imported from DataVote.json whose messages still carry the old buttons or reactions
+CREATE TABLE IF NOT EXISTS legacy_vote_messages (
+    user_id INTEGER PRIMARY KEY
+);
+
+CREATE TABLE IF NOT EXISTS ballots (
+    candidate_id INTEGER NOT NULL,
+    voter_id INTEGER NOT NULL,
+    choice INTEGER NOT NULL,
+    PRIMARY KEY (candidate_id, voter_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS ballots_voter ON ballots (voter_id);
+
+CREATE TABLE IF NOT EXISTS tournaments (
+    id INTEGER PRIMARY KEY,
+    host INTEGER NOT NULL,
+    status INTEGER NOT NULL DEFAULT -1,
+    members TEXT NOT NULL DEFAULT '[]',
+    winners TEXT NOT NULL DEFAULT '[]'
+);
+
+-- inverted index of the tournaments' members/winners lists, kept in step by Storage
+CREATE TABLE IF NOT EXISTS tourney_users (
+    user_id INTEGER NOT NULL,
+    tourney_id INTEGER NOT NULL,
+    won INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (user_id, tourney_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS tourney_users_tourney ON tourney_users (tourney_id);
+
+CREATE TABLE IF NOT EXISTS tourney_user_stats (
+    user_id INTEGER PRIMARY KEY,
+    played INTEGER NOT NULL DEFAULT 0,
+    wins INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS tourney_user_stats_wins ON tourney_user_stats (wins DESC, user_id);
+
+-- strike request ledger; vouches is kept in step with the vouchers rows
+CREATE TABLE IF NOT EXISTS strikes (
+    id INTEGER PRIMARY KEY,
+    reporter_id INTEGER NOT NULL,
+    target_id INTEGER NOT NULL,
+    reason TEXT,
+    proof TEXT,
+    status INTEGER NOT NULL DEFAULT 0,
+    vouches INTEGER NOT NULL DEFAULT 0,
+    request_message_id INTEGER,
+    confirm_message_id INTEGER,
+    created INTEGER
+);
+CREATE INDEX IF NOT EXISTS strikes_reporter ON strikes (reporter_id);
+CREATE INDEX IF NOT EXISTS strikes_target ON strikes (target_id);
+CREATE UNIQUE INDEX IF NOT EXISTS strikes_request_message ON strikes (request_message_id);
+CREATE UNIQUE INDEX IF NOT EXISTS strikes_confirm_message ON strikes (confirm_message_id);
+
+CREATE TABLE IF NOT EXISTS vouchers (
+    strike_id INTEGER NOT NULL,
+    user_id INTEGER NOT NULL,
+    PRIMARY KEY (strike_id, user_id)
+) WITHOUT ROWID;
+
+-- persistent id sequences, so ids are never handed out twice even across restarts
+CREATE TABLE IF NOT EXISTS sequences (
+    name TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+'''
+
+tourney_fields = ('id', 'host', 'status', 'members', 'winners')
+user_id_pattern = re.compile(r'<@!?(\d+)>|(\d+)')
+
+
+def tourney_user_ids(values):
+    # members and winners are free-form strings; only mentions and bare ids name a user
+    ids = []
+    for value in values:
+        match = user_id_pattern.fullmatch(str(value).strip())
+        if match is not None:
+            ids.append(int(match.group(1) or match.group(2)))
+    return ids
+
+
+def index_tournament(conn, tourney_id, members, winners):
+    # replace a tournament's entries in the inverted index and move the per-user counts
+    old = conn.execute('SELECT user_id, won FROM tourney_users WHERE tourney_id = ?', (tourney_id,)).fetchall()
+    conn.executemany('UPDATE tourney_user_stats SET played = played - 1, wins = wins - ? WHERE user_id = ?',
+                     [(row['won'], row['user_id']) for row in old])
+    conn.execute('DELETE FROM tourney_users WHERE tourney_id = ?', (tourney_id,))
+    won = set(tourney_user_ids(winners))
+    users = set(tourney_user_ids(members)) | won
+    conn.executemany('INSERT INTO tourney_users (user_id, tourney_id, won) VALUES (?, ?, ?)',
+                     [(x, tourney_id, int(x in won)) for x in users])
+    conn.executemany('INSERT INTO tourney_user_stats (user_id, played, wins) VALUES (?, 1, ?) '
+                     'ON CONFLICT (user_id) DO UPDATE SET played = played + 1, wins = wins + excluded.wins',
+                     [(x, int(x in won)) for x in users])
+    if old:
+        conn.execute('DELETE FROM tourney_user_stats WHERE played <= 0')
+
+
+def reindex_tournaments(conn):
+    conn.execute('DELETE FROM tourney_users')
+    conn.execute('DELETE FROM tourney_user_stats')
+    for row in conn.execute('SELECT id, members, winners FROM tournaments').fetchall():
+        index_tournament(conn, row['id'], json.loads(row['members']), json.loads(row['winners']))
+
+
+class Storage:
+    # every sqlite call runs on one worker thread so nothing blocks the event loop
+    def __init__(self, path = db_file):
+        self.path = path
+        self.conn = None
+        self.executor = ThreadPoolExecutor(max_workers = 1, thread_name_prefix = 'storage')
+
+    async def run(self, func, *args):
+        labels = read_labels if func.__name__ in read_calls else write_labels
+        metrics.inc('storage_ops_total', labels)
+        started = time.perf_counter()
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self.executor, func, *args)
+        finally:
+            metrics.observe('storage_seconds', time.perf_counter() - started, labels)
+
+    async def open(self):
+        return await self.run(self._open)
+
+    async def close(self):
+        await self.run(self._close)
+        self.executor.shutdown(wait = True)
+
+    def _open(self):
+        if self.conn is not None:
+            return
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok = True)
+        self.conn = sqlite3.connect(self.path, check_same_thread = False)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute('PRAGMA journal_mode = WAL')
+        self.conn.execute('PRAGMA synchronous = NORMAL')
+        self.conn.executescript(schema)
+
+    def _close(self):
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+    # -- votes
+
+    async def get_vote(self, user_id):
+        row = await self.run(self._fetch_one, 'SELECT * FROM votes WHERE user_id = ?', (user_id,))
+        return Vote.from_row(row)
+
+    async def get_vote_by_message(self, message_id):
+        row = await self.run(self._fetch_one, 'SELECT * FROM votes WHERE message_id = ?', (message_id,))
+        return Vote.from_row(row)
+
+    async def put_vote(self, vote):
+        return await self.run(self._execute,
+                              'INSERT OR REPLACE INTO votes (user_id, status, yes, no, created, message_id) '
+                              'VALUES (?, ?, ?, ?, ?, ?)',
+                              vote.to_row())
+
+    async def set_vote_status(self, user_id, status):
+        return await self.run(self._execute,
+                              'INSERT INTO votes (user_id, status) VALUES (?, ?) '
+                              'ON CONFLICT (user_id) DO UPDATE SET status = excluded.status',
+                              (user_id, int(status)))
+
+    async def list_votes(self, status):
+        rows = await self.run(self._fetch_all, 'SELECT * FROM votes WHERE status = ?', (int(status),))
+        return [Vote.from_row(row) for row in rows]
+
+    async def legacy_vote_messages(self):
+        rows = await self.run(self._fetch_all, 'SELECT votes.* FROM legacy_vote_messages JOIN votes USING (user_id)', ())
+        return [Vote.from_row(row) for row in rows]
+
+    async def forget_legacy_vote_message(self, user_id):
+        return await self.run(self._execute, 'DELETE FROM legacy_vote_messages WHERE user_id = ?', (user_id,))
+
+    # -- ballots
+
+    async def load_ballots(self):
+        return await self.run(self._fetch_all, 'SELECT candidate_id, voter_id, choice FROM ballots', ())
+
+    async def write_ballot(self, candidate_id, voter_id, choice, yes, no):
+        # choice None removes the ballot; yes/no are the candidate's new totals
+        return await self.run(self._write_ballot, candidate_id, voter_id, choice, yes, no)
+
+    def _write_ballot(self, candidate_id, voter_id, choice, yes, no):
+        with self.conn:
+            if choice is None:
+                self.conn.execute('DELETE FROM ballots WHERE candidate_id = ? AND voter_id = ?', (candidate_id, voter_id))
+            else:
+                self.conn.execute('INSERT OR REPLACE INTO ballots (candidate_id, voter_id, choice) VALUES (?, ?, ?)',
+                                  (candidate_id, voter_id, choice))
+            self.conn.execute('UPDATE votes SET yes = ?, no = ? WHERE user_id = ?', (yes, no, candidate_id))
+
+    async def clear_ballots(self, candidate_id):
+        return await self.run(self._execute, 'DELETE FROM ballots WHERE candidate_id = ?', (candidate_id,))
+
+    # -- tournaments
+
+    async def get_tournament(self, tourney_id):
+        row = await self.run(self._fetch_one, 'SELECT * FROM tournaments WHERE id = ?', (tourney_id,))
+        return Tournament.from_row(row)
+
+    async def list_tournaments(self, limit = -1, offset = 0):
+        rows = await self.run(self._fetch_all, 'SELECT * FROM tournaments ORDER BY id LIMIT ? OFFSET ?', (limit, offset))
+        return [Tournament.from_row(row) for row in rows]
+
+    async def create_tournament(self, host):
+        return await self.run(self._create_tournament, host)
+
+    def _create_tournament(self, host):
+        with self.conn:
+            # legacy tournaments have random ids, so start past the largest one
+            floor = self.conn.execute('SELECT COALESCE(MAX(id), 0) FROM tournaments').fetchone()[0]
+            tourney_id = self._next_id('tournaments', floor)
+            self.conn.execute('INSERT INTO tournaments (id, host) VALUES (?, ?)', (tourney_id, host))
+        return Tournament(tourney_id, host)
+
+    async def delete_tournament(self, tourney_id):
+        return await self.run(self._delete_tournament, tourney_id)
+
+    def _delete_tournament(self, tourney_id):
+        with self.conn:
+            index_tournament(self.conn, tourney_id, [], [])
+            return self.conn.execute('DELETE FROM tournaments WHERE id = ?', (tourney_id,)).rowcount
+
+    async def update_tournament(self, tourney_id, **fields):
+        return await self.run(self._update_tournament, tourney_id, fields)
+
+    def _update_tournament(self, tourney_id, fields):
+        columns = [x for x in fields if x in tourney_fields and x != 'id']
+        values = [json.dumps(fields[x]) if x in ('members', 'winners') else fields[x] for x in columns]
+        with self.conn:
+            count = self.conn.execute(f'UPDATE tournaments SET {", ".join(x + " = ?" for x in columns)} WHERE id = ?',
+                                      (*values, tourney_id)).rowcount
+            if count and ('members' in fields or 'winners' in fields):
+                row = self.conn.execute('SELECT members, winners FROM tournaments WHERE id = ?', (tourney_id,)).fetchone()
+                index_tournament(self.conn, tourney_id, json.loads(row['members']), json.loads(row['winners']))
+            return count
+
+    async def user_tournaments(self, user_id):
+        # [(tourney id, won)] for every tournament the user played in or won
+        rows = await self.run(self._fetch_all, 'SELECT tourney_id, won FROM tourney_users WHERE user_id = ? '
+                              'ORDER BY tourney_id', (user_id,))
+        return [(row['tourney_id'], bool(row['won'])) for row in rows]
+
+    async def user_tournament_stats(self, user_id):
+        # (played, wins)
+        row = await self.run(self._fetch_one, 'SELECT played, wins FROM tourney_user_stats WHERE user_id = ?', (user_id,))
+        return (row['played'], row['wins']) if row is not None else (0, 0)
+
+    async def top_winners(self, limit = 10):
+        rows = await self.run(self._fetch_all, 'SELECT user_id, wins, played FROM tourney_user_stats WHERE wins > 0 '
+                              'ORDER BY wins DESC, user_id LIMIT ?', (limit,))
+        return [(row['user_id'], row['wins'], row['played']) for row in rows]
+
+    # -- strikes
+
+    async def create_strike(self, reporter_id, target_id, reason, proof, request_message_id):
+        return await self.run(self._create_strike, Strike(None, reporter_id, target_id, reason, proof,
+                                                          request_message_id = request_message_id))
+
+    def _create_strike(self, strike):
+        with self.conn:
+            strike.id = self.conn.execute('INSERT INTO strikes (reporter_id, target_id, reason, proof, status, vouches, '
+                                          'request_message_id, created) VALUES (?, ?, ?, ?, ?, 0, ?, ?)',
+                                          (strike.reporter_id, strike.target_id, strike.reason, strike.proof,
+                                           int(strike.status), strike.request_message_id, strike.created)).lastrowid
+        return strike
+
+    async def set_strike_confirm_message(self, strike_id, message_id):
+        return await self.run(self._execute, 'UPDATE strikes SET confirm_message_id = ? WHERE id = ?', (message_id, strike_id))
+
+    async def get_strike_by_confirm_message(self, message_id):
+        row = await self.run(self._fetch_one, 'SELECT * FROM strikes WHERE confirm_message_id = ?', (message_id,))
+        return Strike.from_row(row)
+
+    async def set_strike_status(self, strike_id, status, expected = StrikeStatus.PENDING):
+        # only moves the strike if it is still in `expected`, so two managers can't both handle it
+        return await self.run(self._execute, 'UPDATE strikes SET status = ? WHERE id = ? AND status = ?',
+                              (int(status), strike_id, int(expected))) > 0
+
+    async def latest_strike(self, target_id):
+        row = await self.run(self._fetch_one, 'SELECT * FROM strikes WHERE target_id = ? ORDER BY id DESC LIMIT 1',
+                             (target_id,))
+        return Strike.from_row(row)
+
+    async def list_strikes(self, reporter_id = None, target_id = None):
+        column, value = ('reporter_id', reporter_id) if reporter_id is not None else ('target_id', target_id)
+        rows = await self.run(self._fetch_all, f'SELECT * FROM strikes WHERE {column} = ? ORDER BY id', (value,))
+        return [Strike.from_row(row) for row in rows]
+
+    async def vouch(self, request_message_id, user_id, delta):
+        # +1/-1 from a vouch reaction being added/removed; returns the new count, or None
+        # when the message isn't a strike request. Repeats of the same event are no-ops.
+        return await self.run(self._vouch, request_message_id, user_id, delta)
+
+    def _vouch(self, request_message_id, user_id, delta):
+        with self.conn:
+            row = self.conn.execute('SELECT id FROM strikes WHERE request_message_id = ?', (request_message_id,)).fetchone()
+            if row is None:
+                return None
+            if delta > 0:
+                changed = self.conn.execute('INSERT OR IGNORE INTO vouchers (strike_id, user_id) VALUES (?, ?)',
+                                            (row['id'], user_id)).rowcount
+            else:
+                changed = self.conn.execute('DELETE FROM vouchers WHERE strike_id = ? AND user_id = ?',
+                                            (row['id'], user_id)).rowcount
+            if changed:
+                self.conn.execute('UPDATE strikes SET vouches = vouches + ? WHERE id = ?', (1 if delta > 0 else -1, row['id']))
+            return self.conn.execute('SELECT vouches FROM strikes WHERE id = ?', (row['id'],)).fetchone()[0]
+
+    # -- id sequences
+
+    async def next_id(self, name, floor = 0):
+        # next id in the named sequence, always above floor
+        return await self.run(self._next_id_committed, name, floor)
+
+    def _next_id_committed(self, name, floor):
+        with self.conn:
+            return self._next_id(name, floor)
+
+    def _next_id(self, name, floor):
+        self.conn.execute('INSERT INTO sequences (name, value) VALUES (?, ?) '
+                          'ON CONFLICT (name) DO UPDATE SET value = MAX(value, excluded.value - 1) + 1',
+                          (name, floor + 1))
+        return self.conn.execute('SELECT value FROM sequences WHERE name = ?', (name,)).fetchone()[0]
+
+    # -- helpers
+
+    def _fetch_one(self, query, params):
+        return self.conn.execute(query, params).fetchone()
+
+    def _fetch_all(self, query, params):
+        return self.conn.execute(query, params).fetchall()
+
+    def _execute(self, query, params):
+        with self.conn:
+            return self.conn.execute(query, params).rowcount
+
+    # -- migration from the old json files
+
+    async def migrate_json(self, directory = '.'):
+        return await self.run(self._migrate_json, directory)
+
+    def _migrate_json(self, directory):
+        imported = []
+
+        # rename each file as soon as it is in so the import only ever happens once but nothing is lost
+        def done(path):
+            os.replace(path, path + '.migrated')
+            imported.append(path)
+
+        vote_path = os.path.join(directory, legacy_vote_file)
+        if os.path.exists(vote_path):
+            with open(vote_path, 'r', encoding = 'utf-8') as f:
+                data = json.load(f)
+            votes = [Vote.from_legacy(int(k), v) for k, v in data.items() if k.isdigit()]
+            with self.conn:
+                self.conn.executemany('INSERT OR REPLACE INTO votes (user_id, status, yes, no, created, message_id) '
+                                      'VALUES (?, ?, ?, ?, ?, ?)',
+                                      [vote.to_row() for vote in votes])
+                # their messages get the persistent buttons once the bot is connected
+                self.conn.executemany('INSERT OR IGNORE INTO legacy_vote_messages (user_id) VALUES (?)',
+                                      [(vote.user_id,) for vote in votes if vote.status == VoteStatus.OPEN])
+            done(vote_path)
+
+        for name in legacy_user_files:
+            user_path = os.path.join(directory, name)
+            if not os.path.exists(user_path):
+                continue
+            with open(user_path, 'r', encoding = 'utf-8') as f:
+                data = json.load(f)
+            # the old format let one voter hold both a yes and a no on a candidate; keep the yes,
+            # and take every ballot that isn't kept back out of the counters it was added to
+            ballots = {}
+            dropped = {}
+            for voter, entries in data.items():
+                for ballot in sorted((x.split(':') for x in entries), key = lambda x: -int(x[1])):
+                    candidate, choice = int(ballot[0]), int(ballot[1])
+                    if (candidate, int(voter)) in ballots:
+                        counts = dropped.setdefault(candidate, [0, 0])
+                        counts[choice] += 1
+                    else:
+                        ballots[candidate, int(voter)] = choice
+            with self.conn:
+                self.conn.executemany('INSERT OR IGNORE INTO ballots (candidate_id, voter_id, choice) VALUES (?, ?, ?)',
+                                      [(candidate, voter, choice) for (candidate, voter), choice in ballots.items()])
+                self.conn.executemany('UPDATE votes SET yes = MAX(yes - ?, 0), no = MAX(no - ?, 0) WHERE user_id = ?',
+                                      [(yes, no, candidate) for candidate, (no, yes) in dropped.items()])
+            done(user_path)
+
+        tourney_path = os.path.join(directory, legacy_tourney_file)
+        if os.path.exists(tourney_path):
+            with open(tourney_path, 'r', encoding = 'utf-8') as f:
+                data = json.load(f)
+            with self.conn:
+                self.conn.executemany('INSERT OR REPLACE INTO tournaments (id, host, status, members, winners) '
+                                      'VALUES (?, ?, ?, ?, ?)',
+                                      [(int(k), int(v['host']), int(v['status']),
+                                        json.dumps(v['members']), json.dumps(v['winners'])) for k, v in data.items()])
+                reindex_tournaments(self.conn)
+            done(tourney_path)
+        return imported
+
+
+if __name__ == '__main__':
+    async def main():
+        storage = Storage()
+        await storage.open()
+        print('imported:', await storage.migrate_json())
+        await storage.close()
+
+    asyncio.run(main())
@@ -0,0 +1,38 @@
+import enum
+import time
+
+VOUCH_EMOJI = "🤚"
+
+
+class StrikeStatus(enum.IntEnum):
+    PENDING = 0
+    ACCEPTED = 1
+    DENIED = 2
+
+
+class Strike:
+    __slots__ = ('id', 'reporter_id', 'target_id', 'reason', 'proof', 'status', 'vouches',
+                 'request_message_id', 'confirm_message_id', 'created')
+
+    def __init__(self, id, reporter_id, target_id, reason = None, proof = None, status = StrikeStatus.PENDING,
+                 vouches = 0, request_message_id = None, confirm_message_id = None, created = None):
+        self.id = id
+        self.reporter_id = reporter_id
+        self.target_id = target_id
+        self.reason = reason
+        self.proof = proof
+        self.status = StrikeStatus(status)
+        self.vouches = vouches
+        self.request_message_id = request_message_id
+        self.confirm_message_id = confirm_message_id
+        self.created = created if created is not None else int(time.time())
+
+    @classmethod
+    def from_row(cls, row):
+        if row is None:
+            return None
+        return cls(row['id'], row['reporter_id'], row['target_id'], row['reason'], row['proof'], row['status'],
+                   row['vouches'], row['request_message_id'], row['confirm_message_id'], row['created'])
+
+    def __repr__(self):
+        return f'Strike({self.id}, {self.reporter_id} -> {self.target_id}, {self.status.name}, vouches={self.vouches})'
@@ -0,0 +1,50 @@
+import asyncio
+import logging
+
+log = logging.getLogger(__name__)
+
+
+class TallyUpdater:
+    # coalesces message re-renders: a burst of schedule() calls for the same message within
+    # `window` seconds turns into one edit, and each channel gets at most one edit per
+    # `per_channel` seconds so we stay under Discord's per-channel edit limit
+    def __init__(self, edit, window = 2.0, per_channel = 1.2):
+        self.edit = edit
+        self.window = window
+        self.per_channel = per_channel
+        self.pending = {}
+        self.next_edit = {}
+        self.tasks = {}
+        self.requested = 0
+        self.edits = 0
+
+    def schedule(self, channel_id, message_id, key):
+        self.requested += 1
+        self.pending.setdefault(channel_id, {})[message_id] = key
+        if channel_id not in self.tasks:
+            self.tasks[channel_id] = asyncio.get_running_loop().create_task(self.drain(channel_id))
+
+    async def drain(self, channel_id):
+        loop = asyncio.get_running_loop()
+        try:
+            await asyncio.sleep(self.window)
+            pending = self.pending.get(channel_id)
+            while pending:
+                delay = self.next_edit.get(channel_id, 0) - loop.time()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                message_id = next(iter(pending))
+                key = pending.pop(message_id)
+                self.next_edit[channel_id] = loop.time() + self.per_channel
+                self.edits += 1
+                try:
+                    await self.edit(channel_id, message_id, key)
+                except Exception:
+                    log.exception('tally edit for message %s failed', message_id)
+        finally:
+            self.tasks.pop(channel_id, None)
+            if not self.pending.get(channel_id):
+                self.pending.pop(channel_id, None)
+
+    def stats(self):
+        return {'requested': self.requested, 'edits': self.edits, 'coalesced': self.requested - self.edits}
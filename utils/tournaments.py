@@ -0,0 +1,106 @@
+import bisect
+import enum
+import json
+
+
+class TourneyStatus(enum.IntEnum):
+    PENDING = -1
+    ONGOING = 0
+    FINISHED = 1
+
+
+class Tournament:
+    __slots__ = ('id', 'host', 'status', 'members', 'winners')
+
+    def __init__(self, id, host, status = TourneyStatus.PENDING, members = None, winners = None):
+        self.id = id
+        self.host = host
+        self.status = TourneyStatus(status)
+        self.members = members if members is not None else []
+        self.winners = winners if winners is not None else []
+
+    @classmethod
+    def from_row(cls, row):
+        if row is None:
+            return None
+        return cls(row['id'], row['host'], row['status'], json.loads(row['members']), json.loads(row['winners']))
+
+    def __repr__(self):
+        return f'Tournament({self.id}, host={self.host}, status={self.status.name})'
+
+
+class TournamentStore:
+    # the one place tournaments live, for pugstourney and the Tourney cog alike: rows in
+    # Storage, all of them cached by id once loaded, ids handed out by a persistent sequence,
+    # and change callbacks for anything that caches what it renders from them
+    def __init__(self, storage):
+        self.storage = storage
+        self.tournaments = {}
+        self.ids = []
+        self.listeners = []
+
+    async def load(self):
+        self.tournaments = {x.id: x for x in await self.storage.list_tournaments()}
+        self.ids = sorted(self.tournaments)
+        self.changed('load', None)
+
+    def on_change(self, callback):
+        # callback(op, tournament) after every create/update/delete
+        self.listeners.append(callback)
+
+    def changed(self, op, tourney):
+        for callback in self.listeners:
+            callback(op, tourney)
+
+    def get(self, tourney_id):
+        return self.tournaments.get(tourney_id)
+
+    def count(self):
+        return len(self.ids)
+
+    def slice(self, start, stop):
+        return [self.tournaments[x] for x in self.ids[start:stop]]
+
+    async def create(self, host, **fields):
+        tourney = await self.storage.create_tournament(host)
+        if fields:
+            await self.storage.update_tournament(tourney.id, **fields)
+            self.set_fields(tourney, fields)
+        self.tournaments[tourney.id] = tourney
+        # ids only ever grow, so this is an append
+        bisect.insort(self.ids, tourney.id)
+        self.changed('create', tourney)
+        return tourney
+
+    async def update(self, tourney_id, **fields):
+        tourney = self.tournaments[tourney_id]
+        await self.storage.update_tournament(tourney_id, **fields)
+        self.set_fields(tourney, fields)
+        self.changed('update', tourney)
+        return tourney
+
+    def set_fields(self, tourney, fields):
+        for field, value in fields.items():
+            setattr(tourney, field, TourneyStatus(value) if field == 'status' else value)
+
+    async def delete(self, tourney_id):
+        await self.storage.delete_tournament(tourney_id)
+        tourney = self.tournaments.pop(tourney_id)
+        del self.ids[bisect.bisect_left(self.ids, tourney_id)]
+        self.changed('delete', tourney)
+        return tourney
+
+    async def next_team_id(self, floor = 0):
+        # team ids come from the same kind of sequence; floor covers ids already handed out
+        return await self.storage.next_id('teams', floor)
+
+    # -- per-user history, served by the inverted index in Storage
+
+    async def user_history(self, user_id):
+        return await self.storage.user_tournaments(user_id)
+
+    async def user_stats(self, user_id):
+        return await self.storage.user_tournament_stats(user_id)
+
+    async def top_winners(self, limit = 10):
+        return await self.storage.top_winners(limit)
@@ -0,0 +1,163 @@
+import datetime
+import enum
+import time
+
+from utils.locks import KeyedLock
+
+BALLOT_NO = 0
+BALLOT_YES = 1
+
+
+class VoteStatus(enum.IntEnum):
+    NONE = 0
+    CLOSED = 1
+    OPEN = 2
+    PENDING = 3
+
+
+class Vote:
+    __slots__ = ('user_id', 'status', 'yes', 'no', 'created', 'message_id')
+
+    def __init__(self, user_id, status = VoteStatus.NONE, yes = 0, no = 0, created = None, message_id = None):
+        self.user_id = user_id
+        self.status = VoteStatus(status)
+        self.yes = yes
+        self.no = no
+        self.created = created
+        self.message_id = message_id
+
+    @classmethod
+    def open(cls, user_id, message_id):
+        return cls(user_id, VoteStatus.OPEN, created = int(time.time()), message_id = message_id)
+
+    @classmethod
+    def from_row(cls, row):
+        if row is None:
+            return None
+        return cls(row['user_id'], row['status'], row['yes'], row['no'], row['created'], row['message_id'])
+
+    @classmethod
+    def from_legacy(cls, user_id, value):
+        # old DataVote strings: "yes:no:YYYY:MM:DD:msgid" open, "3" pending, "1" closed, anything else none
+        if ':' in value:
+            yes, no, year, month, day, message_id = value.split(':')
+            created = datetime.datetime(int(year), int(month), int(day))
+            return cls(user_id, VoteStatus.OPEN, int(yes), int(no), int(created.timestamp()), int(message_id))
+        if value == '3':
+            return cls(user_id, VoteStatus.PENDING)
+        if value == '1':
+            return cls(user_id, VoteStatus.CLOSED)
+        return cls(user_id)
+
+    def to_row(self):
+        return (self.user_id, int(self.status), self.yes, self.no, self.created, self.message_id)
+
+    def add(self, choice, delta = 1):
+        if choice:
+            self.yes += delta
+        else:
+            self.no += delta
+
+    def __repr__(self):
+        return (f'Vote(user_id={self.user_id}, status={self.status.name}, yes={self.yes}, no={self.no}, '
+                f'created={self.created}, message_id={self.message_id})')
+
+
+class BallotIndex:
+    # in-memory (candidate, voter) -> choice index with running per-candidate totals.
+    # A voter holds at most one ballot per candidate; clicking the other button switches it.
+    def __init__(self):
+        self.ballots = {}
+        self.tallies = {}
+
+    def load(self, rows, votes):
+        # tallies start from the stored vote counters, which predate ballot tracking for migrated votes
+        self.ballots = {}
+        self.tallies = {vote.user_id: [vote.no, vote.yes] for vote in votes}
+        for candidate_id, voter_id, choice in rows:
+            self.ballots.setdefault(candidate_id, {})[voter_id] = choice
+
+    def choice(self, candidate_id, voter_id):
+        return self.ballots.get(candidate_id, {}).get(voter_id)
+
+    def toggle(self, candidate_id, voter_id, choice):
+        # returns (previous, current); current is None when the ballot was taken back
+        voters = self.ballots.setdefault(candidate_id, {})
+        tally = self.tallies.setdefault(candidate_id, [0, 0])
+        previous = voters.pop(voter_id, None)
+        if previous is not None:
+            tally[previous] -= 1
+        if previous == choice:
+            return previous, None
+        voters[voter_id] = choice
+        tally[choice] += 1
+        return previous, choice
+
+    def tally(self, candidate_id):
+        no, yes = self.tallies.get(candidate_id, (0, 0))
+        return yes, no
+
+    def drop(self, candidate_id):
+        self.ballots.pop(candidate_id, None)
+        self.tallies.pop(candidate_id, None)
+
+
+class VoteBook:
+    # the open votes, their ballots and one lock per candidate. Clicks and closes both take
+    # the candidate's lock and check the vote is still open under it, so a click that queued
+    # behind a close finds the vote gone instead of counting towards it.
+    def __init__(self, storage):
+        self.storage = storage
+        self.ballots = BallotIndex()
+        self.open_votes = {}
+        self.locks = KeyedLock()
+
+    async def load(self):
+        votes = await self.storage.list_votes(VoteStatus.OPEN)
+        self.ballots.load(await self.storage.load_ballots(), votes)
+        self.open_votes.update({vote.user_id: vote.message_id for vote in votes})
+        return votes
+
+    def hold(self, candidate_id):
+        return self.locks.hold(candidate_id)
+
+    def is_open(self, candidate_id, message_id):
+        return self.open_votes.get(candidate_id) == message_id
+
+    def tally(self, candidate_id):
+        return self.ballots.tally(candidate_id)
+
+    async def cast(self, candidate_id, message_id, voter_id, choice):
+        # (previous, current) as BallotIndex.toggle, or None if the vote on message_id is closed
+        if not self.is_open(candidate_id, message_id):
+            return None
+        async with self.locks.hold(candidate_id):
+            if not self.is_open(candidate_id, message_id):
+                return None
+            previous, current = self.ballots.toggle(candidate_id, voter_id, choice)
+            await self.storage.write_ballot(candidate_id, voter_id, current, *self.ballots.tally(candidate_id))
+        return previous, current
+
+    async def open(self, candidate_id, message_id):
+        # the caller holds hold(candidate_id)
+        self.ballots.drop(candidate_id)
+        self.open_votes[candidate_id] = message_id
+        await self.storage.clear_ballots(candidate_id)
+        vote = Vote.open(candidate_id, message_id)
+        await self.storage.put_vote(vote)
+        return vote
+
+    async def close(self, candidate_id, status = VoteStatus.CLOSED, final = None):
+        # final(vote) runs under the lock before anything is let go, to freeze the message;
+        # returns the closed vote, or None if it was not open
+        async with self.locks.hold(candidate_id):
+            vote = await self.storage.get_vote(candidate_id)
+            if vote is None or vote.status != VoteStatus.OPEN:
+                return None
+            if final is not None:
+                await final(vote)
+            self.open_votes.pop(candidate_id, None)
+            self.ballots.drop(candidate_id)
+            await self.storage.set_vote_status(candidate_id, status)
+            await self.storage.clear_ballots(candidate_id)
+            return vote